@@ -0,0 +1,14 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import os
+import runpy
+
+ProxmoxPVEAction = runpy.run_path(os.path.join(
+  os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'module_utils', 'proxmox_pve', 'action.py'))['ProxmoxPVEAction']
+
+class ActionModule(ProxmoxPVEAction):
+  MODULE = 'proxmox_pve_user_password'
@@ -0,0 +1,119 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = '''
+name: proxmox_pve_api_stats
+type: aggregate
+short_description: reports the Proxmox VE API cost of a play
+description:
+  - sums the `api_stats` returned by the proxmox_pve modules over the whole
+    playbook and, at its end, prints the total number of requests,
+    seconds and bytes, the slowest endpoints and the slowest tasks.
+  - loop results are summed into their task.  Seconds are the time spent
+    waiting for each call, so concurrent calls add up to more than the
+    task's wall time.
+requirements:
+  - enable in ansible.cfg with `callbacks_enabled = proxmox_pve_api_stats`
+    and add the role's callback_plugins directory to `callback_plugins`.
+options:
+  top:
+    description:
+      - number of endpoints and tasks listed.
+    default: 10
+    type: int
+    env:
+      - name: PROXMOX_PVE_API_STATS_TOP
+    ini:
+      - section: callback_proxmox_pve_api_stats
+        key: top
+author: Esten Rye
+'''
+
+from ansible.plugins.callback import CallbackBase
+
+FIELDS = ['count', 'errors', 'retries', 'seconds', 'bytes_sent', 'bytes_received']
+
+def merge_endpoint(total, entry):
+  for field in FIELDS:
+    total[field] = total.get(field, 0) + entry.get(field, 0)
+  total['max_seconds'] = max(total.get('max_seconds', 0), entry.get('max_seconds', 0))
+  histogram = total.setdefault('histogram', {})
+  for bucket, count in entry.get('histogram', {}).items():
+    histogram[bucket] = histogram.get(bucket, 0) + count
+
+def percentile(histogram, buckets, fraction):
+  # upper bound of the histogram bucket the given fraction of calls fall in.
+  total = sum(histogram.values())
+  seen = 0
+  for bucket in buckets:
+    seen += histogram.get(bucket, 0)
+    if total and seen >= fraction * total:
+      return bucket
+  return '+Inf'
+
+def collect_api_stats(result):
+  if 'api_stats' in result:
+    return [result['api_stats']]
+  return [item['api_stats'] for item in result.get('results', []) if isinstance(item, dict) and 'api_stats' in item]
+
+class CallbackModule(CallbackBase):
+  CALLBACK_VERSION = 2.0
+  CALLBACK_TYPE = 'aggregate'
+  CALLBACK_NAME = 'proxmox_pve_api_stats'
+  CALLBACK_NEEDS_ENABLED = True
+
+  def __init__(self, *args, **kwargs):
+    super(CallbackModule, self).__init__(*args, **kwargs)
+    self.endpoints = {}
+    self.tasks = {}
+    self.buckets = []
+
+  def record(self, result):
+    stats = collect_api_stats(result._result)
+    if not stats:
+      return
+    task = '%s [%s]' % (result._task.get_name(), result._host.get_name())
+    task_total = self.tasks.setdefault(task, {})
+    for api_stats in stats:
+      self.buckets = api_stats.get('buckets') or self.buckets
+      for endpoint, entry in api_stats.get('endpoints', {}).items():
+        merge_endpoint(self.endpoints.setdefault(endpoint, {}), entry)
+        merge_endpoint(task_total, entry)
+
+  def v2_runner_on_ok(self, result):
+    self.record(result)
+
+  def v2_runner_on_failed(self, result, ignore_errors=False):
+    self.record(result)
+
+  def v2_playbook_on_stats(self, stats):
+    if not self.endpoints:
+      return
+    top = self.get_option('top')
+    total = {}
+    for entry in self.endpoints.values():
+      merge_endpoint(total, entry)
+
+    self._display.banner('PROXMOX PVE API STATS')
+    self._display.display('%d requests (%d errors, %d retries), %.2fs, %d bytes sent, %d bytes received' % (
+      total['count'], total['errors'], total['retries'], total['seconds'], total['bytes_sent'], total['bytes_received']))
+
+    self._display.display('\nslowest endpoints:')
+    self._display.display('%-36s %8s %10s %9s %9s %7s %12s' % (
+      'endpoint', 'requests', 'seconds', 'avg ms', 'max ms', 'p95 <=', 'bytes recv'))
+    for endpoint, entry in sorted(self.endpoints.items(), key=lambda item: -item[1]['seconds'])[:top]:
+      self._display.display('%-36s %8d %10.3f %9.1f %9.1f %7s %12d' % (
+        endpoint, entry['count'], entry['seconds'], 1000 * entry['seconds'] / entry['count'],
+        1000 * entry['max_seconds'], percentile(entry['histogram'], self.buckets, 0.95), entry['bytes_received']))
+
+    self._display.display('\nslowest tasks:')
+    self._display.display('%-60s %8s %10s' % ('task', 'requests', 'seconds'))
+    for task, entry in sorted(self.tasks.items(), key=lambda item: -item[1]['seconds'])[:top]:
+      self._display.display('%-60s %8d %10.3f' % (task[:60], entry['count'], entry['seconds']))
+
+    # each playbook of a run gets its own report.
+    self.endpoints = {}
+    self.tasks = {}
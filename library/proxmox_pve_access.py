@@ -0,0 +1,435 @@
+#!/usr/bin/python3
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = '''
+module: proxmox_pve_access
+short_description: reconciles Proxmox PVE roles, users, ACLs and passwords
+description:
+  - applies a whole Proxmox PVE access configuration in a single invocation.
+  - authenticates once, reads `/access/roles`, `/access/users` and
+    `/access/acl` once and applies the differences in dependency order,
+    roles and users before the ACLs granting them, ACL removals before user
+    and role deletion and passwords once their users exist.
+  - supports check mode, in which nothing is written and the results hold
+    the planned changes with their `before` and `after`, and diff mode.
+options:
+  api_host:
+    description:
+      - the host of the Proxmox VE Cluster
+      - required, unless clusters is given.
+    type: str
+  api_password:
+    description:
+      - the password to authenticate with
+      - can be supplied with the PROXMOX_PASSWORD environment variable.
+      - not necessary if api_token_id and api_token_secret are specified.
+    type: str
+  api_token_id:
+    description:
+      - the api token id to authenticate with
+      - can be supplied with the PROXMOX_TOKEN_ID environment variable.
+      - not necessary if api_password is specified.
+      - if specified, api_token_secret must also be specified.
+    type: str
+  api_token_secret:
+    description:
+      - the api token secret to authenticate with
+      - can be supllied with the PROXMOX_TOKEN_SECRET environment variable.
+      - not necessary if api_password is specified.
+      - if specified, api_token_id must also be specified.
+    type: str
+  api_user:
+    description:
+      - the user to authenticate with.
+      - required, unless clusters is given.
+    type: str
+  api_ticket_cache:
+    description:
+      - when true, the authentication ticket obtained with api_password is
+        stored on disk and reused by later module runs until shortly before
+        it expires.
+      - optional, default: true
+    type: bool
+  api_ticket_cache_dir:
+    description:
+      - directory the authentication tickets and access snapshots are cached
+        in, one 0600 file per api_host and api_user.
+      - optional, default: ~/.cache/proxmox_pve
+    type: str
+  api_snapshot_ttl:
+    description:
+      - when greater than 0, full `/access/users`, `/access/roles` and
+        `/access/acl` listings are shared on disk between module runs for
+        this many seconds and updated in place after this module's writes.
+      - optional, default: 0
+    type: int
+  api_connect_timeout:
+    description:
+      - seconds to wait for a connection to the API to be established.
+      - optional, default: 10
+    type: int
+  api_read_timeout:
+    description:
+      - seconds to wait for the API to answer a request.
+      - optional, default: 30
+    type: int
+  api_hosts:
+    description:
+      - further nodes of the same cluster that can serve the API, e.g.
+        C(pve2.example.com).  The fastest of them and api_host to answer is
+        used, and the next one takes over when it stops responding.
+      - optional, default: []
+    type: list
+  api_discover_nodes:
+    description:
+      - also consider the other online nodes of the cluster, at the address
+        `/cluster/status` lists for them.
+      - optional, default: false
+    type: bool
+  api_endpoint_ttl:
+    description:
+      - seconds the ranking of the nodes is kept next to the tickets and
+        reused before they are probed again.  0 probes on every run.
+      - optional, default: 60
+    type: int
+  max_workers:
+    description:
+      - number of create, update and delete calls sent to the cluster
+        concurrently.  Calls that depend on each other, such as a role and
+        the ACLs granting it, are still applied in order.
+      - a failing call is reported on its own entry in `results` and does
+        not stop the others.
+      - optional, default: 1
+    type: int
+  api_backend:
+    description:
+      - HTTP backend the API calls are sent with.  `asyncio` keeps up to
+        max_workers requests in flight over a small pool of connections and
+        requires the aiohttp python library.
+      - optional, default: requests
+    choices: [ requests, asyncio ]
+    type: str
+  roles:
+    description:
+      - list of Proxmox VE roles that should exist, see `role_object` in the
+        README for the supported keys.
+      - optional, default: []
+    type: list
+  removed_roles:
+    description:
+      - list of Proxmox VE roleids that should not exist.
+      - optional, default: []
+    type: list
+  users:
+    description:
+      - list of Proxmox VE users that should exist, see `user_object` in the
+        README for the supported keys.
+      - optional, default: []
+    type: list
+  removed_users:
+    description:
+      - list of Proxmox VE userids that should not exist.
+      - optional, default: []
+    type: list
+  acls:
+    description:
+      - list of Proxmox VE ACLs to grant, see `acl_object` in the README.
+      - optional, default: []
+    type: list
+  removed_acls:
+    description:
+      - list of Proxmox VE ACLs to revoke, see `acl_object` in the README.
+      - optional, default: []
+    type: list
+  purge:
+    description:
+      - kinds of entities, among C(users), C(roles) and C(acls), whose list
+        is complete: every user, role or ACL entry within purge_scope that
+        is not in it is deleted or revoked.  What to delete is worked out
+        from the same single read of `/access` as everything else.
+      - root@pam, api_user, the users in `passwords` and the built-in roles
+        are never deleted, nor the ACL entries of root@pam and api_user.
+        The ACL entries of users and roles deleted in the same run are left
+        to go with them.
+      - optional, default: []
+    type: list
+    choices: [users, roles, acls]
+  purge_scope:
+    description:
+      - limits what purge deletes, per kind.  `users` takes `realms` and a
+        shell-style `pattern` on the userid, `roles` a `pattern` on the
+        roleid, and `acls` the `paths` at and below which entries are
+        revoked, the `realms` of their users and tokens and a `pattern` on
+        their user, group or token.  A kind without a scope is purged
+        entirely.
+      - e.g. C({users: {realms: [pve]}, acls: {paths: [/pool/teams]}})
+      - optional, default: {}
+    type: dict
+  passwords:
+    description:
+      - list of Proxmox VE user passwords to set, see `password_object` in the
+        README.
+      - optional, default: []
+    type: list
+  password_check:
+    description:
+      - how to tell that a user already has the desired password, which is
+        then not set again.  See proxmox_pve_user_password.
+      - optional, default: always
+    type: str
+    choices: [always, fingerprint, verify]
+  clusters:
+    description:
+      - list of independent Proxmox VE clusters to reconcile with the same
+        desired state, instead of the one at api_host.  Every entry takes
+        `api_host` and optionally a `name` (default: its api_host),
+        `api_user`, `api_password`, `api_token_id`, `api_token_secret`,
+        `api_validate_certs` and `max_workers`; the ones left out are those
+        of the task.  An entry with a password or token of its own uses none
+        of the task's credentials.
+      - the clusters are reconciled concurrently, up to max_clusters at a
+        time, each with its own login and at most its max_workers calls in
+        flight.  The results are returned per cluster in `clusters`.
+      - in check mode with plan_file, every cluster writes its own plan
+        file, named after it, e.g. C(plan-pve1.jsonl) for C(plan.jsonl).
+      - optional.
+    type: list
+  max_clusters:
+    description:
+      - number of clusters reconciled at the same time.
+      - optional, default: 8
+    type: int
+  plan_file:
+    description:
+      - in check mode, write the planned changes to this file as JSON lines,
+        one object per change with its `before` and `after`, instead of
+        returning them in the per kind results.  Meant for reviewing plans
+        of thousands of changes.
+      - optional.
+    type: path
+author: Esten Rye
+'''
+
+RETURN = '''
+roles:
+  description: per role results, as returned by proxmox_pve_roles.
+  type: list
+users:
+  description: per user results, as returned by proxmox_pve_users.
+  type: list
+acls:
+  description: per request ACL results, as returned by proxmox_pve_acls.
+  type: list
+passwords:
+  description:
+    - one entry per requested password with the `userid`, the `action`
+      taken (set or none) and whether it `changed`.
+  type: list
+plan_file:
+  description: in check mode with plan_file, the file the planned changes were written to.
+  type: str
+clusters:
+  description:
+    - with clusters, the result of every cluster by name, with its
+      `changed`, `msg`, results and `api_stats`, and `failed` when it
+      failed.  `api_stats` of the task then sums those of all clusters.
+  type: dict
+api_stats:
+  description:
+    - number of API requests, errors, seconds and bytes sent and received,
+      in total and per method and endpoint, with a latency histogram for
+      every endpoint.
+  type: dict
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.proxmox_pve.access import (
+  DEFAULT_MAX_WORKERS,
+  acl_operations,
+  apply_operations,
+  password_operations,
+  plan_operations,
+  purged_acls,
+  purged_roles,
+  purged_users,
+  role_operations,
+  user_operations,
+)
+from ansible.module_utils.proxmox_pve.clusters import CLUSTER_OPTIONS, DEFAULT_MAX_CLUSTERS
+from ansible.module_utils.proxmox_pve.diff import acl_index
+from ansible.module_utils.proxmox_pve.module import api_argument_spec, run_bulk_module
+from ansible.module_utils.proxmox_pve.password import (
+  DEFAULT_PASSWORD_CHECK,
+  PASSWORD_CHECKS,
+  current_passwords,
+  password_fingerprints,
+  record_passwords,
+)
+from ansible.module_utils.proxmox_pve.read import read_collections
+
+def get_access(proxmox):
+  try:
+    listings = read_collections(proxmox, ['roles', 'users', 'acl'])
+    access = {
+      'roles': dict((role['roleid'], role) for role in listings['roles']),
+      'users': dict((user['userid'], user) for user in listings['users']),
+      'acls': acl_index(listings['acl']),
+    }
+  except Exception as e:
+    return {
+      'failed': True,
+      'msg': 'API failure encoutered. %s' % str(e),
+      'result': None
+    }
+
+  return {
+    'failed': False,
+    'result': access
+  }
+
+def group_results(results, unchanged):
+  grouped = dict(roles=[], users=[], acls=[], passwords=[])
+  for result in results + unchanged:
+    if 'path' in result:
+      grouped['acls'].append(result)
+    elif 'roleid' in result:
+      grouped['roles'].append(result)
+    elif result['action'] == 'set':
+      grouped['passwords'].append(result)
+    else:
+      grouped['users'].append(result)
+  return grouped
+
+def reconcile(proxmox, config, max_workers=DEFAULT_MAX_WORKERS, password_check=DEFAULT_PASSWORD_CHECK, cache_dir=None,
+              plan=None):
+  current = get_access(proxmox)
+  if current['failed']:
+    return current
+  current = current['result']
+
+  removed_roles, removed_users, removed_acls = config['removed_roles'], config['removed_users'], config['removed_acls']
+  purge = config.get('purge') or []
+  purge_scope = config.get('purge_scope') or {}
+  if 'roles' in purge:
+    removed_roles = sorted(set(removed_roles) | set(
+      purged_roles(current['roles'], config['roles'], purge_scope.get('roles') or {})))
+  if 'users' in purge:
+    keep = [proxmox.api_user] + [item['userid'] for item in config['passwords']]
+    removed_users = sorted(set(removed_users) | set(
+      purged_users(current['users'], config['users'], purge_scope.get('users') or {}, keep=keep)))
+  if 'acls' in purge:
+    removed_acls = list(removed_acls) + purged_acls(
+      current['acls'], config['acls'], purge_scope.get('acls') or {}, keep=[proxmox.api_user],
+      deleted_users=removed_users, deleted_roles=removed_roles)
+
+  role_ops, unchanged_roles = role_operations(current['roles'], config['roles'], removed_roles)
+  user_ops, unchanged_users = user_operations(current['users'], config['users'], removed_users)
+  acl_ops = acl_operations(current['acls'], config['acls'], removed_acls)
+  known_userids = set(current['users']) | set(item['userid'] for item in config['users'])
+  known_userids -= set(removed_users)
+  # users created by this run cannot have their password yet.
+  passwords = [(item['userid'], item['password']) for item in config['passwords']]
+  fingerprints = password_fingerprints(proxmox, cache_dir)
+  try:
+    current_userids = current_passwords(
+      proxmox, [item for item in passwords if item[0] in current['users'] and item[0] in known_userids],
+      password_check, fingerprints, max_workers)
+  except Exception as e:
+    return {
+      'failed': True,
+      'msg': 'API failure encountered.  %s' % str(e)
+    }
+  password_ops, unchanged_passwords, missing = password_operations(known_userids, config['passwords'], current_userids)
+  if missing:
+    return {
+      'failed': True,
+      'msg': 'user does not exist.  %s' % ', '.join(missing)
+    }
+
+  operations = role_ops + user_ops + acl_ops + password_ops
+  if plan is not None:
+    planned = plan_operations(operations, unchanged_roles + unchanged_users + unchanged_passwords, **plan)
+    # unchanged passwords come last and read the same as unchanged users.
+    results = planned.pop('results')
+    split = len(results) - len(unchanged_passwords) if results else 0
+    grouped = group_results(results[:split], [])
+    grouped['passwords'].extend(results[split:])
+    return dict(planned, **grouped)
+
+  applied = apply_operations(proxmox, operations, max_workers)
+  record_passwords(fingerprints, applied['results'], passwords)
+  grouped = group_results(applied['results'], unchanged_roles + unchanged_users)
+  grouped['passwords'].extend(unchanged_passwords)
+  if applied['failed']:
+    return dict(grouped, failed=True, msg=applied['msg'])
+
+  return dict(
+    grouped,
+    changed=len(applied['results']) > 0,
+    msg='Proxmox PVE access: %d changes applied.' % len(applied['results'])
+  )
+
+def main():
+  module = AnsibleModule(
+    argument_spec=api_argument_spec(
+      backend=True,
+      max_workers=dict(type='int', default=DEFAULT_MAX_WORKERS, required=False),
+      roles=dict(type='list', default=[], required=False),
+      removed_roles=dict(type='list', default=[], required=False),
+      users=dict(type='list', default=[], required=False),
+      removed_users=dict(type='list', default=[], required=False),
+      acls=dict(type='list', default=[], required=False),
+      removed_acls=dict(type='list', default=[], required=False),
+      passwords=dict(type='list', elements='dict', default=[], required=False, options=dict(
+        userid=dict(type='str', required=True),
+        password=dict(type='str', required=True, no_log=True),
+      )),
+      password_check=dict(type='str', default=DEFAULT_PASSWORD_CHECK, choices=PASSWORD_CHECKS, required=False, no_log=False),
+      plan_file=dict(type='path', required=False),
+      clusters=dict(type='list', elements='dict', required=False, options=CLUSTER_OPTIONS),
+      max_clusters=dict(type='int', default=DEFAULT_MAX_CLUSTERS, required=False),
+      purge=dict(type='list', elements='str', default=[], choices=['users', 'roles', 'acls'], required=False),
+      purge_scope=dict(type='dict', default={}, required=False, options=dict(
+        users=dict(type='dict', required=False, options=dict(
+          realms=dict(type='list', elements='str', required=False),
+          pattern=dict(type='str', required=False),
+        )),
+        roles=dict(type='dict', required=False, options=dict(
+          pattern=dict(type='str', required=False),
+        )),
+        acls=dict(type='dict', required=False, options=dict(
+          realms=dict(type='list', elements='str', required=False),
+          paths=dict(type='list', elements='str', required=False),
+          pattern=dict(type='str', required=False),
+        )),
+      )),
+    ),
+    supports_check_mode=True
+  )
+
+  config = dict(
+    (key, module.params[key] or [])
+    for key in ['roles', 'removed_roles', 'users', 'removed_users', 'acls', 'removed_acls', 'passwords']
+  )
+
+  for key, required in [('roles', ['roleid']), ('users', ['userid']), ('acls', ['path', 'roleid']),
+                        ('removed_acls', ['path', 'roleid']), ('passwords', ['userid', 'password'])]:
+    for item in config[key]:
+      if not isinstance(item, dict) or not all(item.get(field) for field in required):
+        module.fail_json(msg='every entry in %s must be a dict with %s.' % (key, ' and '.join(required)))
+
+  config.update(purge=module.params['purge'], purge_scope=module.params['purge_scope'])
+
+  def run(proxmox, params, plan):
+    return reconcile(proxmox, config, max_workers=params['max_workers'],
+                     password_check=params['password_check'],
+                     cache_dir=params['api_ticket_cache_dir'], plan=plan)
+
+  run_bulk_module(module, run)
+
+if __name__ == '__main__':
+    main()
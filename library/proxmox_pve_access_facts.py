@@ -0,0 +1,243 @@
+#!/usr/bin/python3
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = '''
+module: proxmox_pve_access_facts
+short_description: gathers Proxmox PVE users, groups, roles and ACLs as facts
+description:
+  - reads `/access/users?full=1`, `/access/groups`, `/access/roles` and
+    `/access/acl` in one pass and returns them as the `pve_access` fact,
+    indexed by userid, groupid, roleid and ACL path.
+  - with ansible fact caching enabled the fact is kept between runs, so
+    conditionals and templates can use it without asking the API again.
+  - only reads; supports check mode.
+options:
+  api_host:
+    description:
+      - the host of the Proxmox VE Cluster
+      - required.
+    type: str
+  api_password:
+    description:
+      - the password to authenticate with
+      - can be supplied with the PROXMOX_PASSWORD environment variable.
+      - not necessary if api_token_id and api_token_secret are specified.
+    type: str
+  api_token_id:
+    description:
+      - the api token id to authenticate with
+      - can be supplied with the PROXMOX_TOKEN_ID environment variable.
+      - not necessary if api_password is specified.
+      - if specified, api_token_secret must also be specified.
+    type: str
+  api_token_secret:
+    description:
+      - the api token secret to authenticate with
+      - can be supllied with the PROXMOX_TOKEN_SECRET environment variable.
+      - not necessary if api_password is specified.
+      - if specified, api_token_id must also be specified.
+    type: str
+  api_user:
+    description:
+      - the user to authenticate with.
+      - required.
+    type: str
+  api_ticket_cache:
+    description:
+      - when true, the authentication ticket obtained with api_password is
+        stored on disk and reused by later module runs until shortly before
+        it expires.
+      - optional, default: true
+    type: bool
+  api_ticket_cache_dir:
+    description:
+      - directory the authentication tickets and access snapshots are cached
+        in, one 0600 file per api_host and api_user.
+      - optional, default: ~/.cache/proxmox_pve
+    type: str
+  api_snapshot_ttl:
+    description:
+      - when greater than 0, the `/access/roles` and `/access/acl` listings
+        are taken from the on-disk snapshot the other modules share, if it is
+        younger than this many seconds, and stored in it otherwise.  Users
+        are always read, as the snapshot does not hold their tokens.
+      - optional, default: 0
+    type: int
+  api_connect_timeout:
+    description:
+      - seconds to wait for a connection to the API to be established.
+      - optional, default: 10
+    type: int
+  api_read_timeout:
+    description:
+      - seconds to wait for the API to answer a request.
+      - optional, default: 30
+    type: int
+  api_hosts:
+    description:
+      - further nodes of the same cluster that can serve the API, e.g.
+        C(pve2.example.com).  The fastest of them and api_host to answer is
+        used, and the next one takes over when it stops responding.
+      - optional, default: []
+    type: list
+  api_discover_nodes:
+    description:
+      - also consider the other online nodes of the cluster, at the address
+        `/cluster/status` lists for them.
+      - optional, default: false
+    type: bool
+  api_endpoint_ttl:
+    description:
+      - seconds the ranking of the nodes is kept next to the tickets and
+        reused before they are probed again.  0 probes on every run.
+      - optional, default: 60
+    type: int
+  api_backend:
+    description:
+      - HTTP backend the API calls are sent with.  `asyncio` reads the
+        collections concurrently and requires the aiohttp python library.
+      - optional, default: requests
+    choices: [ requests, asyncio ]
+    type: str
+  gather_subset:
+    description:
+      - the collections to read, any of `users`, `groups`, `roles` and `acl`,
+        or `all`.  Collections left out are missing from the fact.
+      - optional, default: [all]
+    type: list
+author: Esten Rye
+'''
+
+RETURN = '''
+ansible_facts:
+  description: facts added to the host.
+  type: dict
+  contains:
+    pve_access:
+      description:
+        - the gathered access configuration.  `api_host` and `gathered_at`
+          (seconds since epoch) tell where and when it was read.
+        - `users` maps userids to their fields, with `groups` as a list and
+          the user's api `tokens`.
+        - `groups` maps groupids to their `comment` and `users` list.
+        - `roles` maps roleids to their `privs` list and `special` flag.
+        - `acl` maps paths to the list of entries on them, each with
+          `roleid`, `type`, `ugid` and `propagate`.
+      type: dict
+api_stats:
+  description:
+    - number of API requests, errors, seconds and bytes sent and received,
+      in total and per method and endpoint, with a latency histogram for
+      every endpoint.
+  type: dict
+'''
+
+import time
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.proxmox_pve.diff import split_list, to_bool_int
+from ansible.module_utils.proxmox_pve.module import api_argument_spec, connect_module
+from ansible.module_utils.proxmox_pve.read import read_collections
+
+SUBSETS = ['users', 'groups', 'roles', 'acl']
+
+def index_users(users):
+  indexed = {}
+  for user in users:
+    user = dict(user)
+    user['groups'] = split_list(user.get('groups'))
+    user['tokens'] = user.get('tokens') or []
+    indexed[user.pop('userid')] = user
+  return indexed
+
+def index_groups(groups):
+  indexed = {}
+  for group in groups:
+    indexed[group['groupid']] = {
+      'comment': group.get('comment') or '',
+      'users': split_list(group.get('users')),
+    }
+  return indexed
+
+def index_roles(roles):
+  indexed = {}
+  for role in roles:
+    indexed[role['roleid']] = {
+      'privs': sorted(split_list(role.get('privs'))),
+      'special': to_bool_int(role.get('special')),
+    }
+  return indexed
+
+def index_acl(acls):
+  indexed = {}
+  for acl in acls:
+    indexed.setdefault(acl['path'], []).append({
+      'roleid': acl['roleid'],
+      'type': acl['type'],
+      'ugid': acl['ugid'],
+      'propagate': 1 if acl.get('propagate') is None else to_bool_int(acl['propagate']),
+    })
+  for entries in indexed.values():
+    entries.sort(key=lambda entry: (entry['roleid'], entry['type'], entry['ugid']))
+  return indexed
+
+INDEXERS = {
+  'users': index_users,
+  'groups': index_groups,
+  'roles': index_roles,
+  'acl': index_acl,
+}
+
+def gather(proxmox, subset):
+  try:
+    listings = read_collections(proxmox, subset, params={'users': {'full': 1}} if 'users' in subset else None)
+  except Exception as e:
+    return {
+      'failed': True,
+      'msg': 'API failure encountered.  %s' % str(e)
+    }
+
+  facts = {
+    'api_host': proxmox.api_host,
+    'gathered_at': int(time.time()),
+  }
+  for collection in subset:
+    facts[collection] = INDEXERS[collection](listings[collection] or [])
+  return {
+    'changed': False,
+    'msg': 'gathered Proxmox PVE %s.' % ', '.join(subset),
+    'ansible_facts': {'pve_access': facts}
+  }
+
+def main():
+  module = AnsibleModule(
+    argument_spec=api_argument_spec(
+      backend=True,
+      gather_subset=dict(type='list', elements='str', default=['all'], required=False),
+    ),
+    supports_check_mode=True
+  )
+
+  subset = module.params['gather_subset']
+  unknown = [name for name in subset if name not in SUBSETS + ['all']]
+  if unknown:
+    module.fail_json(msg='unknown gather_subset %s.  Expected any of %s or all.' % (', '.join(unknown), ', '.join(SUBSETS)))
+  if 'all' in subset:
+    subset = SUBSETS
+  subset = [name for name in SUBSETS if name in subset]
+
+  proxmox = connect_module(module, concurrency=len(subset))
+
+  result = gather(proxmox, subset)
+
+  if 'changed' in result:
+    module.exit_json(api_stats=proxmox.stats.as_dict(), **result)
+  else:
+    module.fail_json(api_stats=proxmox.stats.as_dict(), **result)
+
+if __name__ == '__main__':
+    main()
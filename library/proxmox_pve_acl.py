@@ -10,6 +10,8 @@ module: proxmox_pve_acl
 short_description: management of Proxmox PVE ACLs
 description:
   - allows you to create, modify and delete Proxmox PVE ACLs
+  - supports check mode, in which nothing is written and `results` holds the
+    planned change with its `before` and `after`, and diff mode.
 options:
   api_host:
     description:
@@ -41,6 +43,55 @@ options:
       - the user to authenticate with.
       - required.
     type: str
+  api_ticket_cache:
+    description:
+      - when true, the authentication ticket obtained with api_password is
+        stored on disk and reused by later module runs until shortly before
+        it expires.
+      - optional, default: true
+    type: bool
+  api_ticket_cache_dir:
+    description:
+      - directory the authentication tickets and access snapshots are cached
+        in, one 0600 file per api_host and api_user.
+      - optional, default: ~/.cache/proxmox_pve
+    type: str
+  api_snapshot_ttl:
+    description:
+      - when greater than 0, full `/access/users`, `/access/roles` and
+        `/access/acl` listings are shared on disk between module runs for
+        this many seconds and updated in place after this module's writes.
+      - optional, default: 0
+    type: int
+  api_connect_timeout:
+    description:
+      - seconds to wait for a connection to the API to be established.
+      - optional, default: 10
+    type: int
+  api_read_timeout:
+    description:
+      - seconds to wait for the API to answer a request.
+      - optional, default: 30
+    type: int
+  api_hosts:
+    description:
+      - further nodes of the same cluster that can serve the API, e.g.
+        C(pve2.example.com).  The fastest of them and api_host to answer is
+        used, and the next one takes over when it stops responding.
+      - optional, default: []
+    type: list
+  api_discover_nodes:
+    description:
+      - also consider the other online nodes of the cluster, at the address
+        `/cluster/status` lists for them.
+      - optional, default: false
+    type: bool
+  api_endpoint_ttl:
+    description:
+      - seconds the ranking of the nodes is kept next to the tickets and
+        reused before they are probed again.  0 probes on every run.
+      - optional, default: 60
+    type: int
   path:
     description:
       - the Proxmox VE Access Control PATH to modify.
@@ -81,214 +132,186 @@ options:
 author: Esten Rye
 '''
 
-import os
-import json
-
-try:
-    from proxmoxer import ProxmoxAPI
-    HAS_PROXMOXER = True
-except ImportError:
-    HAS_PROXMOXER = False
+RETURN = '''
+results:
+  description:
+    - in check mode, the planned change of the ACL entries with the `action` it
+      would take (granted, revoked or none) and its `before` and `after`.
+  type: list
+api_stats:
+  description:
+    - number of API requests, errors, seconds and bytes sent and received,
+      in total and per method and endpoint, with a latency histogram for
+      every endpoint.
+  type: dict
+'''
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils._text import to_native
-
-def get_acl_object(acls, acl_path, roleid):
-  return dict(
-    acl_path=acl_path,
-    roleid=roleid,
-    users=[ acl['ugid'] for acl in list(
-      filter(lambda x: filter_acl(x, acl_path, roleid, 'user'), acls)
-    )],
-    groups=[ acl['ugid'] for acl in list(
-      filter(lambda x: filter_acl(x, acl_path, roleid, 'group'), acls)
-    )],
-    tokens=[ acl['ugid'] for acl in list(
-      filter(lambda x: filter_acl(x, acl_path, roleid, 'token'), acls)
-    )],
-  )
-
-def filter_acl(acl, path, roleid, identity_type):
-  return acl['path'] == path and acl['roleid'] == roleid and acl['type'] == identity_type
+from ansible.module_utils.proxmox_pve.access import acl_operations, plan_operations
+from ansible.module_utils.proxmox_pve.diff import (
+  IDENTITY_TYPES,
+  acl_index,
+  expand_acl,
+  missing_acl_entries,
+  present_acl_entries,
+)
+from ansible.module_utils.proxmox_pve.module import api_argument_spec, connect_module
+from ansible.module_utils.proxmox_pve.read import read_acls
 
 def get_acl(proxmox, acl_path, roleid):
   try:
-    acls = proxmox.access.acl.get()
+    acls = read_acls(proxmox)
   except Exception as e:
     return {
       'failed': True,
       'msg': 'API failure encoutered. %s' % str(e),
       'result': None
     }
-  
-  acl = get_acl_object(acls, acl_path, roleid)
 
   return {
     'failed': False,
-    'result': acl
+    'result': acl_index(
+      acl for acl in acls if acl['path'] == acl_path and acl['roleid'] == roleid
+    )
   }
 
+def put_acl(proxmox, args, entries, delete):
+  identities = dict((key, []) for identity_type, key in IDENTITY_TYPES)
+  for entry in entries:
+    identities[dict(IDENTITY_TYPES)[entry[2]]].append(entry[3])
+  proxmox.access.acl.put(
+    path=args['acl_path'],
+    roles=args['roleid'],
+    delete=delete,
+    propagate=args['propagate'],
+    **dict((key, ','.join(sorted(value))) for key, value in identities.items() if value)
+  )
+
+def requested_entries(args):
+  return expand_acl(
+    args['acl_path'],
+    args['roleid'],
+    users=args['users'],
+    groups=args['groups'],
+    tokens=args['tokens'],
+    propagate=args['propagate']
+  )
+
+def plan_acl(proxmox, args, state, plan):
+  current_acl = get_acl(proxmox, args['acl_path'], args['roleid'])
+
+  if current_acl['failed']:
+    return current_acl
+
+  item = dict((key, args[key]) for key in ['roleid', 'groups', 'propagate', 'tokens', 'users'])
+  item['path'] = args['acl_path']
+  if state == 'present':
+    operations = acl_operations(current_acl['result'], [item], [])
+  else:
+    operations = acl_operations(current_acl['result'], [], [item])
+  unchanged = []
+  if not operations:
+    unchanged.append(dict(path=args['acl_path'], roleid=args['roleid'], action='none', changed=False))
+  return plan_operations(operations, unchanged, **plan)
+
 def present(proxmox, args):
   current_acl = get_acl(proxmox, args['acl_path'], args['roleid'])
-  
+
   if current_acl['failed']:
     return current_acl
-  
+
+  missing = missing_acl_entries(current_acl['result'], requested_entries(args))
+  if not missing:
+    return {
+      'changed': False,
+      'msg': 'Proxmox PVE ACL on path %s for roleid %s already exists.' % (args['acl_path'], args['roleid'])
+    }
+
   try:
-    proxmox.access.acl.put(
-      path=args['acl_path'],
-      roles=[args['roleid']],
-      delete=0,
-      groups=args['groups'],
-      propagate=args['propagate'],
-      tokens=args['tokens'],
-      users=args['users']
-    )      
+    put_acl(proxmox, args, missing, 0)
   except Exception as e:
     return {
       'failed': True,
       'msg': 'API failure encountered.  %s' % str(e)
     }
-  updated_acl = get_acl(proxmox, args['acl_path'], args['roleid'])
-  if updated_acl['failed']:
-    return updated_acl
-    
-  HAS_CHANGED = False
-  for key in updated_acl['result'].keys():
-    if key == 'keys':
-      continue
-    elif current_acl['result'][key] == updated_acl['result'][key]:
-      continue
-    else:
-      HAS_CHANGED = True
-      break
-  
+
   return {
-    'changed': HAS_CHANGED,
-    'msg': 'Proxmox PVE ACL on path %s for roleid %s already exists.' % (args['acl_path'], args['roleid'])
+    'changed': True,
+    'msg': 'Proxmox PVE ACL on path %s for roleid %s was granted.' % (args['acl_path'], args['roleid'])
   }
 
 def absent(proxmox, args):
   current_acl = get_acl(proxmox, args['acl_path'], args['roleid'])
-  
+
   if current_acl['failed']:
     return current_acl
 
-  if current_acl['result']:
-    try:
-      proxmox.access.acl.put(
-        path=args['acl_path'],
-        roles=[args['roleid']],
-        delete=1,
-        groups=args['groups'],
-        propagate=args['propagate'],
-        tokens=args['tokens'],
-        users=args['users']
-      )      
-    except Exception as e:
-      return {
-        'failed': True,
-        'msg': 'API failure encountered.  %s' % str(e)
-      }
-    updated_acl = get_acl(proxmox, args['acl_path'], args['roleid'])
-
-    HAS_CHANGED = False
-    for key in updated_acl['result'].keys():
-      if key == 'keys':
-        continue
-      elif current_acl['result'][key] == updated_acl['result'][key]:
-        continue
-      else:
-        HAS_CHANGED = True
-        break
-
-    return {
-      'changed': HAS_CHANGED,
-      'msg': 'Proxmox PVE ACL on path %s for roleid %s was removed.' % (args['acl_path'], args['roleid'])
-    }
-  else:
+  existing = present_acl_entries(current_acl['result'], requested_entries(args))
+  if not existing:
     return {
       'changed': False,
       'msg': 'Proxmox PVE ACL on path %s for roleid %s does not exist.' % (args['acl_path'], args['roleid'])
     }
 
-def main():
-  module = AnsibleModule(
-    argument_spec=dict(
-      state=dict(type='str', default='present', choices=['present', 'absent']),
-      api_host=dict(type='str', required=True),
-      api_password=dict(type='str', no_log=True),
-      api_token_id=dict(type='str', no_log=True),
-      api_token_secret=dict(type='str', no_log=True),
-      api_user=dict(type='str', required=True),
-      api_validate_certs=dict(type='bool', default=True),
-      path=dict(type='str', required=True),
-      roleid=dict(type='str', required=True),
-      groups=dict(type='list', default=[], required=False),
-      propagate=dict(type='bool', default=True, required=False),
-      tokens=dict(type='list', default=[], required=False),
-      users=dict(type='list', default=[], required=False)
-    )
+  try:
+    put_acl(proxmox, args, existing, 1)
+  except Exception as e:
+    return {
+      'failed': True,
+      'msg': 'API failure encountered.  %s' % str(e)
+    }
+
+  return {
+    'changed': True,
+    'msg': 'Proxmox PVE ACL on path %s for roleid %s was removed.' % (args['acl_path'], args['roleid'])
+  }
+
+def argument_spec():
+  return api_argument_spec(
+    state=dict(type='str', default='present', choices=['present', 'absent']),
+    path=dict(type='str', required=True),
+    roleid=dict(type='str', required=True),
+    groups=dict(type='list', default=[], required=False),
+    propagate=dict(type='bool', default=True, required=False),
+    tokens=dict(type='list', default=[], required=False),
+    users=dict(type='list', default=[], required=False)
   )
 
-  if not HAS_PROXMOXER:
-    module.fail_json(msg='proxmoxer required for this module')
-  
-  state = module.params['state']
-  api_host = module.params['api_host']
-  api_password = module.params['api_password']
-  api_token_id = module.params['api_token_id']
-  api_token_secret = module.params['api_token_secret']
-  api_user = module.params['api_user']
-  api_validate_certs = module.params['api_validate_certs']
+def run(proxmox, params, plan=None):
+  state = params['state']
   args = {
-    'acl_path': module.params['path'],
-    'roleid': module.params['roleid'],
-    'groups': module.params['groups'],
-    'propagate': 1 if module.params['propagate'] else 0,
-    'tokens': module.params['tokens'],
-    'users': module.params['users']
+    'acl_path': params['path'],
+    'roleid': params['roleid'],
+    'groups': params['groups'],
+    'propagate': 1 if params['propagate'] else 0,
+    'tokens': params['tokens'],
+    'users': params['users']
+  }
+  if plan is not None and state in ['present', 'absent']:
+    return plan_acl(proxmox, args, state, plan)
+  if state == 'present':
+    return present(proxmox, args)
+  elif state == 'absent':
+    return absent(proxmox, args)
+  return {
+    'failed': True,
+    'msg': 'invalid state `%s`.  Expected `present` or `absent`.' % state
   }
 
-  auth_args = {'user': api_user}
-
-  if api_token_id and not api_token_secret:
-    try:
-      api_token_secret = os.environ['PROXMOX_TOKEN_SECRET']
-    except KeyError as e:
-      module.fail_json(msg='You should set api_token_secret param or use PROXMOX_TOKEN_SECRET environment variable')
-  
-  if not (api_token_id and api_token_secret):
-    # If password not set get it from PROXMOX_PASSWORD env
-    if not api_password:
-      try:
-        api_password = os.environ['PROXMOX_PASSWORD']
-      except KeyError as e:
-        module.fail_json(msg='You should set api_password param or use PROXMOX_PASSWORD environment variable')
-    auth_args['password'] = api_password
-  else:
-    auth_args['token_name'] = api_token_id
-    auth_args['token_value'] = api_token_secret
+def main():
+  module = AnsibleModule(argument_spec=argument_spec(), supports_check_mode=True)
 
-  proxmox = None
-  try:
-    proxmox = ProxmoxAPI(api_host, verify_ssl=api_validate_certs, **auth_args)
-  except Exception as e:
-    module.fail_json(msg='authorization on proxmox cluster failed with exception: %s' % e)
+  proxmox = connect_module(module)
   
-  result = {}
-  if state == 'present':
-    result = present(proxmox, args)
-  elif state == 'absent':
-    result = absent(proxmox, args)
-  else:
-    module.fail_json(msg='invalid state `%s`.  Expected `present` or `absent`.' % state)
-    return
+  plan = None
+  if module.check_mode:
+    plan = dict(diff=module._diff)
+  result = run(proxmox, module.params, plan)
   
   if 'changed' in result:
-    module.exit_json(changed=result['changed'], msg=result['msg'])
+    module.exit_json(api_stats=proxmox.stats.as_dict(), **result)
   else:
-    module.fail_json(msg=result['msg'])
+    module.fail_json(msg=result['msg'], api_stats=proxmox.stats.as_dict())
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,295 @@
+#!/usr/bin/python3
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = '''
+module: proxmox_pve_acls
+short_description: bulk management of Proxmox PVE ACLs
+description:
+  - reconciles whole lists of Proxmox PVE ACLs in a single invocation.
+  - reads `/access/acl` once, computes the entries to grant and revoke as a
+    set difference and sends one `PUT /access/acl` per path, roleid,
+    propagate and delete combination.
+  - supports check mode, in which nothing is written and `results` holds the
+    planned changes with their `before` and `after`, and diff mode.
+options:
+  api_host:
+    description:
+      - the host of the Proxmox VE Cluster
+      - required, unless clusters is given.
+    type: str
+  api_password:
+    description:
+      - the password to authenticate with
+      - can be supplied with the PROXMOX_PASSWORD environment variable.
+      - not necessary if api_token_id and api_token_secret are specified.
+    type: str
+  api_token_id:
+    description:
+      - the api token id to authenticate with
+      - can be supplied with the PROXMOX_TOKEN_ID environment variable.
+      - not necessary if api_password is specified.
+      - if specified, api_token_secret must also be specified.
+    type: str
+  api_token_secret:
+    description:
+      - the api token secret to authenticate with
+      - can be supllied with the PROXMOX_TOKEN_SECRET environment variable.
+      - not necessary if api_password is specified.
+      - if specified, api_token_id must also be specified.
+    type: str
+  api_user:
+    description:
+      - the user to authenticate with.
+      - required, unless clusters is given.
+    type: str
+  api_ticket_cache:
+    description:
+      - when true, the authentication ticket obtained with api_password is
+        stored on disk and reused by later module runs until shortly before
+        it expires.
+      - optional, default: true
+    type: bool
+  api_ticket_cache_dir:
+    description:
+      - directory the authentication tickets and access snapshots are cached
+        in, one 0600 file per api_host and api_user.
+      - optional, default: ~/.cache/proxmox_pve
+    type: str
+  api_snapshot_ttl:
+    description:
+      - when greater than 0, full `/access/users`, `/access/roles` and
+        `/access/acl` listings are shared on disk between module runs for
+        this many seconds and updated in place after this module's writes.
+      - optional, default: 0
+    type: int
+  api_connect_timeout:
+    description:
+      - seconds to wait for a connection to the API to be established.
+      - optional, default: 10
+    type: int
+  api_read_timeout:
+    description:
+      - seconds to wait for the API to answer a request.
+      - optional, default: 30
+    type: int
+  api_hosts:
+    description:
+      - further nodes of the same cluster that can serve the API, e.g.
+        C(pve2.example.com).  The fastest of them and api_host to answer is
+        used, and the next one takes over when it stops responding.
+      - optional, default: []
+    type: list
+  api_discover_nodes:
+    description:
+      - also consider the other online nodes of the cluster, at the address
+        `/cluster/status` lists for them.
+      - optional, default: false
+    type: bool
+  api_endpoint_ttl:
+    description:
+      - seconds the ranking of the nodes is kept next to the tickets and
+        reused before they are probed again.  0 probes on every run.
+      - optional, default: 60
+    type: int
+  max_workers:
+    description:
+      - number of create, update and delete calls sent to the cluster
+        concurrently.  Calls that depend on each other, such as a role and
+        the ACLs granting it, are still applied in order.
+      - a failing call is reported on its own entry in `results` and does
+        not stop the others.
+      - optional, default: 1
+    type: int
+  api_backend:
+    description:
+      - HTTP backend the API calls are sent with.  `asyncio` keeps up to
+        max_workers requests in flight over a small pool of connections and
+        requires the aiohttp python library.
+      - optional, default: requests
+    choices: [ requests, asyncio ]
+    type: str
+  acls:
+    description:
+      - list of Proxmox VE ACLs to grant, see `acl_object` in the README for
+        the supported keys.
+      - optional, default: []
+    type: list
+  removed_acls:
+    description:
+      - list of Proxmox VE ACLs to revoke, see `acl_object` in the README for
+        the supported keys.
+      - optional, default: []
+    type: list
+  purge:
+    description:
+      - when true, `acls` is the complete list of ACL entries within
+        purge_scope and every other entry in it is revoked, from the one
+        read of `/access/acl`.
+      - the entries of root@pam, api_user and the tokens of api_user are
+        never revoked.
+      - optional, default: false
+    type: bool
+  purge_scope:
+    description:
+      - limits the entries purge revokes.  `paths` keeps it to the listed
+        paths and the paths below them, `realms` to entries for users and
+        tokens of the listed realms, and `pattern` to entries whose user,
+        group or token matches the shell-style pattern.  Without any every
+        entry is in scope.
+      - optional, default: {}
+    type: dict
+  clusters:
+    description:
+      - list of independent Proxmox VE clusters to reconcile with the same
+        desired state, instead of the one at api_host.  Every entry takes
+        `api_host` and optionally a `name` (default: its api_host),
+        `api_user`, `api_password`, `api_token_id`, `api_token_secret`,
+        `api_validate_certs` and `max_workers`; the ones left out are those
+        of the task.  An entry with a password or token of its own uses none
+        of the task's credentials.
+      - the clusters are reconciled concurrently, up to max_clusters at a
+        time, each with its own login and at most its max_workers calls in
+        flight.  The results are returned per cluster in `clusters`.
+      - in check mode with plan_file, every cluster writes its own plan
+        file, named after it, e.g. C(plan-pve1.jsonl) for C(plan.jsonl).
+      - optional.
+    type: list
+  max_clusters:
+    description:
+      - number of clusters reconciled at the same time.
+      - optional, default: 8
+    type: int
+  plan_file:
+    description:
+      - in check mode, write the planned changes to this file as JSON lines,
+        one object per change with its `before` and `after`, instead of
+        returning them in `results`.  Meant for reviewing plans of
+        thousands of changes.
+      - optional.
+    type: path
+author: Esten Rye
+'''
+
+RETURN = '''
+results:
+  description:
+    - one entry per `PUT /access/acl` sent with the `path`, `roleid`,
+      `propagate`, the `action` taken (granted or revoked) and the `users`,
+      `groups` and `tokens` it applied to.
+  type: list
+plan_file:
+  description: in check mode with plan_file, the file the planned changes were written to.
+  type: str
+clusters:
+  description:
+    - with clusters, the result of every cluster by name, with its
+      `changed`, `msg`, results and `api_stats`, and `failed` when it
+      failed.  `api_stats` of the task then sums those of all clusters.
+  type: dict
+api_stats:
+  description:
+    - number of API requests, errors, seconds and bytes sent and received,
+      in total and per method and endpoint, with a latency histogram for
+      every endpoint.
+  type: dict
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.proxmox_pve.access import (
+  DEFAULT_MAX_WORKERS,
+  acl_operations,
+  apply_operations,
+  plan_operations,
+  purged_acls,
+)
+from ansible.module_utils.proxmox_pve.clusters import CLUSTER_OPTIONS, DEFAULT_MAX_CLUSTERS
+from ansible.module_utils.proxmox_pve.diff import acl_index
+from ansible.module_utils.proxmox_pve.module import api_argument_spec, run_bulk_module
+from ansible.module_utils.proxmox_pve.read import read_acls
+
+def get_acls(proxmox):
+  try:
+    acls = read_acls(proxmox)
+  except Exception as e:
+    return {
+      'failed': True,
+      'msg': 'API failure encoutered. %s' % str(e),
+      'result': None
+    }
+
+  return {
+    'failed': False,
+    'result': acl_index(acls)
+  }
+
+def reconcile(proxmox, acls, removed_acls, max_workers=DEFAULT_MAX_WORKERS, plan=None, purge_scope=None):
+  current_acls = get_acls(proxmox)
+  if current_acls['failed']:
+    return current_acls
+  if purge_scope is not None:
+    removed_acls = list(removed_acls) + purged_acls(current_acls['result'], acls, purge_scope, keep=[proxmox.api_user])
+
+  operations = acl_operations(current_acls['result'], acls, removed_acls)
+  if plan is not None:
+    return plan_operations(operations, [], **plan)
+  applied = apply_operations(proxmox, operations, max_workers)
+  results = applied['results']
+  if applied['failed']:
+    return applied
+
+  return {
+    'changed': len(results) > 0,
+    'msg': 'Proxmox PVE ACLs: %d entries granted, %d entries revoked in %d requests.' % (
+      count_acl_entries(results, 'granted'), count_acl_entries(results, 'revoked'), len(results)),
+    'results': results
+  }
+
+def count_acl_entries(results, action):
+  return sum(
+    len(result['users']) + len(result['groups']) + len(result['tokens'])
+    for result in results if result['action'] == action
+  )
+
+def main():
+  module = AnsibleModule(
+    argument_spec=api_argument_spec(
+      backend=True,
+      max_workers=dict(type='int', default=DEFAULT_MAX_WORKERS, required=False),
+      acls=dict(type='list', default=[], required=False),
+      removed_acls=dict(type='list', default=[], required=False),
+      purge=dict(type='bool', default=False, required=False),
+      purge_scope=dict(type='dict', default={}, required=False, options=dict(
+        realms=dict(type='list', elements='str', required=False),
+        paths=dict(type='list', elements='str', required=False),
+        pattern=dict(type='str', required=False),
+      )),
+      plan_file=dict(type='path', required=False),
+      clusters=dict(type='list', elements='dict', required=False, options=CLUSTER_OPTIONS),
+      max_clusters=dict(type='int', default=DEFAULT_MAX_CLUSTERS, required=False),
+    ),
+    supports_check_mode=True
+  )
+
+  acls = module.params['acls'] or []
+  removed_acls = module.params['removed_acls'] or []
+
+  for item in acls + removed_acls:
+    if not isinstance(item, dict) or not item.get('path') or not item.get('roleid'):
+      module.fail_json(msg='every ACL entry must be a dict with a path and roleid, got `%s`.' % item)
+
+  purge_scope = None
+  if module.params['purge']:
+    purge_scope = module.params['purge_scope'] or {}
+
+  def run(proxmox, params, plan):
+    return reconcile(proxmox, acls, removed_acls, max_workers=params['max_workers'], plan=plan,
+                     purge_scope=purge_scope)
+
+  run_bulk_module(module, run)
+
+if __name__ == '__main__':
+    main()
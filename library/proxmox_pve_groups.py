@@ -0,0 +1,221 @@
+#!/usr/bin/python3
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = '''
+module: proxmox_pve_groups
+short_description: bulk management of Proxmox PVE Groups and their members
+description:
+  - creates, updates and deletes a whole list of Proxmox PVE Groups and sets
+    their members in a single invocation.
+  - reads `/access/groups` once and computes the members to add to and
+    remove from every group as set differences.  As Proxmox VE sets the
+    groups of a user as a whole, the changes of all groups are written with
+    a single update per user whose memberships change, however many groups
+    the user joins or leaves.
+  - supports check mode, in which nothing is written and `results` holds the
+    planned changes with their `before` and `after`, and diff mode.
+options:
+  api_host:
+    description:
+      - the host of the Proxmox VE Cluster
+      - required.
+    type: str
+  api_password:
+    description:
+      - the password to authenticate with
+      - can be supplied with the PROXMOX_PASSWORD environment variable.
+      - not necessary if api_token_id and api_token_secret are specified.
+    type: str
+  api_token_id:
+    description:
+      - the api token id to authenticate with
+      - can be supplied with the PROXMOX_TOKEN_ID environment variable.
+      - not necessary if api_password is specified.
+      - if specified, api_token_secret must also be specified.
+    type: str
+  api_token_secret:
+    description:
+      - the api token secret to authenticate with
+      - can be supllied with the PROXMOX_TOKEN_SECRET environment variable.
+      - not necessary if api_password is specified.
+      - if specified, api_token_id must also be specified.
+    type: str
+  api_user:
+    description:
+      - the user to authenticate with.
+      - required.
+    type: str
+  api_ticket_cache:
+    description:
+      - when true, the authentication ticket obtained with api_password is
+        stored on disk and reused by later module runs until shortly before
+        it expires.
+      - optional, default: true
+    type: bool
+  api_ticket_cache_dir:
+    description:
+      - directory the authentication tickets and access snapshots are cached
+        in, one 0600 file per api_host and api_user.
+      - optional, default: ~/.cache/proxmox_pve
+    type: str
+  api_snapshot_ttl:
+    description:
+      - when greater than 0, the on-disk snapshot of the `/access` listings
+        the other modules share is kept up to date with the changes made
+        here.  Groups themselves are not part of it and always read.
+      - optional, default: 0
+    type: int
+  api_connect_timeout:
+    description:
+      - seconds to wait for a connection to the API to be established.
+      - optional, default: 10
+    type: int
+  api_read_timeout:
+    description:
+      - seconds to wait for the API to answer a request.
+      - optional, default: 30
+    type: int
+  api_hosts:
+    description:
+      - further nodes of the same cluster that can serve the API, e.g.
+        C(pve2.example.com).  The fastest of them and api_host to answer is
+        used, and the next one takes over when it stops responding.
+      - optional, default: []
+    type: list
+  api_discover_nodes:
+    description:
+      - also consider the other online nodes of the cluster, at the address
+        `/cluster/status` lists for them.
+      - optional, default: false
+    type: bool
+  api_endpoint_ttl:
+    description:
+      - seconds the ranking of the nodes is kept next to the tickets and
+        reused before they are probed again.  0 probes on every run.
+      - optional, default: 60
+    type: int
+  max_workers:
+    description:
+      - number of create, update and delete calls sent to the cluster
+        concurrently.  Calls that depend on each other, such as a role and
+        the ACLs granting it, are still applied in order.
+      - a failing call is reported on its own entry in `results` and does
+        not stop the others.
+      - optional, default: 1
+    type: int
+  api_backend:
+    description:
+      - HTTP backend the API calls are sent with.  `asyncio` keeps up to
+        max_workers requests in flight over a small pool of connections and
+        requires the aiohttp python library.
+      - optional, default: requests
+    choices: [ requests, asyncio ]
+    type: str
+  groups:
+    description:
+      - list of Proxmox VE groups to create or update, see `group_object` in
+        the README.
+      - optional, default: []
+    type: list
+  removed_groups:
+    description:
+      - list of groupids to delete, which also removes them from their
+        members.  Groups that do not exist are left alone.
+      - optional, default: []
+    type: list
+  plan_file:
+    description:
+      - in check mode, write the planned changes to this file as JSON lines,
+        one object per change with its `before` and `after`, instead of
+        returning them in `results`.  Meant for reviewing plans of
+        thousands of changes.
+      - optional.
+    type: path
+author: Esten Rye
+'''
+
+RETURN = '''
+results:
+  description:
+    - one entry per group with the `groupid`, the `action` taken (created,
+      updated, deleted or none) and whether it `changed`, and one entry per
+      user whose memberships were written, with the `userid`, action
+      `members` and the groups `added` and `removed`.
+  type: list
+plan_file:
+  description: in check mode with plan_file, the file the planned changes were written to.
+  type: str
+api_stats:
+  description:
+    - number of API requests, errors, seconds and bytes sent and received,
+      in total and per method and endpoint, with a latency histogram for
+      every endpoint.
+  type: dict
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.proxmox_pve.access import (
+  DEFAULT_MAX_WORKERS,
+  apply_operations,
+  count_actions,
+  group_operations,
+  plan_operations,
+)
+from ansible.module_utils.proxmox_pve.module import api_argument_spec, run_bulk_module
+from ansible.module_utils.proxmox_pve.read import read_groups
+
+def reconcile(proxmox, groups, removed_groups, max_workers=DEFAULT_MAX_WORKERS, plan=None):
+  try:
+    current_groups = read_groups(proxmox)
+  except Exception as e:
+    return {
+      'failed': True,
+      'msg': 'API failure encountered.  %s' % str(e)
+    }
+
+  operations, unchanged = group_operations(current_groups, groups, removed_groups)
+  if plan is not None:
+    return plan_operations(operations, unchanged, **plan)
+
+  applied = apply_operations(proxmox, operations, max_workers)
+  results = applied['results'] + unchanged
+  if applied['failed']:
+    return dict(applied, results=results)
+
+  return {
+    'changed': len(applied['results']) > 0,
+    'msg': 'Proxmox PVE Groups: %d created, %d updated, %d deleted, %d members updated, %d unchanged.' % (
+      count_actions(results, 'created'), count_actions(results, 'updated'), count_actions(results, 'deleted'),
+      count_actions(results, 'members'), len(unchanged)),
+    'results': results
+  }
+
+def main():
+  module = AnsibleModule(
+    argument_spec=api_argument_spec(
+      backend=True,
+      max_workers=dict(type='int', default=DEFAULT_MAX_WORKERS, required=False),
+      groups=dict(type='list', elements='dict', default=[], required=False, options=dict(
+        groupid=dict(type='str', required=True),
+        comment=dict(type='str', required=False),
+        members=dict(type='list', elements='str', required=False),
+        append=dict(type='bool', default=False, required=False),
+      )),
+      removed_groups=dict(type='list', elements='str', default=[], required=False),
+      plan_file=dict(type='path', required=False),
+    ),
+    supports_check_mode=True
+  )
+
+  def run(proxmox, params, plan):
+    return reconcile(proxmox, params['groups'] or [], params['removed_groups'] or [],
+                     max_workers=params['max_workers'], plan=plan)
+
+  run_bulk_module(module, run)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/python3
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = '''
+module: proxmox_pve_permissions
+short_description: reports effective Proxmox PVE privileges
+description:
+  - reads `/access/users?full=1`, `/access/groups`, `/access/roles` and
+    `/access/acl` once and computes the privileges of users and api tokens
+    on ACL paths locally, the way Proxmox VE evaluates them, instead of
+    asking `/access/permissions` once per identity.
+  - follows propagation down the path tree, with an identity's own entries
+    taking precedence over its groups' on the same path, NoAccess, token
+    privilege separation, and disabled or expired users and tokens.
+  - only reads; supports check mode.
+options:
+  api_host:
+    description:
+      - the host of the Proxmox VE Cluster
+      - required.
+    type: str
+  api_password:
+    description:
+      - the password to authenticate with
+      - can be supplied with the PROXMOX_PASSWORD environment variable.
+      - not necessary if api_token_id and api_token_secret are specified.
+    type: str
+  api_token_id:
+    description:
+      - the api token id to authenticate with
+      - can be supplied with the PROXMOX_TOKEN_ID environment variable.
+      - not necessary if api_password is specified.
+      - if specified, api_token_secret must also be specified.
+    type: str
+  api_token_secret:
+    description:
+      - the api token secret to authenticate with
+      - can be supllied with the PROXMOX_TOKEN_SECRET environment variable.
+      - not necessary if api_password is specified.
+      - if specified, api_token_id must also be specified.
+    type: str
+  api_user:
+    description:
+      - the user to authenticate with.
+      - required.
+    type: str
+  api_ticket_cache:
+    description:
+      - when true, the authentication ticket obtained with api_password is
+        stored on disk and reused by later module runs until shortly before
+        it expires.
+      - optional, default: true
+    type: bool
+  api_ticket_cache_dir:
+    description:
+      - directory the authentication tickets and access snapshots are cached
+        in, one 0600 file per api_host and api_user.
+      - optional, default: ~/.cache/proxmox_pve
+    type: str
+  api_snapshot_ttl:
+    description:
+      - when greater than 0, the `/access/roles` and `/access/acl` listings
+        are taken from the on-disk snapshot the other modules share, if it is
+        younger than this many seconds, and stored in it otherwise.  Users
+        are always read, as the snapshot does not hold their tokens.
+      - optional, default: 0
+    type: int
+  api_connect_timeout:
+    description:
+      - seconds to wait for a connection to the API to be established.
+      - optional, default: 10
+    type: int
+  api_read_timeout:
+    description:
+      - seconds to wait for the API to answer a request.
+      - optional, default: 30
+    type: int
+  api_hosts:
+    description:
+      - further nodes of the same cluster that can serve the API, e.g.
+        C(pve2.example.com).  The fastest of them and api_host to answer is
+        used, and the next one takes over when it stops responding.
+      - optional, default: []
+    type: list
+  api_discover_nodes:
+    description:
+      - also consider the other online nodes of the cluster, at the address
+        `/cluster/status` lists for them.
+      - optional, default: false
+    type: bool
+  api_endpoint_ttl:
+    description:
+      - seconds the ranking of the nodes is kept next to the tickets and
+        reused before they are probed again.  0 probes on every run.
+      - optional, default: 60
+    type: int
+  api_backend:
+    description:
+      - HTTP backend the API calls are sent with.  `asyncio` reads the
+        collections concurrently and requires the aiohttp python library.
+      - optional, default: requests
+    choices: [ requests, asyncio ]
+    type: str
+  identities:
+    description:
+      - userids and tokenids (`user@realm!token`) to report on.
+      - optional, default: every user and token.
+    type: list
+  paths:
+    description:
+      - paths to report on.  They do not need ACL entries of their own.
+      - optional, default: every path with ACL entries, and `/`.
+    type: list
+  privileges:
+    description:
+      - only report paths on which an identity has all of these privileges,
+        e.g. `[VM.Allocate]` to list who can create guests where.
+      - optional, default: []
+    type: list
+  report_file:
+    description:
+      - write the report to this file as JSON lines, one object with
+        `identity` and `permissions` per identity, instead of returning it
+        in `permissions`.  Meant for reports over thousands of identities.
+      - optional.
+    type: path
+author: Esten Rye
+'''
+
+RETURN = '''
+permissions:
+  description:
+    - maps every identity with privileges on the reported paths to the
+      sorted list of its privileges per path.  Identities and paths without
+      privileges are left out.
+  type: dict
+identities:
+  description: number of identities with privileges on the reported paths.
+  type: int
+report_file:
+  description: the file the report was written to, when report_file is set.
+  type: str
+api_stats:
+  description:
+    - number of API requests, errors, seconds and bytes sent and received,
+      in total and per method and endpoint, with a latency histogram for
+      every endpoint.
+  type: dict
+'''
+
+import json
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.proxmox_pve.module import api_argument_spec, connect_module
+from ansible.module_utils.proxmox_pve.permissions import PermissionIndex
+from ansible.module_utils.proxmox_pve.read import read_collections
+
+COLLECTIONS = ['users', 'groups', 'roles', 'acl']
+
+def evaluate(proxmox, identities=None, paths=None, privileges=None, report_file=None):
+  try:
+    listings = read_collections(proxmox, COLLECTIONS, params={'users': {'full': 1}})
+  except Exception as e:
+    return {
+      'failed': True,
+      'msg': 'API failure encountered.  %s' % str(e)
+    }
+
+  index = PermissionIndex(listings['acl'] or [], listings['roles'] or [], listings['users'] or [], listings['groups'] or [])
+  report = index.report(identities=identities, paths=paths, required=privileges)
+  result = {
+    'changed': False,
+    'msg': 'Proxmox PVE permissions of %d identities on %d paths.' % (
+      len(report), len(paths) if paths else len(index.paths | set(['/']))),
+    'identities': len(report),
+  }
+  if report_file:
+    with open(report_file, 'w') as f:
+      for identity in sorted(report):
+        f.write(json.dumps({'identity': identity, 'permissions': report[identity]}, sort_keys=True) + '\n')
+    result['report_file'] = report_file
+  else:
+    result['permissions'] = report
+  return result
+
+def main():
+  module = AnsibleModule(
+    argument_spec=api_argument_spec(
+      backend=True,
+      identities=dict(type='list', elements='str', required=False),
+      paths=dict(type='list', elements='str', required=False),
+      privileges=dict(type='list', elements='str', default=[], required=False),
+      report_file=dict(type='path', required=False),
+    ),
+    supports_check_mode=True
+  )
+
+  proxmox = connect_module(module, concurrency=len(COLLECTIONS))
+
+  result = evaluate(
+    proxmox,
+    identities=module.params['identities'],
+    paths=module.params['paths'],
+    privileges=module.params['privileges'],
+    report_file=module.params['report_file']
+  )
+
+  if 'changed' in result:
+    module.exit_json(api_stats=proxmox.stats.as_dict(), **result)
+  else:
+    module.fail_json(api_stats=proxmox.stats.as_dict(), **result)
+
+if __name__ == '__main__':
+    main()
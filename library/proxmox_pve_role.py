@@ -10,6 +10,8 @@ module: proxmox_pve_role
 short_description: management of Proxmox PVE Roles
 description:
   - allows you to create, modify and delete Proxmox PVE Roles
+  - supports check mode, in which nothing is written and `results` holds the
+    planned change with its `before` and `after`, and diff mode.
 options:
   api_host:
     description:
@@ -41,6 +43,55 @@ options:
       - the user to authenticate with.
       - required.
     type: str
+  api_ticket_cache:
+    description:
+      - when true, the authentication ticket obtained with api_password is
+        stored on disk and reused by later module runs until shortly before
+        it expires.
+      - optional, default: true
+    type: bool
+  api_ticket_cache_dir:
+    description:
+      - directory the authentication tickets and access snapshots are cached
+        in, one 0600 file per api_host and api_user.
+      - optional, default: ~/.cache/proxmox_pve
+    type: str
+  api_snapshot_ttl:
+    description:
+      - when greater than 0, full `/access/users`, `/access/roles` and
+        `/access/acl` listings are shared on disk between module runs for
+        this many seconds and updated in place after this module's writes.
+      - optional, default: 0
+    type: int
+  api_connect_timeout:
+    description:
+      - seconds to wait for a connection to the API to be established.
+      - optional, default: 10
+    type: int
+  api_read_timeout:
+    description:
+      - seconds to wait for the API to answer a request.
+      - optional, default: 30
+    type: int
+  api_hosts:
+    description:
+      - further nodes of the same cluster that can serve the API, e.g.
+        C(pve2.example.com).  The fastest of them and api_host to answer is
+        used, and the next one takes over when it stops responding.
+      - optional, default: []
+    type: list
+  api_discover_nodes:
+    description:
+      - also consider the other online nodes of the cluster, at the address
+        `/cluster/status` lists for them.
+      - optional, default: false
+    type: bool
+  api_endpoint_ttl:
+    description:
+      - seconds the ranking of the nodes is kept next to the tickets and
+        reused before they are probed again.  0 probes on every run.
+      - optional, default: 60
+    type: int
   roleid:
     description:
       - the Proxmox VE roleid to create, modify or delete.
@@ -58,22 +109,29 @@ options:
 author: Esten Rye
 '''
 
-import os
-import json
-
-try:
-    from proxmoxer import ProxmoxAPI
-    HAS_PROXMOXER = True
-except ImportError:
-    HAS_PROXMOXER = False
+RETURN = '''
+results:
+  description:
+    - in check mode, the planned change of the role with the `action` it
+      would take (created, updated, deleted or none) and its `before` and `after`.
+  type: list
+api_stats:
+  description:
+    - number of API requests, errors, seconds and bytes sent and received,
+      in total and per method and endpoint, with a latency histogram for
+      every endpoint.
+  type: dict
+'''
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils._text import to_native
+from ansible.module_utils.proxmox_pve.access import plan_operations, role_operations
+from ansible.module_utils.proxmox_pve.diff import effective_privs, parse_privs
+from ansible.module_utils.proxmox_pve.module import api_argument_spec, connect_module
+from ansible.module_utils.proxmox_pve.read import read_roles
 
 def get_role(proxmox, roleid):
-  roles = []
   try:
-    roles = proxmox.access.roles.get()
+    role = read_roles(proxmox, [roleid]).get(roleid)
   except Exception as e:
     return {
       'failed': True,
@@ -81,17 +139,26 @@ def get_role(proxmox, roleid):
       'result': None
     }
 
-  role = list(filter(lambda x: x['roleid'] == roleid, roles))
-  if len(role) == 0:
-    return {
-      'failed': False,
-      'result': None
-    }
   return {
     'failed': False,
-    'result': role[0]
+    'result': role
   }
 
+def plan_role(proxmox, role_object, state, plan):
+  roleid = role_object['roleid']
+  current_role_object = get_role(proxmox, roleid)
+  if current_role_object['failed']:
+    return current_role_object
+
+  current_roles = {}
+  if current_role_object['result']:
+    current_roles[roleid] = current_role_object['result']
+  if state == 'present':
+    operations, unchanged = role_operations(current_roles, [role_object], [])
+  else:
+    operations, unchanged = role_operations(current_roles, [], [roleid])
+  return plan_operations(operations, unchanged, **plan)
+
 def present(proxmox, role_object):
   roleid = role_object['roleid']
   current_role_object = get_role(proxmox, roleid)
@@ -99,35 +166,29 @@ def present(proxmox, role_object):
     return current_role_object
   
   if current_role_object['result']:
-    HAS_CHANGED = False
+    current_privs = parse_privs(current_role_object['result'].get('privs'))
+    privs = effective_privs(current_privs, role_object['privs'], role_object['append'])
+    if privs == current_privs:
+      return {
+        'changed': False,
+        'msg': 'Proxmox PVE Role %s already exists.' % roleid
+      }
+
     try:
       proxmox_role = proxmox.access.roles(roleid)
       proxmox_role.put(
-        append=role_object['append'],
-        privs=role_object['privs']
-      )      
+        append=0,
+        privs=','.join(sorted(privs))
+      )
     except Exception as e:
       return {
         'failed': True,
         'msg': 'API failure encountered.  %s' % str(e)
       }
-    updated_role_object = get_role(proxmox, roleid)
-    if updated_role_object['failed']:
-      return updated_role_object
-    
-    HAS_CHANGED = False
-    for key in updated_role_object['result'].keys():
-      if key == 'keys':
-        continue
-      elif current_role_object['result'][key] == updated_role_object['result'][key]:
-        continue
-      else:
-        HAS_CHANGED = True
-        break
-  
+
     return {
-      'changed': HAS_CHANGED,
-      'msg': 'Proxmox PVE Role %s already exists.' % roleid
+      'changed': True,
+      'msg': 'updated Proxmox PVE Role %s' % roleid
     }
   else:
     try:
@@ -157,7 +218,7 @@ def absent(proxmox, role_object):
       proxmox_role.delete()
       return {
         'changed': True, 
-        'msg': 'deleted Proxmox PVE User %s' % roleid
+        'msg': 'deleted Proxmox PVE Role %s' % roleid
       }
     except Exception as e:
       return {
@@ -167,82 +228,51 @@ def absent(proxmox, role_object):
   else:
     return {
       'changed': False,
-      'msg': 'Proxmox PVE User %s does not exist.' % roleid
+      'msg': 'Proxmox PVE Role %s does not exist.' % roleid
     }
 
-def main():
-  module = AnsibleModule(
-    argument_spec=dict(
-      state=dict(type='str', default='present', choices=['present', 'absent']),
-      api_host=dict(type='str', required=True),
-      api_password=dict(type='str', no_log=True),
-      api_token_id=dict(type='str', no_log=True),
-      api_token_secret=dict(type='str', no_log=True),
-      api_user=dict(type='str', required=True),
-      api_validate_certs=dict(type='bool', default=True),
-      roleid=dict(type='str', required=True),
-      append=dict(type='bool', default=False, required=False),
-      privs=dict(type='list', default=[], required=False),
-    )
+def argument_spec():
+  return api_argument_spec(
+    state=dict(type='str', default='present', choices=['present', 'absent']),
+    roleid=dict(type='str', required=True),
+    append=dict(type='bool', default=False, required=False),
+    privs=dict(type='list', default=[], required=False),
   )
 
-  if not HAS_PROXMOXER:
-    module.fail_json(msg='proxmoxer required for this module')
-  
-  state = module.params['state']
-  api_host = module.params['api_host']
-  api_password = module.params['api_password']
-  api_token_id = module.params['api_token_id']
-  api_token_secret = module.params['api_token_secret']
-  api_user = module.params['api_user']
-  api_validate_certs = module.params['api_validate_certs']
-  privs = list(module.params['privs'])
-  append = 1 if module.params['append'] else 0
+def run(proxmox, params, plan=None):
+  state = params['state']
+  privs = list(params['privs'])
+  append = 1 if params['append'] else 0
   role_object = {
-    'roleid': module.params['roleid'],
+    'roleid': params['roleid'],
     'append': append,
     'privs': ",".join(privs),
   }
+  if plan is not None and state in ['present', 'absent']:
+    return plan_role(proxmox, role_object, state, plan)
+  if state == 'present':
+    return present(proxmox, role_object)
+  elif state == 'absent':
+    return absent(proxmox, role_object)
+  return {
+    'failed': True,
+    'msg': 'invalid state `%s`.  Expected `present` or `absent`.' % state
+  }
 
-  auth_args = {'user': api_user}
-
-  if api_token_id and not api_token_secret:
-    try:
-      api_token_secret = os.environ['PROXMOX_TOKEN_SECRET']
-    except KeyError as e:
-      module.fail_json(msg='You should set api_token_secret param or use PROXMOX_TOKEN_SECRET environment variable')
-  
-  if not (api_token_id and api_token_secret):
-    # If password not set get it from PROXMOX_PASSWORD env
-    if not api_password:
-      try:
-        api_password = os.environ['PROXMOX_PASSWORD']
-      except KeyError as e:
-        module.fail_json(msg='You should set api_password param or use PROXMOX_PASSWORD environment variable')
-    auth_args['password'] = api_password
-  else:
-    auth_args['token_name'] = api_token_id
-    auth_args['token_value'] = api_token_secret
+def main():
+  module = AnsibleModule(argument_spec=argument_spec(), supports_check_mode=True)
 
-  proxmox = None
-  try:
-    proxmox = ProxmoxAPI(api_host, verify_ssl=api_validate_certs, **auth_args)
-  except Exception as e:
-    module.fail_json(msg='authorization on proxmox cluster failed with exception: %s' % e)
+  proxmox = connect_module(module)
   
-  result = {}
-  if state == 'present':
-    result = present(proxmox, role_object)
-  elif state == 'absent':
-    result = absent(proxmox, role_object)
-  else:
-    module.fail_json(msg='invalid state `%s`.  Expected `present` or `absent`.' % state)
-    return
+  plan = None
+  if module.check_mode:
+    plan = dict(diff=module._diff)
+  result = run(proxmox, module.params, plan)
   
   if 'changed' in result:
-    module.exit_json(changed=result['changed'], msg=result['msg'])
+    module.exit_json(api_stats=proxmox.stats.as_dict(), **result)
   else:
-    module.fail_json(msg=result['msg'])
+    module.fail_json(msg=result['msg'], api_stats=proxmox.stats.as_dict())
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
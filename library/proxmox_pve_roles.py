@@ -0,0 +1,285 @@
+#!/usr/bin/python3
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = '''
+module: proxmox_pve_roles
+short_description: bulk management of Proxmox PVE Roles
+description:
+  - reconciles whole lists of Proxmox PVE Roles in a single invocation.
+  - reads `/access/roles` once, compares privileges as sets and only writes
+    the roles whose effective privilege set differs.
+  - supports check mode, in which nothing is written and `results` holds the
+    planned changes with their `before` and `after`, and diff mode.
+options:
+  api_host:
+    description:
+      - the host of the Proxmox VE Cluster
+      - required, unless clusters is given.
+    type: str
+  api_password:
+    description:
+      - the password to authenticate with
+      - can be supplied with the PROXMOX_PASSWORD environment variable.
+      - not necessary if api_token_id and api_token_secret are specified.
+    type: str
+  api_token_id:
+    description:
+      - the api token id to authenticate with
+      - can be supplied with the PROXMOX_TOKEN_ID environment variable.
+      - not necessary if api_password is specified.
+      - if specified, api_token_secret must also be specified.
+    type: str
+  api_token_secret:
+    description:
+      - the api token secret to authenticate with
+      - can be supllied with the PROXMOX_TOKEN_SECRET environment variable.
+      - not necessary if api_password is specified.
+      - if specified, api_token_id must also be specified.
+    type: str
+  api_user:
+    description:
+      - the user to authenticate with.
+      - required, unless clusters is given.
+    type: str
+  api_ticket_cache:
+    description:
+      - when true, the authentication ticket obtained with api_password is
+        stored on disk and reused by later module runs until shortly before
+        it expires.
+      - optional, default: true
+    type: bool
+  api_ticket_cache_dir:
+    description:
+      - directory the authentication tickets and access snapshots are cached
+        in, one 0600 file per api_host and api_user.
+      - optional, default: ~/.cache/proxmox_pve
+    type: str
+  api_snapshot_ttl:
+    description:
+      - when greater than 0, full `/access/users`, `/access/roles` and
+        `/access/acl` listings are shared on disk between module runs for
+        this many seconds and updated in place after this module's writes.
+      - optional, default: 0
+    type: int
+  api_connect_timeout:
+    description:
+      - seconds to wait for a connection to the API to be established.
+      - optional, default: 10
+    type: int
+  api_read_timeout:
+    description:
+      - seconds to wait for the API to answer a request.
+      - optional, default: 30
+    type: int
+  api_hosts:
+    description:
+      - further nodes of the same cluster that can serve the API, e.g.
+        C(pve2.example.com).  The fastest of them and api_host to answer is
+        used, and the next one takes over when it stops responding.
+      - optional, default: []
+    type: list
+  api_discover_nodes:
+    description:
+      - also consider the other online nodes of the cluster, at the address
+        `/cluster/status` lists for them.
+      - optional, default: false
+    type: bool
+  api_endpoint_ttl:
+    description:
+      - seconds the ranking of the nodes is kept next to the tickets and
+        reused before they are probed again.  0 probes on every run.
+      - optional, default: 60
+    type: int
+  max_workers:
+    description:
+      - number of create, update and delete calls sent to the cluster
+        concurrently.  Calls that depend on each other, such as a role and
+        the ACLs granting it, are still applied in order.
+      - a failing call is reported on its own entry in `results` and does
+        not stop the others.
+      - optional, default: 1
+    type: int
+  api_backend:
+    description:
+      - HTTP backend the API calls are sent with.  `asyncio` keeps up to
+        max_workers requests in flight over a small pool of connections and
+        requires the aiohttp python library.
+      - optional, default: requests
+    choices: [ requests, asyncio ]
+    type: str
+  roles:
+    description:
+      - list of Proxmox VE roles that should exist, see `role_object` in the
+        README for the supported keys.
+      - when `append` is true on an entry its privileges are added to the
+        current ones, otherwise they replace them.
+      - optional, default: []
+    type: list
+  removed_roles:
+    description:
+      - list of Proxmox VE roleids that should not exist.
+      - optional, default: []
+    type: list
+  purge:
+    description:
+      - when true, `roles` is the complete list of roles within purge_scope
+        and every other role in it is deleted.  The roles to delete are
+        taken from a single read of `/access/roles`.
+      - the built-in roles are never deleted.
+      - optional, default: false
+    type: bool
+  purge_scope:
+    description:
+      - limits the roles purge deletes.  `pattern` keeps it to roleids
+        matching the shell-style pattern, e.g. C(Ops*).  Without it every
+        role that is not built in is in scope.
+      - optional, default: {}
+    type: dict
+  clusters:
+    description:
+      - list of independent Proxmox VE clusters to reconcile with the same
+        desired state, instead of the one at api_host.  Every entry takes
+        `api_host` and optionally a `name` (default: its api_host),
+        `api_user`, `api_password`, `api_token_id`, `api_token_secret`,
+        `api_validate_certs` and `max_workers`; the ones left out are those
+        of the task.  An entry with a password or token of its own uses none
+        of the task's credentials.
+      - the clusters are reconciled concurrently, up to max_clusters at a
+        time, each with its own login and at most its max_workers calls in
+        flight.  The results are returned per cluster in `clusters`.
+      - in check mode with plan_file, every cluster writes its own plan
+        file, named after it, e.g. C(plan-pve1.jsonl) for C(plan.jsonl).
+      - optional.
+    type: list
+  max_clusters:
+    description:
+      - number of clusters reconciled at the same time.
+      - optional, default: 8
+    type: int
+  plan_file:
+    description:
+      - in check mode, write the planned changes to this file as JSON lines,
+        one object per change with its `before` and `after`, instead of
+        returning them in `results`.  Meant for reviewing plans of
+        thousands of changes.
+      - optional.
+    type: path
+author: Esten Rye
+'''
+
+RETURN = '''
+results:
+  description:
+    - one entry per requested role with the `roleid`, the `action` taken
+      (created, updated, deleted or none) and whether it `changed`.
+  type: list
+plan_file:
+  description: in check mode with plan_file, the file the planned changes were written to.
+  type: str
+clusters:
+  description:
+    - with clusters, the result of every cluster by name, with its
+      `changed`, `msg`, results and `api_stats`, and `failed` when it
+      failed.  `api_stats` of the task then sums those of all clusters.
+  type: dict
+api_stats:
+  description:
+    - number of API requests, errors, seconds and bytes sent and received,
+      in total and per method and endpoint, with a latency histogram for
+      every endpoint.
+  type: dict
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.proxmox_pve.access import (
+  DEFAULT_MAX_WORKERS,
+  apply_operations,
+  count_actions,
+  plan_operations,
+  purged_roles,
+  role_operations,
+)
+from ansible.module_utils.proxmox_pve.clusters import CLUSTER_OPTIONS, DEFAULT_MAX_CLUSTERS
+from ansible.module_utils.proxmox_pve.module import api_argument_spec, run_bulk_module
+from ansible.module_utils.proxmox_pve.read import read_roles
+
+def get_roles(proxmox, roleids):
+  try:
+    roles = read_roles(proxmox, roleids)
+  except Exception as e:
+    return {
+      'failed': True,
+      'msg': 'API failure encoutered. %s' % str(e),
+      'result': None
+    }
+
+  return {
+    'failed': False,
+    'result': roles
+  }
+
+def reconcile(proxmox, roles, removed_roles, max_workers=DEFAULT_MAX_WORKERS, plan=None, purge_scope=None):
+  roleids = None if purge_scope is not None else [item['roleid'] for item in roles] + list(removed_roles)
+  current_roles = get_roles(proxmox, roleids)
+  if current_roles['failed']:
+    return current_roles
+  if purge_scope is not None:
+    removed_roles = sorted(set(removed_roles) | set(purged_roles(current_roles['result'], roles, purge_scope)))
+
+  operations, unchanged = role_operations(current_roles['result'], roles, removed_roles)
+  if plan is not None:
+    return plan_operations(operations, unchanged, **plan)
+  applied = apply_operations(proxmox, operations, max_workers)
+  results = applied['results'] + unchanged
+  if applied['failed']:
+    return dict(applied, results=results)
+
+  return {
+    'changed': len(applied['results']) > 0,
+    'msg': 'Proxmox PVE Roles: %d created, %d updated, %d deleted, %d unchanged.' % (
+      count_actions(results, 'created'), count_actions(results, 'updated'),
+      count_actions(results, 'deleted'), len(unchanged)),
+    'results': results
+  }
+
+def main():
+  module = AnsibleModule(
+    argument_spec=api_argument_spec(
+      backend=True,
+      max_workers=dict(type='int', default=DEFAULT_MAX_WORKERS, required=False),
+      roles=dict(type='list', default=[], required=False),
+      removed_roles=dict(type='list', default=[], required=False),
+      purge=dict(type='bool', default=False, required=False),
+      purge_scope=dict(type='dict', default={}, required=False, options=dict(
+        pattern=dict(type='str', required=False),
+      )),
+      plan_file=dict(type='path', required=False),
+      clusters=dict(type='list', elements='dict', required=False, options=CLUSTER_OPTIONS),
+      max_clusters=dict(type='int', default=DEFAULT_MAX_CLUSTERS, required=False),
+    ),
+    supports_check_mode=True
+  )
+
+  roles = module.params['roles'] or []
+  removed_roles = module.params['removed_roles'] or []
+
+  for item in roles:
+    if not isinstance(item, dict) or not item.get('roleid'):
+      module.fail_json(msg='every entry in roles must be a dict with a roleid, got `%s`.' % item)
+
+  purge_scope = None
+  if module.params['purge']:
+    purge_scope = module.params['purge_scope'] or {}
+
+  def run(proxmox, params, plan):
+    return reconcile(proxmox, roles, removed_roles, max_workers=params['max_workers'], plan=plan,
+                     purge_scope=purge_scope)
+
+  run_bulk_module(module, run)
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,8 @@ module: proxmox_pve_user
 short_description: management of Proxmox PVE Users
 description:
   - allows you to create, modify and delete Proxmox PVE Users
+  - supports check mode, in which nothing is written and `results` holds the
+    planned change with its `before` and `after`, and diff mode.
 options:
   api_host:
     description:
@@ -41,6 +43,55 @@ options:
       - the user to authenticate with.
       - required.
     type: str
+  api_ticket_cache:
+    description:
+      - when true, the authentication ticket obtained with api_password is
+        stored on disk and reused by later module runs until shortly before
+        it expires.
+      - optional, default: true
+    type: bool
+  api_ticket_cache_dir:
+    description:
+      - directory the authentication tickets and access snapshots are cached
+        in, one 0600 file per api_host and api_user.
+      - optional, default: ~/.cache/proxmox_pve
+    type: str
+  api_snapshot_ttl:
+    description:
+      - when greater than 0, full `/access/users`, `/access/roles` and
+        `/access/acl` listings are shared on disk between module runs for
+        this many seconds and updated in place after this module's writes.
+      - optional, default: 0
+    type: int
+  api_connect_timeout:
+    description:
+      - seconds to wait for a connection to the API to be established.
+      - optional, default: 10
+    type: int
+  api_read_timeout:
+    description:
+      - seconds to wait for the API to answer a request.
+      - optional, default: 30
+    type: int
+  api_hosts:
+    description:
+      - further nodes of the same cluster that can serve the API, e.g.
+        C(pve2.example.com).  The fastest of them and api_host to answer is
+        used, and the next one takes over when it stops responding.
+      - optional, default: []
+    type: list
+  api_discover_nodes:
+    description:
+      - also consider the other online nodes of the cluster, at the address
+        `/cluster/status` lists for them.
+      - optional, default: false
+    type: bool
+  api_endpoint_ttl:
+    description:
+      - seconds the ranking of the nodes is kept next to the tickets and
+        reused before they are probed again.  0 probes on every run.
+      - optional, default: 60
+    type: int
   userid:
     description:
       - the Proxmox VE userid to create, modify or delete.
@@ -74,7 +125,8 @@ options:
     description:
       - Account expiration date (seconds since epoch).
       - '0' means no expiration date.
-      - optional, default: 0
+      - optional; when left out the expiration date of an existing user is
+        kept and a new user never expires.
     type: int
   keys:
     description:
@@ -83,22 +135,31 @@ options:
 author: Esten Rye
 '''
 
-import os
-import json
-
-try:
-    from proxmoxer import ProxmoxAPI
-    HAS_PROXMOXER = True
-except ImportError:
-    HAS_PROXMOXER = False
+RETURN = '''
+results:
+  description:
+    - in check mode, the planned change of the user with the `action` it
+      would take (created, updated, deleted or none) and its `before` and
+      `after`.
+  type: list
+api_stats:
+  description:
+    - number of API requests, errors, seconds and bytes sent and received,
+      in total and per method and endpoint, with a latency histogram for
+      every endpoint.
+  type: dict
+'''
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils._text import to_native
+from ansible.module_utils.proxmox_pve.access import plan_operations, user_operations
+from ansible.module_utils.proxmox_pve.diff import LIST_FIELDS, diff_user
+from ansible.module_utils.proxmox_pve.module import api_argument_spec, connect_module
+from ansible.module_utils.proxmox_pve.password import forget_passwords
+from ansible.module_utils.proxmox_pve.read import read_users
 
 def get_user(proxmox, userid):
-  users = []
   try:
-    users = proxmox.access.users.get()
+    user = read_users(proxmox, [userid]).get(userid)
   except Exception as e:
     return {
       'failed': True,
@@ -106,58 +167,62 @@ def get_user(proxmox, userid):
       'result': None
     }
 
-  user = list(filter(lambda x: x['userid'] == userid, users))
-  if len(user) == 0:
-    return {
-      'failed': False,
-      'result': None
-    }
   return {
     'failed': False,
-    'result': user[0]
+    'result': user
   }
 
-def present(proxmox, user_object):
+def desired_user(user_object):
+  # an empty groups list leaves the current groups untouched.
+  desired = dict(user_object)
+  if not desired['groups']:
+    desired['groups'] = None
+  return desired
+
+def plan_user(proxmox, user_object, state, plan):
+  userid = user_object['userid']
+  current_user_object = get_user(proxmox, userid)
+  if current_user_object['failed']:
+    return current_user_object
+
+  current_users = {}
+  if current_user_object['result']:
+    current_users[userid] = current_user_object['result']
+  if state == 'present':
+    operations, unchanged = user_operations(current_users, [desired_user(user_object)], [])
+  else:
+    operations, unchanged = user_operations(current_users, [], [userid])
+  return plan_operations(operations, unchanged, **plan)
+
+def present(proxmox, user_object, cache_dir=None):
   userid = user_object['userid']
   current_user_object = get_user(proxmox, userid)
   if current_user_object['failed']:
     return current_user_object
   
   if current_user_object['result']:
-    HAS_CHANGED = False
+    changes = diff_user(current_user_object['result'], desired_user(user_object))
+    if not changes:
+      return {
+        'changed': False,
+        'msg': 'Proxmox PVE User %s already exists.' % userid
+      }
+
     try:
       proxmox_user = proxmox.access.users(userid)
-      proxmox_user.put(
-        comment=user_object['comment'],
-        email=user_object['email'],
-        enable=user_object['enable'],
-        firstname=user_object['firstname'],
-        groups=user_object['groups'],
-        keys=user_object['keys'],
-        lastname=user_object['lastname']
-      )      
+      proxmox_user.put(**dict(
+        (key, ','.join(change['after']) if key in LIST_FIELDS else change['after'])
+        for key, change in changes.items()
+      ))
     except Exception as e:
       return {
         'failed': True,
         'msg': 'API failure encountered.  %s' % str(e)
       }
-    updated_user_object = get_user(proxmox, userid)
-    if updated_user_object['failed']:
-      return updated_user_object
-    
-    HAS_CHANGED = False
-    for key in updated_user_object['result'].keys():
-      if key == 'keys':
-        continue
-      elif current_user_object['result'][key] == updated_user_object['result'][key]:
-        continue
-      else:
-        HAS_CHANGED = True
-        break
-  
+
     return {
-      'changed': HAS_CHANGED,
-      'msg': 'Proxmox PVE User %s already exists.' % userid
+      'changed': True,
+      'msg': 'updated Proxmox PVE User %s: %s' % (userid, ', '.join(sorted(changes)))
     }
   else:
     try:
@@ -172,6 +237,7 @@ def present(proxmox, user_object):
         keys=user_object['keys'],
         lastname=user_object['lastname']
       )
+      forget_passwords(proxmox, [userid], cache_dir)
       return {
         'changed': True, 
         'msg': 'created Proxmox PVE User %s' % userid
@@ -182,7 +248,7 @@ def present(proxmox, user_object):
         'msg': 'API failure encountered.  %s' % str(e)
       }
 
-def absent(proxmox, user_object):
+def absent(proxmox, user_object, cache_dir=None):
   userid = user_object['userid']
   current_user_object = get_user(proxmox, userid)
   if current_user_object['failed']:
@@ -192,6 +258,7 @@ def absent(proxmox, user_object):
     try:
       proxmox_user = proxmox.access.users(userid)
       proxmox_user.delete()
+      forget_passwords(proxmox, [userid], cache_dir)
       return {
         'changed': True, 
         'msg': 'deleted Proxmox PVE User %s' % userid
@@ -207,89 +274,58 @@ def absent(proxmox, user_object):
       'msg': 'Proxmox PVE User %s does not exist.' % userid
     }
 
-def main():
-  module = AnsibleModule(
-    argument_spec=dict(
-      state=dict(type='str', default='present', choices=['present', 'absent']),
-      api_host=dict(type='str', required=True),
-      api_password=dict(type='str', no_log=True),
-      api_token_id=dict(type='str', no_log=True),
-      api_token_secret=dict(type='str', no_log=True),
-      api_user=dict(type='str', required=True),
-      api_validate_certs=dict(type='bool', default=True),
-      userid=dict(type='str', required=True),
-      comment=dict(type='str', required=False),
-      email=dict(type='str', required=False),
-      enable=dict(type='bool', required=False, default=True),
-      expire=dict(type='int', required=False, default=0),
-      firstname=dict(type='str', required=False),
-      groups=dict(type='list', default=[], required=False),
-      keys=dict(type='str', required=False),
-      lastname=dict(type='str', required=False),
-    )
+def argument_spec():
+  return api_argument_spec(
+    state=dict(type='str', default='present', choices=['present', 'absent']),
+    userid=dict(type='str', required=True),
+    comment=dict(type='str', required=False),
+    email=dict(type='str', required=False),
+    enable=dict(type='bool', required=False, default=True),
+    expire=dict(type='int', required=False),
+    firstname=dict(type='str', required=False),
+    groups=dict(type='list', default=[], required=False),
+    keys=dict(type='str', required=False),
+    lastname=dict(type='str', required=False),
   )
 
-  if not HAS_PROXMOXER:
-    module.fail_json(msg='proxmoxer required for this module')
-  
-  state = module.params['state']
-  api_host = module.params['api_host']
-  api_password = module.params['api_password']
-  api_token_id = module.params['api_token_id']
-  api_token_secret = module.params['api_token_secret']
-  api_user = module.params['api_user']
-  api_validate_certs = module.params['api_validate_certs']
+def run(proxmox, params, plan=None):
+  state = params['state']
   user_object = {
-    'userid': module.params['userid'],
-    'comment': module.params['comment'],
-    'email': module.params['email'],
-    'enable': 1 if module.params['enable'] else 0,
-    'expire': module.params['expire'],
-    'firstname': module.params['firstname'],
-    'groups': module.params['groups'],
-    'keys': module.params['keys'],
-    'lastname': module.params['lastname'],
+    'userid': params['userid'],
+    'comment': params['comment'],
+    'email': params['email'],
+    'enable': 1 if params['enable'] else 0,
+    'expire': params['expire'],
+    'firstname': params['firstname'],
+    'groups': params['groups'],
+    'keys': params['keys'],
+    'lastname': params['lastname'],
+  }
+  if plan is not None and state in ['present', 'absent']:
+    return plan_user(proxmox, user_object, state, plan)
+  if state == 'present':
+    return present(proxmox, user_object, params['api_ticket_cache_dir'])
+  elif state == 'absent':
+    return absent(proxmox, user_object, params['api_ticket_cache_dir'])
+  return {
+    'failed': True,
+    'msg': 'invalid state `%s`.  Expected `present` or `absent`.' % state
   }
 
-  auth_args = {'user': api_user}
-
-  if api_token_id and not api_token_secret:
-    try:
-      api_token_secret = os.environ['PROXMOX_TOKEN_SECRET']
-    except KeyError as e:
-      module.fail_json(msg='You should set api_token_secret param or use PROXMOX_TOKEN_SECRET environment variable')
-  
-  if not (api_token_id and api_token_secret):
-    # If password not set get it from PROXMOX_PASSWORD env
-    if not api_password:
-      try:
-        api_password = os.environ['PROXMOX_PASSWORD']
-      except KeyError as e:
-        module.fail_json(msg='You should set api_password param or use PROXMOX_PASSWORD environment variable')
-    auth_args['password'] = api_password
-  else:
-    auth_args['token_name'] = api_token_id
-    auth_args['token_value'] = api_token_secret
+def main():
+  module = AnsibleModule(argument_spec=argument_spec(), supports_check_mode=True)
 
-  proxmox = None
-  try:
-    proxmox = ProxmoxAPI(api_host, verify_ssl=api_validate_certs, **auth_args)
-  except Exception as e:
-    module.fail_json(msg='authorization on proxmox cluster failed with exception: %s' % e)
+  proxmox = connect_module(module)
   
-  result = {}
-  if state == 'present':
-    result = present(proxmox, user_object)
-  elif state == 'absent':
-    result = absent(proxmox, user_object)
-  else:
-    module.fail_json(msg='invalid state `%s`.  Expected `present` or `absent`.' % state)
-    return
+  plan = None
+  if module.check_mode:
+    plan = dict(diff=module._diff)
+  result = run(proxmox, module.params, plan)
   
   if 'changed' in result:
-    module.exit_json(changed=result['changed'], msg=result['msg'])
+    module.exit_json(api_stats=proxmox.stats.as_dict(), **result)
   else:
-    module.fail_json(msg=result['msg'])
+    module.fail_json(msg=result['msg'], api_stats=proxmox.stats.as_dict())
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -10,6 +10,8 @@ module: proxmox_pve_user_password
 short_description: management of Proxmox PVE User Passwords
 description:
   - allows you to create, modify and delete Proxmox PVE Users
+  - supports check mode, in which nothing is written and `results` holds the
+    planned change with its `before` and `after`, and diff mode.
 options:
   api_host:
     description:
@@ -41,6 +43,55 @@ options:
       - the user to authenticate with.
       - required.
     type: str
+  api_ticket_cache:
+    description:
+      - when true, the authentication ticket obtained with api_password is
+        stored on disk and reused by later module runs until shortly before
+        it expires.
+      - optional, default: true
+    type: bool
+  api_ticket_cache_dir:
+    description:
+      - directory the authentication tickets and access snapshots are cached
+        in, one 0600 file per api_host and api_user.
+      - optional, default: ~/.cache/proxmox_pve
+    type: str
+  api_snapshot_ttl:
+    description:
+      - when greater than 0, full `/access/users`, `/access/roles` and
+        `/access/acl` listings are shared on disk between module runs for
+        this many seconds and updated in place after this module's writes.
+      - optional, default: 0
+    type: int
+  api_connect_timeout:
+    description:
+      - seconds to wait for a connection to the API to be established.
+      - optional, default: 10
+    type: int
+  api_read_timeout:
+    description:
+      - seconds to wait for the API to answer a request.
+      - optional, default: 30
+    type: int
+  api_hosts:
+    description:
+      - further nodes of the same cluster that can serve the API, e.g.
+        C(pve2.example.com).  The fastest of them and api_host to answer is
+        used, and the next one takes over when it stops responding.
+      - optional, default: []
+    type: list
+  api_discover_nodes:
+    description:
+      - also consider the other online nodes of the cluster, at the address
+        `/cluster/status` lists for them.
+      - optional, default: false
+    type: bool
+  api_endpoint_ttl:
+    description:
+      - seconds the ranking of the nodes is kept next to the tickets and
+        reused before they are probed again.  0 probes on every run.
+      - optional, default: 60
+    type: int
   userid:
     description:
       - the Proxmox VE userid to create, modify or delete.
@@ -51,25 +102,54 @@ options:
       - the Proxmox VE user's password.
       - optional, default: ''
     type: str
+  password_check:
+    description:
+      - how to tell that the user already has this password, in which case
+        it is not set again and the task reports no change.
+      - C(fingerprint) compares with a salted fingerprint of the password
+        last set from this controller, kept in api_ticket_cache_dir.  The
+        modules forget it when they create or delete the user, but a
+        password changed by other means since, or a user deleted and
+        created again elsewhere, is not noticed.
+      - C(verify) logs in as the user with the password.  Catches changes
+        made elsewhere, at the cost of one login per user, and the cluster
+        logs a failed login for every password that differs.
+      - C(always) sets the password every time.
+      - optional, default: always
+    type: str
+    choices: [always, fingerprint, verify]
 author: Esten Rye
 '''
 
-import os
-import json
-
-try:
-    from proxmoxer import ProxmoxAPI
-    HAS_PROXMOXER = True
-except ImportError:
-    HAS_PROXMOXER = False
+RETURN = '''
+results:
+  description:
+    - in check mode, the planned change of the password with the `action` it
+      would take (set or none) and its `before` and `after`.
+  type: list
+api_stats:
+  description:
+    - number of API requests, errors, seconds and bytes sent and received,
+      in total and per method and endpoint, with a latency histogram for
+      every endpoint.
+  type: dict
+'''
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils._text import to_native
+from ansible.module_utils.proxmox_pve.access import password_operations, plan_operations
+from ansible.module_utils.proxmox_pve.module import api_argument_spec, connect_module
+from ansible.module_utils.proxmox_pve.password import (
+  DEFAULT_PASSWORD_CHECK,
+  PASSWORD_CHECKS,
+  current_passwords,
+  password_fingerprints,
+  record_passwords,
+)
+from ansible.module_utils.proxmox_pve.read import read_users
 
 def get_user(proxmox, userid):
-  users = []
   try:
-    users = proxmox.access.users.get()
+    user = read_users(proxmox, [userid]).get(userid)
   except Exception as e:
     return {
       'failed': True,
@@ -77,18 +157,12 @@ def get_user(proxmox, userid):
       'result': None
     }
 
-  user = list(filter(lambda x: x['userid'] == userid, users))
-  if len(user) == 0:
-    return {
-      'failed': False,
-      'result': None
-    }
   return {
     'failed': False,
-    'result': user[0]
+    'result': user
   }
 
-def present(proxmox, userid, password):
+def present(proxmox, userid, password, check=DEFAULT_PASSWORD_CHECK, cache_dir=None, plan=None):
   current_user_object = get_user(proxmox, userid)
   if current_user_object['failed']:
     return current_user_object
@@ -98,82 +172,68 @@ def present(proxmox, userid, password):
       'failed': True,
       'msg': 'user does not exist.  %s' % userid
     }
+  fingerprints = password_fingerprints(proxmox, cache_dir)
+  if plan is not None:
+    try:
+      current = current_passwords(proxmox, [(userid, password)], check, fingerprints)
+    except Exception as e:
+      return {
+        'failed': True,
+        'msg': 'API failure encountered.  %s' % str(e)
+      }
+    operations, unchanged = password_operations([userid], [dict(userid=userid, password=password)], current)[:2]
+    return plan_operations(operations, unchanged, **plan)
   try:
-    proxmox_user = proxmox.access.password.put(userid=userid, password=password)
+    if userid in current_passwords(proxmox, [(userid, password)], check, fingerprints):
+      return {
+        'changed': False,
+        'msg': 'Proxmox PVE Password for User %s is already set.' % userid
+      }
+    proxmox.access.password.put(userid=userid, password=password)
   except Exception as e:
     return {
       'failed': True,
       'msg': 'API failure encountered.  %s' % str(e)
     }
+  record_passwords(fingerprints, [dict(userid=userid, action='set')], [(userid, password)])
   return {
     'changed': True,
     'msg': 'Proxmox PVE Password set for User %s.' % userid
   }
 
-def main():
-  module = AnsibleModule(
-    argument_spec=dict(
-      state=dict(type='str', default='present', choices=['present']),
-      api_host=dict(type='str', required=True),
-      api_password=dict(type='str', no_log=True),
-      api_token_id=dict(type='str', no_log=True),
-      api_token_secret=dict(type='str', no_log=True),
-      api_user=dict(type='str', required=True),
-      api_validate_certs=dict(type='bool', default=True),
-      userid=dict(type='str', required=True),
-      password=dict(type='str', required=True, no_log=True)
-    )
+def argument_spec():
+  return api_argument_spec(
+    state=dict(type='str', default='present', choices=['present']),
+    userid=dict(type='str', required=True),
+    password=dict(type='str', required=True, no_log=True),
+    password_check=dict(type='str', default=DEFAULT_PASSWORD_CHECK, choices=PASSWORD_CHECKS, required=False, no_log=False),
   )
 
-  if not HAS_PROXMOXER:
-    module.fail_json(msg='proxmoxer required for this module')
-  
-  state = module.params['state']
-  api_host = module.params['api_host']
-  api_password = module.params['api_password']
-  api_token_id = module.params['api_token_id']
-  api_token_secret = module.params['api_token_secret']
-  api_user = module.params['api_user']
-  api_validate_certs = module.params['api_validate_certs']
-  userid = module.params['userid']
-  password = module.params['password']
-  auth_args = {'user': api_user}
+def run(proxmox, params, plan=None):
+  state = params['state']
+  userid = params['userid']
+  password = params['password']
+  if state == 'present':
+    return present(proxmox, userid, password, params['password_check'], params['api_ticket_cache_dir'], plan)
+  return {
+    'failed': True,
+    'msg': 'invalid state `%s`.  Expected `present`.' % state
+  }
 
-  if api_token_id and not api_token_secret:
-    try:
-      api_token_secret = os.environ['PROXMOX_TOKEN_SECRET']
-    except KeyError as e:
-      module.fail_json(msg='You should set api_token_secret param or use PROXMOX_TOKEN_SECRET environment variable')
-  
-  if not (api_token_id and api_token_secret):
-    # If password not set get it from PROXMOX_PASSWORD env
-    if not api_password:
-      try:
-        api_password = os.environ['PROXMOX_PASSWORD']
-      except KeyError as e:
-        module.fail_json(msg='You should set api_password param or use PROXMOX_PASSWORD environment variable')
-    auth_args['password'] = api_password
-  else:
-    auth_args['token_name'] = api_token_id
-    auth_args['token_value'] = api_token_secret
+def main():
+  module = AnsibleModule(argument_spec=argument_spec(), supports_check_mode=True)
 
-  proxmox = None
-  try:
-    proxmox = ProxmoxAPI(api_host, verify_ssl=api_validate_certs, **auth_args)
-  except Exception as e:
-    module.fail_json(msg='authorization on proxmox cluster failed with exception: %s' % e)
+  proxmox = connect_module(module)
   
-  result = {}
-  if state == 'present':
-    result = present(proxmox, userid, password)
-  else:
-    module.fail_json(msg='invalid state `%s`.  Expected `present` or `absent`.' % state)
-    return
+  plan = None
+  if module.check_mode:
+    plan = dict(diff=module._diff)
+  result = run(proxmox, module.params, plan)
   
   if 'changed' in result:
-    module.exit_json(changed=result['changed'], msg=result['msg'])
+    module.exit_json(api_stats=proxmox.stats.as_dict(), **result)
   else:
-    module.fail_json(msg=result['msg'])
+    module.fail_json(msg=result['msg'], api_stats=proxmox.stats.as_dict())
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
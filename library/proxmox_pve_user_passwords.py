@@ -0,0 +1,235 @@
+#!/usr/bin/python3
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = '''
+module: proxmox_pve_user_passwords
+short_description: bulk management of Proxmox PVE User Passwords
+description:
+  - sets the passwords of a whole list of Proxmox PVE Users in a single
+    invocation.
+  - checks that the users exist with one read, shared with the other
+    modules through api_snapshot_ttl, and only sets the passwords that
+    password_check cannot confirm are already in place.
+  - supports check mode, in which nothing is written and `results` holds the
+    planned changes with their `before` and `after`, and diff mode.
+options:
+  api_host:
+    description:
+      - the host of the Proxmox VE Cluster
+      - required.
+    type: str
+  api_password:
+    description:
+      - the password to authenticate with
+      - can be supplied with the PROXMOX_PASSWORD environment variable.
+      - not necessary if api_token_id and api_token_secret are specified.
+    type: str
+  api_token_id:
+    description:
+      - the api token id to authenticate with
+      - can be supplied with the PROXMOX_TOKEN_ID environment variable.
+      - not necessary if api_password is specified.
+      - if specified, api_token_secret must also be specified.
+    type: str
+  api_token_secret:
+    description:
+      - the api token secret to authenticate with
+      - can be supllied with the PROXMOX_TOKEN_SECRET environment variable.
+      - not necessary if api_password is specified.
+      - if specified, api_token_id must also be specified.
+    type: str
+  api_user:
+    description:
+      - the user to authenticate with.
+      - required.
+    type: str
+  api_ticket_cache:
+    description:
+      - when true, the authentication ticket obtained with api_password is
+        stored on disk and reused by later module runs until shortly before
+        it expires.
+      - optional, default: true
+    type: bool
+  api_ticket_cache_dir:
+    description:
+      - directory the authentication tickets and access snapshots are cached
+        in, one 0600 file per api_host and api_user.
+      - optional, default: ~/.cache/proxmox_pve
+    type: str
+  api_snapshot_ttl:
+    description:
+      - when greater than 0, the `/access/roles` and `/access/acl` listings
+        are taken from the on-disk snapshot the other modules share, if it is
+        younger than this many seconds, and stored in it otherwise.  Users
+        are always read, as the snapshot does not hold their tokens.
+      - optional, default: 0
+    type: int
+  api_connect_timeout:
+    description:
+      - seconds to wait for a connection to the API to be established.
+      - optional, default: 10
+    type: int
+  api_read_timeout:
+    description:
+      - seconds to wait for the API to answer a request.
+      - optional, default: 30
+    type: int
+  api_hosts:
+    description:
+      - further nodes of the same cluster that can serve the API, e.g.
+        C(pve2.example.com).  The fastest of them and api_host to answer is
+        used, and the next one takes over when it stops responding.
+      - optional, default: []
+    type: list
+  api_discover_nodes:
+    description:
+      - also consider the other online nodes of the cluster, at the address
+        `/cluster/status` lists for them.
+      - optional, default: false
+    type: bool
+  api_endpoint_ttl:
+    description:
+      - seconds the ranking of the nodes is kept next to the tickets and
+        reused before they are probed again.  0 probes on every run.
+      - optional, default: 60
+    type: int
+  max_workers:
+    description:
+      - number of create, update and delete calls sent to the cluster
+        concurrently.  Calls that depend on each other, such as a role and
+        the ACLs granting it, are still applied in order.
+      - a failing call is reported on its own entry in `results` and does
+        not stop the others.
+      - optional, default: 1
+    type: int
+  api_backend:
+    description:
+      - HTTP backend the API calls are sent with.  `asyncio` keeps up to
+        max_workers requests in flight over a small pool of connections and
+        requires the aiohttp python library.
+      - optional, default: requests
+    choices: [ requests, asyncio ]
+    type: str
+  passwords:
+    description:
+      - list of Proxmox VE user passwords to set, see `password_object` in the
+        README.
+      - optional, default: []
+    type: list
+  password_check:
+    description:
+      - how to tell that a user already has the desired password, which is
+        then not set again.  See proxmox_pve_user_password.
+      - with C(verify) the logins run max_workers at a time.
+      - optional, default: always
+    type: str
+    choices: [always, fingerprint, verify]
+  plan_file:
+    description:
+      - in check mode, write the planned changes to this file as JSON lines,
+        one object per change with its `before` and `after`, instead of
+        returning them in `results`.  Meant for reviewing plans of
+        thousands of changes.
+      - optional.
+    type: path
+author: Esten Rye
+'''
+
+RETURN = '''
+results:
+  description:
+    - one entry per requested password with the `userid`, the `action`
+      taken (set or none) and whether it `changed`.
+  type: list
+plan_file:
+  description: in check mode with plan_file, the file the planned changes were written to.
+  type: str
+api_stats:
+  description:
+    - number of API requests, errors, seconds and bytes sent and received,
+      in total and per method and endpoint, with a latency histogram for
+      every endpoint.
+  type: dict
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.proxmox_pve.access import (
+  DEFAULT_MAX_WORKERS,
+  apply_operations,
+  count_actions,
+  password_operations,
+  plan_operations,
+)
+from ansible.module_utils.proxmox_pve.module import api_argument_spec, run_bulk_module
+from ansible.module_utils.proxmox_pve.password import (
+  DEFAULT_PASSWORD_CHECK,
+  PASSWORD_CHECKS,
+  current_passwords,
+  password_fingerprints,
+  record_passwords,
+)
+from ansible.module_utils.proxmox_pve.read import read_users
+
+def reconcile(proxmox, passwords, max_workers=DEFAULT_MAX_WORKERS, password_check=DEFAULT_PASSWORD_CHECK, cache_dir=None,
+              plan=None):
+  pairs = [(item['userid'], item['password']) for item in passwords]
+  fingerprints = password_fingerprints(proxmox, cache_dir)
+  try:
+    known_userids = set(read_users(proxmox, [userid for userid, password in pairs]))
+    current_userids = current_passwords(
+      proxmox, [item for item in pairs if item[0] in known_userids], password_check, fingerprints, max_workers)
+  except Exception as e:
+    return {
+      'failed': True,
+      'msg': 'API failure encountered.  %s' % str(e)
+    }
+
+  operations, unchanged, missing = password_operations(known_userids, passwords, current_userids)
+  if missing:
+    return {
+      'failed': True,
+      'msg': 'user does not exist.  %s' % ', '.join(missing)
+    }
+  if plan is not None:
+    return plan_operations(operations, unchanged, **plan)
+
+  applied = apply_operations(proxmox, operations, max_workers)
+  record_passwords(fingerprints, applied['results'], pairs)
+  results = applied['results'] + unchanged
+  if applied['failed']:
+    return dict(applied, results=results)
+
+  return {
+    'changed': len(applied['results']) > 0,
+    'msg': 'Proxmox PVE Passwords: %d set, %d unchanged.' % (count_actions(results, 'set'), len(unchanged)),
+    'results': results
+  }
+
+def main():
+  module = AnsibleModule(
+    argument_spec=api_argument_spec(
+      backend=True,
+      max_workers=dict(type='int', default=DEFAULT_MAX_WORKERS, required=False),
+      passwords=dict(type='list', elements='dict', default=[], required=False, options=dict(
+        userid=dict(type='str', required=True),
+        password=dict(type='str', required=True, no_log=True),
+      )),
+      password_check=dict(type='str', default=DEFAULT_PASSWORD_CHECK, choices=PASSWORD_CHECKS, required=False, no_log=False),
+      plan_file=dict(type='path', required=False),
+    ),
+    supports_check_mode=True
+  )
+
+  def run(proxmox, params, plan):
+    return reconcile(proxmox, params['passwords'] or [], max_workers=params['max_workers'],
+                     password_check=params['password_check'],
+                     cache_dir=params['api_ticket_cache_dir'], plan=plan)
+
+  run_bulk_module(module, run)
+
+if __name__ == '__main__':
+    main()
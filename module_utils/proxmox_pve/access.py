@@ -0,0 +1,440 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import fnmatch
+import json
+
+from ansible.module_utils.proxmox_pve.client import resource_path
+from ansible.module_utils.proxmox_pve.diff import (
+  IDENTITY_TYPES,
+  LIST_FIELDS,
+  USER_FIELDS,
+  diff_user,
+  effective_privs,
+  expand_acl,
+  missing_acl_entries,
+  parse_privs,
+  present_acl_entries,
+  split_list,
+  to_bool_int,
+)
+
+# Operations are applied phase by phase so that nothing references an entity
+# that does not exist yet: roles and users before the ACLs granting them,
+# ACL removals before the users and roles they mention are deleted, and
+# passwords once their users exist.
+PHASE_ROLES = 0
+PHASE_USERS = 1
+PHASE_ACL_GRANTS = 2
+PHASE_ACL_REVOKES = 3
+PHASE_USER_DELETES = 4
+PHASE_ROLE_DELETES = 5
+PHASE_PASSWORDS = 6
+# proxmox_pve_groups: groups before the members added to them, and group
+# deletion, which also drops the group from its members, last.
+PHASE_GROUPS = 7
+PHASE_MEMBERS = 8
+PHASE_GROUP_DELETES = 9
+DEFAULT_MAX_WORKERS = 1
+# never purged, whatever the scope.
+PROTECTED_USERS = ['root@pam']
+
+def operation(phase, method, path, data, result, provides=None, requires=None, before=None, after=None):
+  # `provides` and `requires` name the entities ('role', roleid) or
+  # ('user', userid) an operation creates or depends on, so that a failed
+  # create skips the operations that reference it.  `before` and `after`
+  # describe what it changes for plans, `after` defaulting to its data.
+  return {
+    'phase': phase,
+    'method': method,
+    'path': path,
+    'data': data,
+    'result': dict(result, changed=True),
+    'provides': provides,
+    'requires': requires or [],
+    'before': before,
+    'after': data if after is None else after,
+  }
+
+def build_user_object(item):
+  user_object = {'userid': item['userid'], 'enable': 1}
+  for key in USER_FIELDS:
+    if key not in item or item[key] is None:
+      continue
+    value = item[key]
+    if key == 'enable':
+      value = to_bool_int(value)
+    elif key == 'expire':
+      value = int(value)
+    elif key in LIST_FIELDS:
+      value = ','.join(split_list(value))
+    user_object[key] = value
+  return user_object
+
+def user_operations(current_users, users, removed_users):
+  operations = []
+  unchanged = []
+  for item in users:
+    user_object = build_user_object(item)
+    userid = user_object['userid']
+    current = current_users.get(userid)
+    if current is None:
+      operations.append(operation(PHASE_USERS, 'POST', '/access/users', user_object,
+                                  dict(userid=userid, action='created'), provides=('user', userid)))
+      continue
+    changes = diff_user(current, user_object)
+    if changes:
+      operations.append(operation(PHASE_USERS, 'PUT', resource_path('access', 'users', userid),
+                                  dict((key, user_object[key]) for key in changes),
+                                  dict(userid=userid, action='updated'),
+                                  before=dict((key, current.get(key)) for key in changes)))
+    else:
+      unchanged.append(dict(userid=userid, action='none', changed=False))
+  for userid in removed_users:
+    if userid in current_users:
+      operations.append(operation(PHASE_USER_DELETES, 'DELETE', resource_path('access', 'users', userid), None,
+                                  dict(userid=userid, action='deleted'), before=current_users[userid]))
+    else:
+      unchanged.append(dict(userid=userid, action='none', changed=False))
+  return operations, unchanged
+
+def role_operations(current_roles, roles, removed_roles):
+  current_privs = dict((roleid, parse_privs(role.get('privs'))) for roleid, role in current_roles.items())
+  operations = []
+  unchanged = []
+  for item in roles:
+    roleid = item['roleid']
+    if roleid not in current_privs:
+      privs = sorted(parse_privs(item.get('privs')))
+      operations.append(operation(PHASE_ROLES, 'POST', '/access/roles', dict(roleid=roleid, privs=','.join(privs)),
+                                  dict(roleid=roleid, action='created'), provides=('role', roleid),
+                                  after=dict(privs=privs)))
+      continue
+    privs = effective_privs(current_privs[roleid], item.get('privs'), item.get('append'))
+    if privs != current_privs[roleid]:
+      operations.append(operation(PHASE_ROLES, 'PUT', resource_path('access', 'roles', roleid),
+                                  dict(privs=','.join(sorted(privs)), append=0),
+                                  dict(roleid=roleid, action='updated'),
+                                  before=dict(privs=sorted(current_privs[roleid])), after=dict(privs=sorted(privs))))
+    else:
+      unchanged.append(dict(roleid=roleid, action='none', changed=False))
+  for roleid in removed_roles:
+    if roleid in current_privs:
+      operations.append(operation(PHASE_ROLE_DELETES, 'DELETE', resource_path('access', 'roles', roleid), None,
+                                  dict(roleid=roleid, action='deleted'), before=dict(privs=sorted(current_privs[roleid]))))
+    else:
+      unchanged.append(dict(roleid=roleid, action='none', changed=False))
+  return operations, unchanged
+
+def expand_acl_item(item):
+  return expand_acl(
+    item['path'],
+    item['roleid'],
+    users=item.get('users'),
+    groups=item.get('groups'),
+    tokens=item.get('tokens'),
+    propagate=item.get('propagate')
+  )
+
+def acl_operation(phase, group, entries):
+  path, roleid, propagate, delete = group
+  identities = dict((key, []) for identity_type, key in IDENTITY_TYPES)
+  for entry in entries:
+    identities[dict(IDENTITY_TYPES)[entry[2]]].append(entry[3])
+  data = dict(path=path, roles=roleid, delete=delete, propagate=propagate)
+  data.update((key, ','.join(sorted(value))) for key, value in identities.items() if value)
+  result = dict(path=path, roleid=roleid, propagate=propagate, action='revoked' if delete else 'granted')
+  result.update((key, sorted(value)) for key, value in identities.items())
+  requires = [('role', roleid)]
+  requires.extend(('user', userid) for userid in identities['users'])
+  requires.extend(('user', tokenid.split('!')[0]) for tokenid in identities['tokens'])
+  entries = dict((key, value) for key, value in result.items() if key != 'action')
+  if delete:
+    return operation(phase, 'PUT', '/access/acl', data, result, requires=requires, before=entries, after={})
+  return operation(phase, 'PUT', '/access/acl', data, result, requires=requires, after=entries)
+
+def acl_operations(current_acls, acls, removed_acls):
+  desired = {}
+  for item in acls:
+    desired.update(expand_acl_item(item))
+  removed = {}
+  for item in removed_acls:
+    removed.update(expand_acl_item(item))
+
+  # one PUT /access/acl per (path, roleid, propagate, delete) carrying every
+  # user, group and token it applies to.
+  grants = {}
+  for entry, propagate in missing_acl_entries(current_acls, desired).items():
+    grants.setdefault(entry[:2] + (propagate, 0), []).append(entry)
+  revokes = {}
+  for entry, propagate in present_acl_entries(current_acls, removed).items():
+    revokes.setdefault(entry[:2] + (propagate, 1), []).append(entry)
+
+  return (
+    [acl_operation(PHASE_ACL_GRANTS, group, grants[group]) for group in sorted(grants)] +
+    [acl_operation(PHASE_ACL_REVOKES, group, revokes[group]) for group in sorted(revokes)]
+  )
+
+def identity_realm(ugid):
+  return ugid.split('!')[0].rpartition('@')[2]
+
+def in_purge_scope(scope, name, realm=None, path=None):
+  # a purge scope narrows the entities a purge may delete to those of some
+  # `realms`, those on or below some ACL `paths` and those whose name
+  # matches the shell-style `pattern`; an empty scope covers everything.
+  if scope.get('realms') and realm not in split_list(scope['realms']):
+    return False
+  if scope.get('paths') and not [prefix for prefix in split_list(scope['paths'])
+                                 if path == prefix or path.startswith(prefix.rstrip('/') + '/')]:
+    return False
+  return not scope.get('pattern') or fnmatch.fnmatchcase(name, scope['pattern'])
+
+def purged_users(current_users, users, scope, keep=()):
+  # the users in scope that are not in `users`, computed from one listing;
+  # root@pam and the `keep` users, such as the one the API is used as, stay.
+  desired = set(item['userid'] for item in users) | set(PROTECTED_USERS) | set(keep)
+  return sorted(userid for userid in current_users
+                if userid not in desired and in_purge_scope(scope, userid, realm=identity_realm(userid)))
+
+def purged_roles(current_roles, roles, scope):
+  # the built-in roles are special and cannot be deleted.
+  desired = set(item['roleid'] for item in roles)
+  return sorted(roleid for roleid, role in current_roles.items()
+                if roleid not in desired and not to_bool_int(role.get('special'))
+                and in_purge_scope(scope, roleid))
+
+def purged_acls(current_acls, acls, scope, keep=(), deleted_users=(), deleted_roles=()):
+  # removed_acls items revoking every entry in scope that `acls` does not
+  # grant.  Group entries have no realm and are out of a scope with realms.
+  # Entries of the `keep` users and their tokens stay, and those of users
+  # and roles deleted in the same run go with them without a revoke.
+  desired = {}
+  for item in acls:
+    desired.update(expand_acl_item(item))
+  skipped = set(PROTECTED_USERS) | set(keep) | set(deleted_users)
+  deleted_roles = set(deleted_roles)
+  purged = {}
+  for entry in current_acls:
+    path, roleid, identity_type, ugid = entry
+    if entry in desired or roleid in deleted_roles:
+      continue
+    realm = None if identity_type == 'group' else identity_realm(ugid)
+    if realm is not None and ugid.split('!')[0] in skipped:
+      continue
+    if in_purge_scope(scope, ugid, realm=realm, path=path):
+      item = purged.setdefault((path, roleid), dict(path=path, roleid=roleid))
+      item.setdefault(dict(IDENTITY_TYPES)[identity_type], []).append(ugid)
+  return [purged[key] for key in sorted(purged)]
+
+def password_operations(known_userids, passwords, current_userids=()):
+  # current_userids already have their desired password and are left alone.
+  operations = []
+  unchanged = []
+  missing = []
+  for item in passwords:
+    if item['userid'] not in known_userids:
+      missing.append(item['userid'])
+      continue
+    if item['userid'] in current_userids:
+      unchanged.append(dict(userid=item['userid'], action='none', changed=False))
+      continue
+    operations.append(operation(PHASE_PASSWORDS, 'PUT', '/access/password',
+                                dict(userid=item['userid'], password=item['password']),
+                                dict(userid=item['userid'], action='set'), requires=[('user', item['userid'])],
+                                after=dict(password='********')))
+  return operations, unchanged, missing
+
+def group_operations(current_groups, groups, removed_groups):
+  # Proxmox VE only sets a user's groups as a whole, with PUT
+  # /access/users/{userid}.  Member additions and removals of all groups are
+  # therefore collected per user first, so that every user whose
+  # memberships change is written once, whatever the number of groups.
+  operations = []
+  unchanged = []
+  current_memberships = {}
+  for groupid, group in current_groups.items():
+    for userid in group['users']:
+      current_memberships.setdefault(userid, set()).add(groupid)
+  memberships = dict((userid, set(groupids)) for userid, groupids in current_memberships.items())
+  removed = set(groupid for groupid in removed_groups if groupid in current_groups)
+
+  for item in groups:
+    groupid = item['groupid']
+    current = current_groups.get(groupid)
+    written = True
+    if current is None:
+      operations.append(operation(PHASE_GROUPS, 'POST', '/access/groups',
+                                  dict(groupid=groupid, comment=item.get('comment')),
+                                  dict(groupid=groupid, action='created'), provides=('group', groupid)))
+    elif item.get('comment') is not None and item['comment'] != current['comment']:
+      operations.append(operation(PHASE_GROUPS, 'PUT', resource_path('access', 'groups', groupid),
+                                  dict(comment=item['comment']), dict(groupid=groupid, action='updated'),
+                                  before=dict(comment=current['comment'])))
+    else:
+      written = False
+    current_members = current['users'] if current is not None else set()
+    members = current_members
+    if item.get('members') is not None:
+      members = set(split_list(item['members']))
+      if to_bool_int(item.get('append')):
+        members = members | current_members
+      for userid in members - current_members:
+        memberships.setdefault(userid, set()).add(groupid)
+      for userid in current_members - members:
+        memberships[userid].discard(groupid)
+    if current is not None and members == current_members and not written:
+      unchanged.append(dict(groupid=groupid, action='none', changed=False))
+
+  for userid in sorted(memberships):
+    before = current_memberships.get(userid, set()) - removed
+    after = memberships[userid] - removed
+    if after == before:
+      continue
+    operations.append(operation(PHASE_MEMBERS, 'PUT', resource_path('access', 'users', userid),
+                                dict(groups=','.join(sorted(after))),
+                                dict(userid=userid, action='members', added=sorted(after - before),
+                                     removed=sorted(before - after)),
+                                requires=[('group', groupid) for groupid in sorted(after - before)],
+                                before=dict(groups=sorted(before)), after=dict(groups=sorted(after))))
+
+  for groupid in removed_groups:
+    if groupid in current_groups:
+      operations.append(operation(PHASE_GROUP_DELETES, 'DELETE', resource_path('access', 'groups', groupid), None,
+                                  dict(groupid=groupid, action='deleted'),
+                                  before=dict(comment=current_groups[groupid]['comment'],
+                                              members=sorted(current_groups[groupid]['users']))))
+    else:
+      unchanged.append(dict(groupid=groupid, action='none', changed=False))
+  return operations, unchanged
+
+def request_args(op):
+  if op['method'] == 'DELETE':
+    return {'params': op['data']}
+  return {'data': op['data']}
+
+def operation_result(op, error=None):
+  if error is None:
+    return op['result']
+  return dict(op['result'], changed=False, failed=True, msg='API failure encountered.  %s' % str(error))
+
+def apply_operation(proxmox, op):
+  try:
+    proxmox.request(op['method'], op['path'], **request_args(op))
+  except Exception as e:
+    return operation_result(op, e)
+  return operation_result(op)
+
+def apply_phase(proxmox, ops, pool):
+  if proxmox.aio is not None:
+    outcomes = proxmox.aio.request_many([(op['method'], op['path'], request_args(op)) for op in ops])
+    return [operation_result(op, outcome if isinstance(outcome, Exception) else None)
+            for op, outcome in zip(ops, outcomes)]
+  if pool is not None and len(ops) > 1:
+    return pool.map(lambda op: apply_operation(proxmox, op), ops)
+  return [apply_operation(proxmox, op) for op in ops]
+
+def apply_operations(proxmox, operations, max_workers=DEFAULT_MAX_WORKERS):
+  # Operations within a phase are independent of each other and run on up to
+  # max_workers threads sharing the client session, or as concurrent
+  # requests of the asyncio backend; phases run one after the other.  A
+  # failure is recorded on its own result and only skips the operations that
+  # require what it failed to create.
+  phases = {}
+  for op in operations:
+    phases.setdefault(op['phase'], []).append(op)
+
+  pool = None
+  if max_workers > 1 and proxmox.aio is None:
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(max_workers)
+  results = []
+  failed = set()
+  try:
+    for phase in sorted(phases):
+      ops = phases[phase]
+      runnable = [op for op in ops if not failed.intersection(op['requires'])]
+      applied = iter(apply_phase(proxmox, runnable, pool))
+      for op in ops:
+        blocked = [key for key in op['requires'] if key in failed]
+        if blocked:
+          results.append(dict(op['result'], changed=False, failed=True,
+                              msg='skipped, %s %s could not be created.' % blocked[0]))
+          continue
+        result = next(applied)
+        if result.get('failed') and op['provides']:
+          failed.add(op['provides'])
+        results.append(result)
+  finally:
+    if pool is not None:
+      pool.close()
+      pool.join()
+
+  errors = [result for result in results if result.get('failed')]
+  if errors:
+    return {
+      'failed': True,
+      'msg': '%d of %d operations failed.  %s' % (len(errors), len(results), errors[0]['msg']),
+      'results': results
+    }
+  return {
+    'failed': False,
+    'results': results
+  }
+
+def plan_header(result):
+  if 'path' in result:
+    return 'acl %s %s' % (result['path'], result['roleid'])
+  if 'roleid' in result:
+    return 'role %s' % result['roleid']
+  if 'groupid' in result:
+    return 'group %s' % result['groupid']
+  if result['action'] == 'set':
+    return 'password %s' % result['userid']
+  return 'user %s' % result['userid']
+
+def plan_entry(op):
+  return dict(op['result'], request='%s %s' % (op['method'], op['path']), before=op['before'] or {}, after=op['after'] or {})
+
+def plan_operations(operations, unchanged, plan_file=None, diff=False):
+  # What apply_operations would send, in the same order, without sending
+  # it: one result per operation with the `before` and `after` of what it
+  # changes, plus ansible diffs for --diff.  With plan_file the entries are
+  # written there as JSON lines one by one and left out of the results and
+  # diffs, so that plans of many thousand changes stay small in memory and
+  # output.
+  results = []
+  diffs = []
+  counts = {}
+  stream = open(plan_file, 'w') if plan_file else None
+  try:
+    for op in sorted(operations, key=lambda op: op['phase']):
+      entry = plan_entry(op)
+      counts[entry['action']] = counts.get(entry['action'], 0) + 1
+      if stream is not None:
+        stream.write(json.dumps(entry, sort_keys=True) + '\n')
+      else:
+        results.append(entry)
+        if diff:
+          header = plan_header(entry)
+          diffs.append(dict(before_header=header, after_header=header, before=entry['before'], after=entry['after']))
+  finally:
+    if stream is not None:
+      stream.close()
+
+  planned = {
+    'changed': len(operations) > 0,
+    'msg': 'plan: %s, %d unchanged.' % (
+      ', '.join('%d %s' % (counts[action], action) for action in sorted(counts)) or 'no changes', len(unchanged)),
+    'results': results if stream is not None else results + unchanged,
+  }
+  if plan_file:
+    planned['plan_file'] = plan_file
+  if diff and stream is None:
+    planned['diff'] = diffs
+  return planned
+
+def count_actions(results, action):
+  return len([result for result in results if result['action'] == action])
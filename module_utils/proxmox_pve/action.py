@@ -0,0 +1,125 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+# Controller side of the action plugins in action_plugins/.  Only loaded by
+# them, never shipped to a host with a module.  The role's module_utils are
+# only packaged into modules, so the plugins load this file by path and it
+# makes the rest of them importable on the controller first.
+
+import importlib.util
+import os
+
+import ansible.module_utils
+
+MODULE_UTILS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if MODULE_UTILS not in ansible.module_utils.__path__:
+  ansible.module_utils.__path__.append(MODULE_UTILS)
+
+from ansible.errors import AnsibleActionFail
+from ansible.plugins.action import ActionBase
+from ansible.module_utils.proxmox_pve.auth import connect, connect_params
+from ansible.module_utils.proxmox_pve.client import HAS_REQUESTS
+from ansible.module_utils.proxmox_pve.read import SINGLE_READ_THRESHOLD, read_collections
+from ansible.module_utils.proxmox_pve.snapshot import MemorySnapshot
+from ansible.module_utils.proxmox_pve.stats import APIStats
+
+CONNECT_PARAMS = [
+  'api_host', 'api_user', 'api_password', 'api_token_id', 'api_token_secret', 'api_validate_certs',
+  'api_ticket_cache', 'api_ticket_cache_dir', 'api_snapshot_ttl', 'api_connect_timeout', 'api_read_timeout',
+  'api_discover_nodes', 'api_endpoint_ttl',
+]
+
+# The listings each module reads, fetched at once for long loops.
+MODULE_COLLECTIONS = {
+  'proxmox_pve_acl': ['acl'],
+  'proxmox_pve_role': ['roles'],
+  'proxmox_pve_user': ['users'],
+  'proxmox_pve_user_password': ['users'],
+}
+
+# library modules loaded on the controller, by path.
+MODULES = {}
+
+# The client of the task being run, with the number of loop items it has
+# served.  Ansible runs all loop items of a task for one host in the same
+# worker process, one action plugin call per item.
+TASK_CLIENTS = {}
+
+def load_module(path):
+  if path not in MODULES:
+    spec = importlib.util.spec_from_file_location('proxmox_pve_action_%d' % len(MODULES), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    MODULES[path] = module
+  return MODULES[path]
+
+def task_client(task_uuid, params):
+  key = (task_uuid, tuple(params['api_hosts'])) + tuple(params[name] for name in CONNECT_PARAMS)
+  entry = TASK_CLIENTS.get(key)
+  if entry is None:
+    TASK_CLIENTS.clear()
+    proxmox = connect(**connect_params(params))
+    if proxmox.snapshot is None:
+      # without a shared on-disk snapshot the listings still only need to be
+      # read once per task.
+      proxmox.snapshot = MemorySnapshot()
+    entry = TASK_CLIENTS[key] = {'proxmox': proxmox, 'items': 0}
+  entry['items'] += 1
+  return entry
+
+class ProxmoxPVEAction(ActionBase):
+  # Runs a proxmox_pve module in the controller process instead of shipping
+  # it to the host: one login and one HTTP session serve every loop item of
+  # the task, and past SINGLE_READ_THRESHOLD items the listings the module
+  # reads are fetched once and kept current with the task's own writes.
+  # Tasks on any connection but local still run the module on their host.
+  # In check mode the module plans its change instead, as on the host.
+  MODULE = None
+
+  _supports_check_mode = True
+  _supports_async = False
+
+  def run(self, tmp=None, task_vars=None):
+    result = super(ProxmoxPVEAction, self).run(tmp, task_vars)
+    del tmp
+
+    if self._connection.transport != 'local' or not HAS_REQUESTS:
+      result.update(self._execute_module(module_name=self.MODULE, task_vars=task_vars))
+      return result
+
+    context = self._shared_loader_obj.module_loader.find_plugin_with_context(self.MODULE)
+    if not context.resolved:
+      raise AnsibleActionFail('could not find the %s module' % self.MODULE)
+    module = load_module(context.plugin_resolved_path)
+    params = self.validate_argument_spec(argument_spec=module.argument_spec())[1]
+
+    try:
+      entry = task_client(self._task._uuid, params)
+    except Exception as e:
+      result.update(failed=True, msg='authorization on proxmox cluster failed with exception: %s' % e)
+      return result
+
+    proxmox = entry['proxmox']
+    try:
+      if entry['items'] > SINGLE_READ_THRESHOLD and MODULE_COLLECTIONS.get(self.MODULE):
+        read_collections(proxmox, MODULE_COLLECTIONS[self.MODULE])
+      plan = None
+      if self._task.check_mode:
+        plan = dict(diff=self._task.diff)
+      outcome = module.run(proxmox, params, plan)
+    except Exception as e:
+      outcome = {'failed': True, 'msg': 'API failure encountered.  %s' % str(e)}
+    finally:
+      proxmox.snapshot.flush()
+
+    if 'changed' in outcome:
+      result.update(outcome)
+    else:
+      result.update(failed=True, msg=outcome['msg'])
+    # every loop item reports its own calls, the first one including the login.
+    result['api_stats'] = proxmox.stats.as_dict()
+    proxmox.stats = APIStats()
+    return result
@@ -0,0 +1,137 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import ssl
+import time
+
+# Only imported by connect() for api_backend asyncio, as aiohttp is slow to
+# import; client.HAS_AIOHTTP tells whether it is installed.
+
+try:
+    import asyncio
+    import aiohttp
+    CONNECTION_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+except ImportError:
+    CONNECTION_ERRORS = ()
+
+from ansible.module_utils.proxmox_pve.client import ProxmoxAPIError, clean
+from ansible.module_utils.proxmox_pve.endpoints import NodeUnreachable
+from ansible.module_utils.proxmox_pve.session import DEFAULT_CA_BUNDLE_PATH
+
+DEFAULT_CONCURRENCY = 8
+
+class AsyncProxmoxClient(object):
+  # Sends the /access calls of a ProxmoxClient over aiohttp so that many of
+  # them can be in flight at once over a small pool of keep-alive
+  # connections.  Authentication, the ticket cache and the snapshot stay with
+  # the synchronous client; this only borrows its ticket or token.
+  def __init__(self, client, concurrency=DEFAULT_CONCURRENCY):
+    self.client = client
+    self.concurrency = max(1, concurrency)
+    self.loop = asyncio.new_event_loop()
+    self.session = None
+
+  def run(self, coroutine):
+    return self.loop.run_until_complete(coroutine)
+
+  def ssl_context(self):
+    settings = self.client.session.merge_environment_settings(
+      self.client.base_url, {}, None, self.client.session.verify, None)
+    if settings['verify'] is False:
+      return False
+    # the CA bundle requests verifies against: REQUESTS_CA_BUNDLE or
+    # CURL_CA_BUNDLE when set, certifi's otherwise.
+    cafile = settings['verify'] if isinstance(settings['verify'], str) else DEFAULT_CA_BUNDLE_PATH
+    return ssl.create_default_context(cafile=cafile)
+
+  async def open(self):
+    if self.session is not None:
+      return
+    self.session = aiohttp.ClientSession(
+      connector=aiohttp.TCPConnector(limit=self.concurrency, ssl=self.ssl_context()),
+      timeout=aiohttp.ClientTimeout(sock_connect=self.client.timeout[0], sock_read=self.client.timeout[1]),
+    )
+
+  def headers(self, method):
+    headers = {}
+    if 'Authorization' in self.client.session.headers:
+      headers['Authorization'] = self.client.session.headers['Authorization']
+    ticket = self.client.session.cookies.get('PVEAuthCookie')
+    if ticket:
+      headers['Cookie'] = 'PVEAuthCookie=%s' % ticket
+    if method != 'GET' and self.client.csrf_token:
+      headers['CSRFPreventionToken'] = self.client.csrf_token
+    return headers
+
+  async def send(self, method, path, params=None, data=None):
+    await self.open()
+    host = self.client.endpoints.current()
+    start = time.time()
+    try:
+      async with self.session.request(
+        method,
+        'https://%s/api2/json%s' % (host, path),
+        params=clean(params),
+        data=clean(data),
+        headers=self.headers(method),
+      ) as response:
+        status, reason = response.status, response.reason
+        body = await response.read()
+        sent = int(response.request_info.headers.get('Content-Length') or 0)
+    except Exception as e:
+      self.client.stats.record(method, path, None, time.time() - start, 0, 0)
+      if isinstance(e, CONNECTION_ERRORS) and self.client.endpoints.failed(host) and \
+         isinstance(e, aiohttp.ClientConnectorError):
+        raise NodeUnreachable(host, e)
+      raise
+    self.client.stats.record(method, path, status, time.time() - start, sent, len(body))
+    if status >= 400:
+      raise ProxmoxAPIError(status, reason, body.decode('utf-8', 'replace'))
+    return body
+
+  async def request(self, method, path, params=None, data=None, retry_unauthorized=True):
+    # in flight requests and retries are governed by the synchronous
+    # client's executor, so that both backends back off alike.
+    ticket = self.client.session.cookies.get('PVEAuthCookie')
+    try:
+      body = await self.client.executor.run_async(
+        self.loop, method, path, lambda: self.send(method, path, params=params, data=data),
+        on_retry=lambda reason: self.client.stats.record_retry(method, path, reason),
+        connection_errors=CONNECTION_ERRORS)
+    except ProxmoxAPIError as e:
+      if e.status_code != 401 or not retry_unauthorized or self.client.on_unauthorized is None:
+        raise
+      # log in through the synchronous client, which owns the ticket cache,
+      # unless another request already did.
+      if self.client.session.cookies.get('PVEAuthCookie') == ticket:
+        self.client.on_unauthorized(self.client)
+      return await self.request(method, path, params=params, data=data, retry_unauthorized=False)
+    if method != 'GET' and self.client.snapshot is not None:
+      self.client.snapshot.record_write(method, path, clean(data) or clean(params))
+    return json.loads(body.decode('utf-8')).get('data')
+
+  async def gather(self, requests, return_exceptions=False):
+    return await asyncio.gather(
+      *[self.request(method, path, **kwargs) for method, path, kwargs in requests],
+      return_exceptions=return_exceptions
+    )
+
+  def get_many(self, paths, params=None):
+    # params, when given, holds the query parameters of every path.
+    params = params or [None] * len(paths)
+    return self.run(self.gather([('GET', path, {'params': query}) for path, query in zip(paths, params)]))
+
+  def request_many(self, requests):
+    # (method, path, kwargs) tuples sent concurrently; the results, or the
+    # exception each one raised, come back in the order of requests.
+    return self.run(self.gather(requests, return_exceptions=True))
+
+  def close(self):
+    if self.session is not None:
+      self.run(self.session.close())
+      self.session = None
+    self.loop.close()
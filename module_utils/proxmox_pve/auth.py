@@ -0,0 +1,180 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import atexit
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import time
+
+from ansible.module_utils.proxmox_pve.client import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, ProxmoxAPIError, ProxmoxClient
+from ansible.module_utils.proxmox_pve.endpoints import DEFAULT_ENDPOINT_TTL, host_port, select_endpoint
+from ansible.module_utils.proxmox_pve.snapshot import AccessSnapshot, snapshot_path
+
+DEFAULT_TICKET_CACHE_DIR = '~/.cache/proxmox_pve'
+# PVE tickets are valid for two hours; renew them a little before that so a
+# ticket never expires in the middle of a module run.
+TICKET_LIFETIME = 7200
+TICKET_RENEW_MARGIN = 600
+
+def ticket_cache_path(cache_dir, api_host, api_user):
+  key = hashlib.sha256(('%s\0%s' % (api_host, api_user)).encode('utf-8')).hexdigest()
+  return os.path.join(os.path.expanduser(cache_dir), 'ticket-%s.json' % key)
+
+def ticket_fingerprint(password, ticket):
+  return hmac.new(password.encode('utf-8'), ticket.encode('utf-8'), hashlib.sha256).hexdigest()
+
+def load_ticket(path, password):
+  try:
+    with open(path) as f:
+      entry = json.load(f)
+  except (IOError, OSError, ValueError):
+    return None
+
+  # only callers that know the password may reuse the ticket it produced.
+  if not hmac.compare_digest(entry.get('fingerprint', ''), ticket_fingerprint(password, entry.get('ticket', ''))):
+    return None
+  if time.time() - entry.get('issued', 0) >= TICKET_LIFETIME:
+    return None
+  return entry
+
+def store_ticket(path, password, ticket, csrf_token, issued):
+  directory = os.path.dirname(path)
+  if not os.path.isdir(directory):
+    os.makedirs(directory, 0o700)
+  entry = {
+    'ticket': ticket,
+    'csrf_token': csrf_token,
+    'issued': issued,
+    'fingerprint': ticket_fingerprint(password, ticket),
+  }
+  fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.ticket-')
+  try:
+    os.fchmod(fd, 0o600)
+    with os.fdopen(fd, 'w') as f:
+      json.dump(entry, f)
+    os.rename(tmp_path, path)
+  except Exception:
+    os.unlink(tmp_path)
+    raise
+
+def remove_ticket(path):
+  try:
+    os.unlink(path)
+  except OSError:
+    pass
+
+def request_ticket(client, api_user, password):
+  data = client.request('POST', '/access/ticket', data={'username': api_user, 'password': password}, retry_unauthorized=False)
+  if not data or 'ticket' not in data:
+    raise ProxmoxAPIError(401, 'authentication failure')
+  return data['ticket'], data['CSRFPreventionToken']
+
+def login(client, api_user, password, cache_path=None):
+  entry = load_ticket(cache_path, password) if cache_path else None
+  if entry is not None:
+    age = time.time() - entry['issued']
+    if age < TICKET_LIFETIME - TICKET_RENEW_MARGIN:
+      client.set_ticket(entry['ticket'], entry['csrf_token'])
+      return
+    # close to expiry: a valid ticket renews itself without hitting the realm backend.
+    try:
+      ticket, csrf_token = request_ticket(client, api_user, entry['ticket'])
+    except ProxmoxAPIError:
+      ticket, csrf_token = request_ticket(client, api_user, password)
+  else:
+    ticket, csrf_token = request_ticket(client, api_user, password)
+
+  client.set_ticket(ticket, csrf_token)
+  if cache_path:
+    store_ticket(cache_path, password, ticket, csrf_token, time.time())
+
+def auth_args(params, environ=os.environ):
+  # the api_* credentials of a task, falling back to the PROXMOX_PASSWORD and
+  # PROXMOX_TOKEN_SECRET environment variables; ValueError when neither a
+  # password nor a complete token is available.
+  if not (params.get('api_host') and params.get('api_user')):
+    raise ValueError('api_host and api_user are required')
+  api_token_id = params.get('api_token_id')
+  if api_token_id:
+    api_token_secret = params.get('api_token_secret') or environ.get('PROXMOX_TOKEN_SECRET')
+    if not api_token_secret:
+      raise ValueError('You should set api_token_secret param or use PROXMOX_TOKEN_SECRET environment variable')
+    return {'token_name': api_token_id, 'token_value': api_token_secret}
+
+  api_password = params.get('api_password') or environ.get('PROXMOX_PASSWORD')
+  if not api_password:
+    raise ValueError('You should set api_password param or use PROXMOX_PASSWORD environment variable')
+  return {'password': api_password}
+
+def connect_params(params, concurrency=1):
+  # the connect() arguments for the api_* options of a task; ValueError as
+  # auth_args.
+  return dict(
+    api_host=params['api_host'],
+    api_user=params['api_user'],
+    verify_ssl=params['api_validate_certs'],
+    ticket_cache=params['api_ticket_cache'],
+    ticket_cache_dir=params['api_ticket_cache_dir'],
+    snapshot_ttl=params['api_snapshot_ttl'],
+    connect_timeout=params['api_connect_timeout'],
+    read_timeout=params['api_read_timeout'],
+    api_hosts=params['api_hosts'],
+    discover_nodes=params['api_discover_nodes'],
+    endpoint_ttl=params['api_endpoint_ttl'],
+    backend=params.get('api_backend') or 'requests',
+    concurrency=concurrency,
+    **auth_args(params)
+  )
+
+def connect(api_host, api_user, verify_ssl=True, password=None, token_name=None, token_value=None,
+            ticket_cache=True, ticket_cache_dir=None, snapshot_ttl=0, backend='requests', concurrency=1,
+            connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT, api_hosts=None,
+            discover_nodes=False, endpoint_ttl=DEFAULT_ENDPOINT_TTL):
+  client = ProxmoxClient(api_host, verify_ssl=verify_ssl, connect_timeout=connect_timeout,
+                         read_timeout=read_timeout, pool_size=concurrency)
+  client.api_user = api_user
+  if backend == 'asyncio':
+    from ansible.module_utils.proxmox_pve.aio import AsyncProxmoxClient
+    client.aio = AsyncProxmoxClient(client, concurrency)
+    atexit.register(client.aio.close)
+  if snapshot_ttl:
+    client.snapshot = AccessSnapshot(
+      snapshot_path(ticket_cache_dir or DEFAULT_TICKET_CACHE_DIR, client.api_host, api_user),
+      snapshot_ttl
+    )
+    # modules leave through exit_json/fail_json, which both end in sys.exit.
+    atexit.register(client.snapshot.flush)
+
+  # tickets and snapshots stay keyed by api_host whichever node serves them:
+  # a ticket is valid on every node of the cluster.
+  cache_path = None
+  if ticket_cache and not (token_name and token_value):
+    cache_path = ticket_cache_path(ticket_cache_dir or DEFAULT_TICKET_CACHE_DIR, client.api_host, api_user)
+
+  def relogin(client):
+    if cache_path:
+      remove_ticket(cache_path)
+    login(client, api_user, password, cache_path)
+
+  def authenticate():
+    if token_name and token_value:
+      client.set_token(api_user, token_name, token_value)
+      return
+    login(client, api_user, password, cache_path)
+    client.on_unauthorized = relogin
+
+  hosts = [client.api_host]
+  hosts.extend(host for host in (host_port(host) for host in api_hosts or []) if host not in hosts)
+  if len(hosts) > 1 or discover_nodes:
+    select_endpoint(client, hosts, verify_ssl=verify_ssl, discover=discover_nodes,
+                    cache_dir=ticket_cache_dir or DEFAULT_TICKET_CACHE_DIR, ttl=endpoint_ttl,
+                    authenticate=authenticate)
+  else:
+    authenticate()
+  return client
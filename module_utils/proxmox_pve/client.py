@@ -0,0 +1,162 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import threading
+import time
+
+from importlib.util import find_spec
+from urllib.parse import quote
+
+from ansible.module_utils.proxmox_pve.endpoints import EndpointPool, NodeUnreachable, host_port
+from ansible.module_utils.proxmox_pve.executor import DEFAULT_RETRIES, RequestExecutor
+from ansible.module_utils.proxmox_pve.stats import APIStats
+
+# requests and aiohttp take longer to import than most module runs spend on
+# anything else: they are only loaded once a client is built, aiohttp only
+# for api_backend asyncio.
+HAS_REQUESTS = find_spec('requests') is not None
+HAS_AIOHTTP = find_spec('aiohttp') is not None
+
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 30
+
+# pveproxy answers reads of unknown entities with a 500 and one of these.
+NOT_FOUND_REASONS = ('no such', 'does not exist', 'not found')
+
+class ProxmoxAPIError(Exception):
+  def __init__(self, status_code, reason, content=None):
+    self.status_code = status_code
+    self.reason = reason
+    self.content = content
+    super(ProxmoxAPIError, self).__init__('%s %s' % (status_code, reason))
+
+class ProxmoxResource(object):
+  # Mirrors the proxmoxer navigation interface used by the modules, so that
+  # `proxmox.access.users(userid).put(...)` reads the same as before.
+  def __init__(self, client, path):
+    self._client = client
+    self._path = path
+
+  def __getattr__(self, name):
+    if name.startswith('_'):
+      raise AttributeError(name)
+    return ProxmoxResource(self._client, '%s/%s' % (self._path, name))
+
+  def __call__(self, resource_id):
+    return ProxmoxResource(self._client, '%s/%s' % (self._path, quote(str(resource_id), safe='')))
+
+  def get(self, **params):
+    return self._client.request('GET', self._path, params=params)
+
+  def post(self, **data):
+    return self._client.request('POST', self._path, data=data)
+
+  def put(self, **data):
+    return self._client.request('PUT', self._path, data=data)
+
+  def delete(self, **params):
+    return self._client.request('DELETE', self._path, params=params)
+
+class ProxmoxClient(ProxmoxResource):
+  def __init__(self, api_host, verify_ssl=True, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+               read_timeout=DEFAULT_READ_TIMEOUT, pool_size=1, retries=DEFAULT_RETRIES):
+    from ansible.module_utils.proxmox_pve.session import CONNECTION_ERRORS, build_session
+    super(ProxmoxClient, self).__init__(self, '')
+    self.api_host = host_port(api_host)
+    self.api_user = None
+    self.endpoints = EndpointPool([self.api_host])
+    self.timeout = (connect_timeout, read_timeout)
+    self.session = build_session(verify_ssl, pool_size)
+    self.csrf_token = None
+    self.on_unauthorized = None
+    self.login_lock = threading.Lock()
+    self.snapshot = None
+    self.aio = None
+    self.stats = APIStats()
+    self.executor = RequestExecutor(pool_size, retries, connection_errors=CONNECTION_ERRORS)
+    self.connection_errors = CONNECTION_ERRORS
+
+  @property
+  def base_url(self):
+    return 'https://%s/api2/json' % self.endpoints.current()
+
+  def set_ticket(self, ticket, csrf_token):
+    self.session.cookies.set('PVEAuthCookie', ticket)
+    self.csrf_token = csrf_token
+
+  def set_token(self, api_user, token_name, token_value):
+    self.session.headers['Authorization'] = 'PVEAPIToken=%s!%s=%s' % (api_user, token_name, token_value)
+
+  def send(self, method, path, params=None, data=None):
+    headers = {}
+    if method != 'GET' and self.csrf_token:
+      headers['CSRFPreventionToken'] = self.csrf_token
+    host = self.endpoints.current()
+    start = time.time()
+    try:
+      response = self.session.request(
+        method,
+        'https://%s/api2/json%s' % (host, path),
+        params=clean(params),
+        data=clean(data),
+        headers=headers,
+        timeout=self.timeout,
+        # passed per request so that REQUESTS_CA_BUNDLE cannot re-enable
+        # verification that api_validate_certs turned off.
+        verify=self.session.verify
+      )
+    except Exception as e:
+      from ansible.module_utils.proxmox_pve.session import unsent
+      self.stats.record(method, path, None, time.time() - start, 0, 0)
+      if isinstance(e, self.connection_errors) and self.endpoints.failed(host) and unsent(e):
+        raise NodeUnreachable(host, e)
+      raise
+    body = response.request.body or b''
+    self.stats.record(method, path, response.status_code, time.time() - start, len(body), len(response.content))
+    if response.status_code >= 400:
+      raise ProxmoxAPIError(response.status_code, response.reason, response.text)
+    return response
+
+  def request(self, method, path, params=None, data=None, retry_unauthorized=True):
+    ticket = self.session.cookies.get('PVEAuthCookie')
+    try:
+      response = self.executor.run(method, path, lambda: self.send(method, path, params=params, data=data),
+                                   on_retry=lambda reason: self.stats.record_retry(method, path, reason))
+    except ProxmoxAPIError as e:
+      if e.status_code != 401 or not retry_unauthorized or self.on_unauthorized is None:
+        raise
+      # a cached ticket may have been revoked; log in again once and retry.
+      # Concurrent writers that all see the 401 log in only once.
+      with self.login_lock:
+        if self.session.cookies.get('PVEAuthCookie') == ticket:
+          self.on_unauthorized(self)
+      return self.request(method, path, params=params, data=data, retry_unauthorized=False)
+    if method != 'GET' and self.snapshot is not None:
+      self.snapshot.record_write(method, path, clean(data) or clean(params))
+    return response.json().get('data')
+
+def resource_path(*parts):
+  return '/' + '/'.join(quote(str(part), safe='') for part in parts)
+
+def is_not_found(error):
+  if not isinstance(error, ProxmoxAPIError):
+    return False
+  if error.status_code == 404:
+    return True
+  reason = (error.reason or '').lower()
+  return error.status_code == 500 and any(marker in reason for marker in NOT_FOUND_REASONS)
+
+def clean(values):
+  if not values:
+    return None
+  cleaned = {}
+  for key, value in values.items():
+    if value is None:
+      continue
+    if isinstance(value, bool):
+      value = 1 if value else 0
+    cleaned[key] = value
+  return cleaned
@@ -0,0 +1,104 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import os
+import re
+
+from ansible.module_utils.proxmox_pve.auth import connect, connect_params
+from ansible.module_utils.proxmox_pve.stats import merge_api_stats
+
+# number of clusters reconciled at the same time by default.
+DEFAULT_MAX_CLUSTERS = 8
+CREDENTIALS = ['api_password', 'api_token_id', 'api_token_secret']
+
+# the settings of one entry of `clusters`; those left unset are taken from
+# the task's api_* options and max_workers.
+CLUSTER_OPTIONS = dict(
+  name=dict(type='str', required=False),
+  api_host=dict(type='str', required=True),
+  api_hosts=dict(type='list', elements='str', required=False),
+  api_user=dict(type='str', required=False),
+  api_password=dict(type='str', required=False, no_log=True),
+  api_token_id=dict(type='str', required=False, no_log=True),
+  api_token_secret=dict(type='str', required=False, no_log=True),
+  api_validate_certs=dict(type='bool', required=False),
+  max_workers=dict(type='int', required=False),
+)
+
+def cluster_params(params, cluster):
+  # the task's parameters as seen by one cluster.  A cluster with a password
+  # or token of its own takes none of the task's credentials.
+  merged = dict(params)
+  if any(cluster.get(key) for key in CREDENTIALS):
+    merged.update((key, None) for key in CREDENTIALS)
+  merged.update((key, value) for key, value in cluster.items() if value is not None)
+  # the other nodes of the task's api_host are not those of this cluster.
+  merged['api_hosts'] = cluster.get('api_hosts') or []
+  merged['name'] = cluster.get('name') or merged['api_host']
+  return merged
+
+def cluster_plan_file(plan_file, name):
+  # one plan file per cluster, named after it: plan.jsonl -> plan-pve1.jsonl
+  if not plan_file or name is None:
+    return plan_file
+  root, ext = os.path.splitext(plan_file)
+  return '%s-%s%s' % (root, re.sub(r'[^A-Za-z0-9_.-]+', '_', name), ext)
+
+def connect_cluster(params):
+  return connect(**connect_params(params, params['max_workers']))
+
+def reconcile_cluster(params, reconcile):
+  try:
+    proxmox = connect_cluster(params)
+  except Exception as e:
+    return {
+      'failed': True,
+      'msg': 'authorization on proxmox cluster failed with exception: %s' % e
+    }
+  try:
+    result = reconcile(proxmox, params)
+  except Exception as e:
+    result = {
+      'failed': True,
+      'msg': 'API failure encountered.  %s' % str(e)
+    }
+  return dict(result, api_stats=proxmox.stats.as_dict())
+
+def reconcile_clusters(params, clusters, reconcile, max_clusters=DEFAULT_MAX_CLUSTERS):
+  # Runs reconcile(proxmox, cluster_params) for every cluster, up to
+  # max_clusters at a time on threads of their own, each with its own login,
+  # session and max_workers calls in flight, so that the wall time is about
+  # that of the slowest cluster.  The results are kept per cluster name.
+  clusters = [cluster_params(params, cluster) for cluster in clusters]
+  names = [cluster['name'] for cluster in clusters]
+  if len(set(names)) != len(names):
+    return {
+      'failed': True,
+      'msg': 'every entry in clusters needs a distinct name or api_host.'
+    }
+
+  from multiprocessing.pool import ThreadPool
+  pool = ThreadPool(max(1, min(max_clusters, len(clusters))))
+  try:
+    outcomes = pool.map(lambda cluster: reconcile_cluster(cluster, reconcile), clusters)
+  finally:
+    pool.close()
+    pool.join()
+
+  failed = [name for name, result in zip(names, outcomes) if 'changed' not in result]
+  changed = [name for name, result in zip(names, outcomes) if result.get('changed')]
+  msg = 'Proxmox PVE clusters: %d reconciled, %d changed, %d failed.' % (len(names), len(changed), len(failed))
+  if failed:
+    msg += '  %s: %s' % (failed[0], outcomes[names.index(failed[0])]['msg'])
+  result = {
+    'changed': len(changed) > 0,
+    'msg': msg,
+    'clusters': dict(zip(names, outcomes)),
+    'api_stats': merge_api_stats([outcome['api_stats'] for outcome in outcomes if 'api_stats' in outcome]),
+  }
+  if failed:
+    result['failed'] = True
+  return result
@@ -0,0 +1,87 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+USER_FIELDS = ['comment', 'email', 'enable', 'expire', 'firstname', 'groups', 'keys', 'lastname']
+LIST_FIELDS = ['groups', 'keys']
+INT_FIELDS = ['enable', 'expire']
+TRUE_VALUES = (True, 1, '1', 'true', 'True', 'yes', 'on')
+
+IDENTITY_TYPES = [('user', 'users'), ('group', 'groups'), ('token', 'tokens')]
+
+def to_bool_int(value):
+  return 1 if value in TRUE_VALUES else 0
+
+def split_list(value):
+  if value is None:
+    return []
+  if isinstance(value, (list, tuple, set)):
+    items = value
+  else:
+    items = str(value).split(',')
+  return [item.strip() for item in items if item and item.strip()]
+
+def normalize_user_field(key, value):
+  # the API reports missing, empty and default values inconsistently, so
+  # both sides are brought to one canonical form before comparing them.
+  if key == 'enable':
+    return 1 if value is None else to_bool_int(value)
+  if key == 'expire':
+    return int(value or 0)
+  if key in LIST_FIELDS:
+    return sorted(set(split_list(value)))
+  if value is None:
+    return ''
+  return str(value)
+
+def diff_user(current, desired):
+  changes = {}
+  for key in USER_FIELDS:
+    if desired.get(key) is None:
+      continue
+    before = normalize_user_field(key, current.get(key))
+    after = normalize_user_field(key, desired[key])
+    if before != after:
+      changes[key] = {'before': before, 'after': after}
+  return changes
+
+def parse_privs(privs):
+  if isinstance(privs, dict):
+    # GET /access/roles/{roleid} returns the privileges as keys.
+    return set(key for key, value in privs.items() if value)
+  return set(split_list(privs))
+
+def effective_privs(current_privs, privs, append):
+  privs = parse_privs(privs)
+  if to_bool_int(append):
+    return set(current_privs) | privs
+  return privs
+
+def acl_index(acls):
+  return dict(
+    ((acl['path'], acl['roleid'], acl['type'], acl['ugid']), to_bool_int(acl.get('propagate', 1)))
+    for acl in acls
+  )
+
+def expand_acl(path, roleid, users=None, groups=None, tokens=None, propagate=True):
+  propagate = 1 if propagate is None else to_bool_int(propagate)
+  identities = {'users': users, 'groups': groups, 'tokens': tokens}
+  entries = {}
+  for identity_type, key in IDENTITY_TYPES:
+    for ugid in split_list(identities[key]):
+      entries[(path, roleid, identity_type, ugid)] = propagate
+  return entries
+
+def missing_acl_entries(current_acls, desired):
+  return dict(
+    (entry, propagate) for entry, propagate in desired.items()
+    if current_acls.get(entry) != propagate
+  )
+
+def present_acl_entries(current_acls, removed):
+  return dict(
+    (entry, propagate) for entry, propagate in removed.items()
+    if entry in current_acls
+  )
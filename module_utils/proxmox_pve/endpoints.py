@@ -0,0 +1,159 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_PORT = 8006
+# seconds the ranking of the nodes of a cluster is reused from disk before
+# they are probed again.
+DEFAULT_ENDPOINT_TTL = 60
+# seconds a probe may take; a node slower than that is not worth routing to.
+PROBE_TIMEOUT = 2
+# seconds a node that stopped responding is left alone, unless every other
+# node has stopped responding too.
+DOWN_SECONDS = 30
+
+class NodeUnreachable(Exception):
+  # A request could not even be sent to `host`, which has been set aside:
+  # it can be sent again as it is, to the next node.
+  def __init__(self, host, error):
+    self.host = host
+    self.error = error
+    super(NodeUnreachable, self).__init__('%s unreachable: %s' % (host, error))
+
+def host_port(host):
+  return host if ':' in host.rsplit(']', 1)[-1] else '%s:%d' % (host, DEFAULT_PORT)
+
+def ranking_path(cache_dir, hosts):
+  key = hashlib.sha256('\0'.join(sorted(hosts)).encode('utf-8')).hexdigest()
+  return os.path.join(os.path.expanduser(cache_dir), 'endpoints-%s.json' % key)
+
+def load_ranking(path, ttl):
+  try:
+    with open(path) as f:
+      entry = json.load(f)
+  except (IOError, OSError, ValueError):
+    return None
+  if time.time() - entry.get('probed', 0) >= ttl:
+    return None
+  return entry.get('latencies')
+
+def store_ranking(path, latencies):
+  directory = os.path.dirname(path)
+  if not os.path.isdir(directory):
+    os.makedirs(directory, 0o700)
+  fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.endpoints-')
+  try:
+    with os.fdopen(fd, 'w') as f:
+      json.dump({'probed': time.time(), 'latencies': latencies}, f)
+    os.rename(tmp_path, path)
+  except Exception:
+    os.unlink(tmp_path)
+    raise
+
+def probe(host, verify_ssl=True, timeout=PROBE_TIMEOUT):
+  # seconds for pveproxy on host to answer over a new connection, None when
+  # it does not answer or answers that it cannot serve.  Without credentials
+  # the answer is a 401, which is all that is needed.
+  import requests
+  start = time.time()
+  try:
+    response = requests.get('https://%s/api2/json/version' % host, timeout=timeout, verify=verify_ssl)
+  except Exception:
+    return None
+  if response.status_code >= 500:
+    return None
+  return round(time.time() - start, 6)
+
+def probe_all(hosts, verify_ssl=True, timeout=PROBE_TIMEOUT):
+  if len(hosts) == 1:
+    return {hosts[0]: probe(hosts[0], verify_ssl, timeout)}
+  from multiprocessing.pool import ThreadPool
+  pool = ThreadPool(len(hosts))
+  try:
+    latencies = pool.map(lambda host: probe(host, verify_ssl, timeout), hosts)
+  finally:
+    pool.close()
+    pool.join()
+  return dict(zip(hosts, latencies))
+
+def discover_nodes(client, port):
+  # the addresses of the online nodes of the cluster, from /cluster/status.
+  nodes = []
+  for entry in client.request('GET', '/cluster/status') or []:
+    if entry.get('type') == 'node' and entry.get('ip') and int(entry.get('online', 1)):
+      ip = '[%s]' % entry['ip'] if ':' in entry['ip'] else entry['ip']
+      nodes.append('%s:%s' % (ip, port))
+  return nodes
+
+class EndpointPool(object):
+  # The candidate nodes of one cluster, fastest healthy node first, all of
+  # which serve the same /access.  Requests go to current(); a node that
+  # stops responding is set aside by failed() for DOWN_SECONDS, and the next
+  # one takes over for the rest of the run.
+  def __init__(self, hosts):
+    self.hosts = list(hosts)
+    self.down = {}
+    self.lock = threading.Lock()
+
+  def current(self):
+    with self.lock:
+      now = time.time()
+      for host in self.hosts:
+        if self.down.get(host, 0) <= now:
+          return host
+      # every node stopped responding: try the one set aside the longest ago.
+      return min(self.hosts, key=lambda host: self.down[host])
+
+  def failed(self, host):
+    # sets host aside; whether another node is left to take over.
+    with self.lock:
+      if len(self.hosts) < 2:
+        return False
+      now = time.time()
+      self.down[host] = now + DOWN_SECONDS
+      return any(self.down.get(other, 0) <= now for other in self.hosts)
+
+  def rank(self, latencies):
+    # the nodes that answered by latency, then those that did not, which are
+    # set aside.
+    with self.lock:
+      hosts = list(latencies)
+      answered = sorted((host for host in hosts if latencies[host] is not None), key=lambda host: latencies[host])
+      silent = [host for host in hosts if latencies[host] is None]
+      self.hosts = answered + silent
+      until = time.time() + DOWN_SECONDS
+      self.down = dict((host, until) for host in silent)
+
+def select_endpoint(client, hosts, verify_ssl=True, discover=False, cache_dir=None, ttl=DEFAULT_ENDPOINT_TTL,
+                    authenticate=None):
+  # Routes client to the fastest of hosts, and of the other nodes of the
+  # cluster with discover.  The latencies are kept in cache_dir for ttl
+  # seconds, so that the modules of a play probe and discover once.
+  # authenticate() logs the client in; discovery needs it, and it otherwise
+  # runs once the fastest node is known.
+  path = ranking_path(cache_dir, hosts) if cache_dir and ttl else None
+  latencies = load_ranking(path, ttl) if path else None
+  if latencies:
+    client.endpoints.rank(latencies)
+    authenticate()
+    return
+  latencies = probe_all(hosts, verify_ssl)
+  client.endpoints.rank(latencies)
+  authenticate()
+  if discover:
+    port = hosts[0].rsplit(':', 1)[1]
+    found = [node for node in discover_nodes(client, port) if node not in latencies]
+    if found:
+      latencies.update(probe_all(found, verify_ssl))
+      client.endpoints.rank(latencies)
+  if path:
+    store_ranking(path, latencies)
@@ -0,0 +1,176 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import random
+import threading
+import time
+
+from ansible.module_utils.proxmox_pve.endpoints import NodeUnreachable
+from ansible.module_utils.proxmox_pve.stats import endpoint_pattern
+
+# Proxmox VE keeps users, groups, roles and ACLs in /etc/pve/user.cfg, and
+# every write to it takes the cluster filesystem lock.  A writer that waits
+# on the lock for too long is turned away with a 500 such as "cfs-lock
+# 'file-user_cfg' error: got lock request timeout".  Nothing was written
+# then, so the request can be sent again once the lock is less contended.
+LOCK_MARKERS = ('cfs-lock', "can't lock file", 'got lock request timeout', 'got lock timeout')
+# answered by pveproxy, or by the node proxying to another, when a request
+# could not be handled at all.
+UNAVAILABLE_STATUSES = (502, 503, 504, 595, 596)
+# only requests that can be applied twice are retried after an answer that
+# does not tell whether they were.
+IDEMPOTENT_METHODS = ('GET', 'PUT', 'DELETE')
+# POSTs without side effects: a login only issues a ticket.
+SAFE_REQUESTS = (('POST', '/access/ticket'),)
+
+LOCK = 'lock'
+UNAVAILABLE = 'unavailable'
+CONNECTION = 'connection'
+FAILOVER = 'failover'
+
+DEFAULT_RETRIES = 5
+# full jitter: the n-th retry waits a random time of up to
+# min(BACKOFF_CAP, BACKOFF_BASE * 2 ** n) seconds.
+BACKOFF_BASE = 0.25
+BACKOFF_CAP = 8.0
+# a success this many times slower than the fastest of its endpoint is
+# taken as a sign of contention as well.
+SLOW_FACTOR = 4.0
+
+def classify(method, error, connection_errors=(), path=None):
+  # why a failed request may be sent again, or None when it may not.
+  repeatable = method in IDEMPOTENT_METHODS or (method, path) in SAFE_REQUESTS
+  if isinstance(error, NodeUnreachable):
+    # never sent, so any method goes to the next node.
+    return FAILOVER
+  status = getattr(error, 'status_code', None)
+  if status is not None:
+    text = ('%s %s' % (getattr(error, 'reason', None) or '', getattr(error, 'content', None) or '')).lower()
+    if status == 500 and any(marker in text for marker in LOCK_MARKERS):
+      return LOCK
+    if status in UNAVAILABLE_STATUSES and repeatable:
+      return UNAVAILABLE
+    return None
+  if connection_errors and isinstance(error, connection_errors) and repeatable:
+    return CONNECTION
+  return None
+
+def backoff(attempt):
+  return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+class RequestExecutor(object):
+  # Sends the requests of one client, up to `limit` at a time, and retries
+  # those turned away by lock contention or an unavailable node with
+  # jittered backoff.  The limit follows AIMD between 1 and ceiling (the
+  # client's concurrency): every success adds 1/limit, so a full round of
+  # successes adds one, and lock contention, unavailable nodes, lost
+  # connections and markedly slow answers halve it.  Requests that were
+  # already in flight when it was halved do not halve it again.  Requests
+  # that never reached a node that went away are sent to the next one right
+  # away.
+  def __init__(self, ceiling=1, retries=DEFAULT_RETRIES, connection_errors=()):
+    self.ceiling = max(1, ceiling)
+    self.limit = float(self.ceiling)
+    self.retries = retries
+    self.connection_errors = connection_errors
+    self.in_flight = 0
+    self.fastest = {}
+    self.decreased_at = 0.0
+    self.condition = threading.Condition()
+    self.waiters = []
+
+  def allowed(self):
+    return max(1, int(self.limit))
+
+  def try_acquire(self):
+    with self.condition:
+      if self.in_flight < self.allowed():
+        self.in_flight += 1
+        return True
+    return False
+
+  def acquire(self):
+    with self.condition:
+      while self.in_flight >= self.allowed():
+        self.condition.wait()
+      self.in_flight += 1
+    return time.time()
+
+  async def acquire_async(self, loop):
+    while not self.try_acquire():
+      waiter = loop.create_future()
+      self.waiters.append(waiter)
+      await waiter
+    return time.time()
+
+  def release(self, endpoint, start, reason):
+    seconds = time.time() - start
+    with self.condition:
+      self.in_flight -= 1
+      fastest = self.fastest.get(endpoint)
+      if reason is None:
+        self.fastest[endpoint] = seconds if fastest is None else min(fastest, seconds)
+      if reason == FAILOVER:
+        # not contention: the node went away, and its latencies say nothing
+        # about the next one.
+        self.fastest = {}
+      elif reason is not None or (fastest is not None and seconds > SLOW_FACTOR * fastest):
+        if start >= self.decreased_at:
+          self.limit = max(1.0, self.limit / 2)
+          self.decreased_at = time.time()
+      else:
+        self.limit = min(float(self.ceiling), self.limit + 1.0 / self.limit)
+      self.condition.notify_all()
+      waiters, self.waiters = self.waiters, []
+    for waiter in waiters:
+      if not waiter.done():
+        waiter.set_result(None)
+
+  def run(self, method, path, send, on_retry=None):
+    # send() performs one attempt, raising for error answers.
+    endpoint = '%s %s' % (method, endpoint_pattern(path))
+    attempt = 0
+    while True:
+      start = self.acquire()
+      try:
+        result = send()
+      except Exception as e:
+        reason = classify(method, e, self.connection_errors, path)
+        self.release(endpoint, start, reason)
+        if reason is None or attempt >= self.retries:
+          raise
+        attempt += 1
+        if on_retry is not None:
+          on_retry(reason)
+        if reason != FAILOVER:
+          time.sleep(backoff(attempt))
+        continue
+      self.release(endpoint, start, None)
+      return result
+
+  async def run_async(self, loop, method, path, send, on_retry=None, connection_errors=()):
+    # send() returns the coroutine of one attempt; connection_errors are
+    # those of the asynchronous backend.
+    import asyncio
+    endpoint = '%s %s' % (method, endpoint_pattern(path))
+    attempt = 0
+    while True:
+      start = await self.acquire_async(loop)
+      try:
+        result = await send()
+      except Exception as e:
+        reason = classify(method, e, connection_errors, path)
+        self.release(endpoint, start, reason)
+        if reason is None or attempt >= self.retries:
+          raise
+        attempt += 1
+        if on_retry is not None:
+          on_retry(reason)
+        if reason != FAILOVER:
+          await asyncio.sleep(backoff(attempt))
+        continue
+      self.release(endpoint, start, None)
+      return result
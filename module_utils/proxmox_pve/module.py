@@ -0,0 +1,98 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+# The api_* options every module in library/ takes, connecting with them and
+# running the bulk modules against one or many clusters.  Importing this is
+# cheap: requests and aiohttp are only loaded by connect_module().
+
+from ansible.module_utils.proxmox_pve.auth import connect, connect_params
+from ansible.module_utils.proxmox_pve.clusters import cluster_plan_file, reconcile_clusters
+from ansible.module_utils.proxmox_pve.client import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, HAS_AIOHTTP, HAS_REQUESTS
+from ansible.module_utils.proxmox_pve.endpoints import DEFAULT_ENDPOINT_TTL
+
+API_ARGUMENT_SPEC = dict(
+  api_host=dict(type='str', required=True),
+  api_password=dict(type='str', no_log=True),
+  api_token_id=dict(type='str', no_log=True),
+  api_token_secret=dict(type='str', no_log=True),
+  api_user=dict(type='str', required=True),
+  api_validate_certs=dict(type='bool', default=True),
+  api_ticket_cache=dict(type='bool', default=True),
+  api_ticket_cache_dir=dict(type='str', required=False),
+  api_snapshot_ttl=dict(type='int', default=0, required=False),
+  api_connect_timeout=dict(type='int', default=DEFAULT_CONNECT_TIMEOUT, required=False),
+  api_read_timeout=dict(type='int', default=DEFAULT_READ_TIMEOUT, required=False),
+  api_hosts=dict(type='list', elements='str', default=[], required=False),
+  api_discover_nodes=dict(type='bool', default=False, required=False),
+  api_endpoint_ttl=dict(type='int', default=DEFAULT_ENDPOINT_TTL, required=False),
+)
+
+BACKEND_ARGUMENT_SPEC = dict(
+  api_backend=dict(type='str', default='requests', choices=['requests', 'asyncio'], required=False),
+)
+
+def api_argument_spec(backend=False, **options):
+  # the argument_spec of a module: the api_* options, api_backend for the
+  # modules that can send their requests concurrently, and its own options.
+  # Modules taking `clusters` check api_host and api_user themselves, as
+  # every cluster brings its own.
+  spec = dict((name, dict(option)) for name, option in API_ARGUMENT_SPEC.items())
+  if backend:
+    spec.update((name, dict(option)) for name, option in BACKEND_ARGUMENT_SPEC.items())
+  if 'clusters' in options:
+    spec['api_host']['required'] = False
+    spec['api_user']['required'] = False
+  spec.update(options)
+  return spec
+
+def check_backend(module):
+  if not HAS_REQUESTS:
+    module.fail_json(msg='requests required for this module')
+  if module.params.get('api_backend') == 'asyncio' and not HAS_AIOHTTP:
+    module.fail_json(msg='aiohttp required for api_backend asyncio')
+
+def connect_module(module, concurrency=1):
+  # the client of a module run, logged in with its api_* options.  Fails the
+  # module when it cannot connect.
+  check_backend(module)
+  try:
+    kwargs = connect_params(module.params, concurrency)
+  except ValueError as e:
+    module.fail_json(msg=str(e))
+
+  try:
+    return connect(**kwargs)
+  except Exception as e:
+    module.fail_json(msg='authorization on proxmox cluster failed with exception: %s' % e)
+
+def run_bulk_module(module, reconcile):
+  # The rest of main() of the bulk modules: reconcile(proxmox, params, plan)
+  # against every cluster in `clusters`, or against api_host, and exit the
+  # module with its result.  `plan` is None unless in check mode.
+  def run(proxmox, params):
+    plan = None
+    if module.check_mode:
+      plan = dict(plan_file=cluster_plan_file(params['plan_file'], params.get('name')), diff=module._diff)
+    return reconcile(proxmox, params, plan)
+
+  if module.params.get('clusters'):
+    check_backend(module)
+    result = reconcile_clusters(module.params, module.params['clusters'], run, module.params['max_clusters'])
+    if result.get('failed'):
+      module.fail_json(**result)
+    module.exit_json(**result)
+
+  if not (module.params['api_host'] and module.params['api_user']):
+    module.fail_json(msg='api_host and api_user are required unless clusters is given')
+
+  proxmox = connect_module(module, concurrency=module.params['max_workers'])
+
+  result = run(proxmox, module.params)
+
+  if 'changed' in result:
+    module.exit_json(api_stats=proxmox.stats.as_dict(), **result)
+  else:
+    module.fail_json(api_stats=proxmox.stats.as_dict(), **result)
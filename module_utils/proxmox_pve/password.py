@@ -0,0 +1,173 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import binascii
+import fcntl
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+
+from ansible.module_utils.proxmox_pve.auth import DEFAULT_TICKET_CACHE_DIR
+from ansible.module_utils.proxmox_pve.client import ProxmoxAPIError
+
+# How to tell that a user already has the desired password, so that setting
+# it again can be skipped:
+#   always       no check, every password is written.
+#   fingerprint  compare with a salted fingerprint of the password last set
+#                from this controller.  The modules forget it when they
+#                create or delete the user, but it misses changes made
+#                elsewhere, such as a user deleted and created again.
+#   verify       request a ticket as the user with the desired password;
+#                one login per user, and every mismatch is logged by the
+#                cluster as a failed login.
+PASSWORD_CHECKS = ['always', 'fingerprint', 'verify']
+DEFAULT_PASSWORD_CHECK = 'always'
+# PBKDF2 rounds per fingerprint: slow enough to make the cache file useless
+# for guessing passwords, fast enough for a few thousand users per run.
+FINGERPRINT_ITERATIONS = 10000
+
+def fingerprint_path(cache_dir, api_host):
+  key = hashlib.sha256(api_host.encode('utf-8')).hexdigest()
+  return os.path.join(os.path.expanduser(cache_dir), 'passwords-%s.json' % key)
+
+def password_fingerprint(password, salt):
+  return binascii.hexlify(hashlib.pbkdf2_hmac(
+    'sha256', password.encode('utf-8'), binascii.unhexlify(salt), FINGERPRINT_ITERATIONS)).decode('ascii')
+
+class PasswordFingerprints(object):
+  # Salted fingerprints of the passwords set on one cluster, one 0600 file
+  # per api_host next to the tickets.  Updates, None for a forgotten user,
+  # are kept in memory until save(), which merges them into the file under
+  # a lock.
+  def __init__(self, path):
+    self.path = path
+    self.entries = None
+    self.updates = {}
+
+  def load(self):
+    try:
+      with open(self.path) as f:
+        return json.load(f)
+    except (IOError, OSError, ValueError):
+      return {}
+
+  def matches(self, userid, password):
+    if self.entries is None:
+      self.entries = self.load()
+    entry = self.updates[userid] if userid in self.updates else self.entries.get(userid)
+    if not entry:
+      return False
+    return hmac.compare_digest(entry['fingerprint'], password_fingerprint(password, entry['salt']))
+
+  def update(self, userid, password):
+    salt = binascii.hexlify(os.urandom(16)).decode('ascii')
+    self.updates[userid] = {'salt': salt, 'fingerprint': password_fingerprint(password, salt)}
+
+  def forget(self, userid):
+    self.updates[userid] = None
+
+  def save(self):
+    if not self.updates:
+      return
+    if not any(self.updates.values()) and not os.path.exists(self.path):
+      # nothing to forget, and no reason to create the file.
+      self.updates = {}
+      return
+    directory = os.path.dirname(self.path)
+    if not os.path.isdir(directory):
+      os.makedirs(directory, 0o700)
+    fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+      fcntl.flock(fd, fcntl.LOCK_EX)
+      entries = self.load()
+      for userid, entry in self.updates.items():
+        if entry is None:
+          entries.pop(userid, None)
+        else:
+          entries[userid] = entry
+      tmp_fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.passwords-')
+      try:
+        os.fchmod(tmp_fd, 0o600)
+        with os.fdopen(tmp_fd, 'w') as f:
+          json.dump(entries, f)
+        os.rename(tmp_path, self.path)
+      except Exception:
+        os.unlink(tmp_path)
+        raise
+    finally:
+      fcntl.flock(fd, fcntl.LOCK_UN)
+      os.close(fd)
+    self.entries = entries
+    self.updates = {}
+
+def ticket_request(userid, password):
+  return ('POST', '/access/ticket', {'data': {'username': userid, 'password': password}, 'retry_unauthorized': False})
+
+def password_verified(outcome):
+  if isinstance(outcome, ProxmoxAPIError) and outcome.status_code == 401:
+    return False
+  if isinstance(outcome, Exception):
+    raise outcome
+  return bool(outcome) and 'ticket' in outcome
+
+def verify_password(proxmox, userid, password):
+  method, path, kwargs = ticket_request(userid, password)
+  try:
+    outcome = proxmox.request(method, path, **kwargs)
+  except ProxmoxAPIError as e:
+    outcome = e
+  return password_verified(outcome)
+
+def verified_passwords(proxmox, passwords, max_workers=1):
+  # userids of the (userid, password) pairs the realm accepts, checked
+  # concurrently like the writes of one phase.
+  if proxmox.aio is not None:
+    outcomes = proxmox.aio.request_many([ticket_request(userid, password) for userid, password in passwords])
+    return set(userid for (userid, password), outcome in zip(passwords, outcomes) if password_verified(outcome))
+  if max_workers > 1 and len(passwords) > 1:
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(max_workers)
+    try:
+      verified = pool.map(lambda item: verify_password(proxmox, *item), passwords)
+    finally:
+      pool.close()
+      pool.join()
+  else:
+    verified = [verify_password(proxmox, userid, password) for userid, password in passwords]
+  return set(userid for (userid, password), ok in zip(passwords, verified) if ok)
+
+def current_passwords(proxmox, passwords, check, fingerprints=None, max_workers=1):
+  # userids among the (userid, password) pairs whose password is already
+  # the desired one according to `check`.
+  if check == 'fingerprint' and fingerprints is not None:
+    return set(userid for userid, password in passwords if fingerprints.matches(userid, password))
+  if check == 'verify' and passwords:
+    return verified_passwords(proxmox, passwords, max_workers)
+  return set()
+
+def password_fingerprints(proxmox, cache_dir=None):
+  return PasswordFingerprints(fingerprint_path(cache_dir or DEFAULT_TICKET_CACHE_DIR, proxmox.api_host))
+
+def forget_passwords(proxmox, userids, cache_dir=None):
+  fingerprints = password_fingerprints(proxmox, cache_dir)
+  for userid in userids:
+    fingerprints.forget(userid)
+  fingerprints.save()
+
+def record_passwords(fingerprints, results, passwords):
+  # remember the passwords of the successful writes among results, and
+  # forget those of the users results created or deleted: a user created
+  # under the same name again has no password at all.
+  passwords = dict(passwords)
+  for result in results:
+    if 'userid' in result and result.get('action') in ('created', 'deleted'):
+      fingerprints.forget(result['userid'])
+  for result in results:
+    if result.get('action') == 'set' and not result.get('failed') and result['userid'] in passwords:
+      fingerprints.update(result['userid'], passwords[result['userid']])
+  fingerprints.save()
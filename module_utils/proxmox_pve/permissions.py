@@ -0,0 +1,280 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import time
+
+from ansible.module_utils.proxmox_pve.diff import parse_privs, split_list, to_bool_int
+
+ROOT_USER = 'root@pam'
+NO_ACCESS = 'NoAccess'
+
+def normalize_path(path):
+  parts = [part for part in (path or '').split('/') if part]
+  return '/' + '/'.join(parts)
+
+def path_parts(path):
+  return tuple(part for part in path.split('/') if part)
+
+def new_node():
+  return {'users': {}, 'groups': {}}
+
+class PermissionIndex(object):
+  # Effective privileges computed locally from the /access/acl, /access/roles,
+  # /access/users?full=1 and /access/groups listings, the way Proxmox VE
+  # does for every request:
+  #   - the ACL paths form a tree walked from / down to the path asked for.
+  #     At every level an entry for the user or token itself replaces what
+  #     was inherited, else the entries of the user's groups do; entries
+  #     with propagate off only count on their own path.
+  #   - NoAccess among the resulting roles leaves no privileges.
+  #   - a token with privilege separation gets what its own entries and its
+  #     user's both grant; without, exactly its user's.
+  #   - root@pam has every privilege, disabled and expired users and tokens
+  #     none.
+  # Role privilege sets are built once, and the roles inherited on every
+  # path prefix are kept per identity, so a report over many paths walks
+  # every prefix only once.  Users without entries of their own share the
+  # work with every other user of the same groups.
+  def __init__(self, acls, roles, users, groups=None, now=None):
+    self.now = time.time() if now is None else now
+    self.role_privs = dict((role['roleid'], frozenset(parse_privs(role.get('privs')))) for role in roles)
+    self.all_privs = frozenset().union(*self.role_privs.values()) if self.role_privs else frozenset()
+    self.privs_cache = {}
+    self.roles_cache = {}
+    self.subjects = {}
+
+    # the ACL tree, as its nodes by path parts.
+    self.nodes = {}
+    self.paths = set()
+    self.direct = set()
+    self.ugid_nodes = {}
+    self.group_nodes = {}
+    self.layout_cache = None
+    for acl in acls:
+      path = normalize_path(acl['path'])
+      node = self.nodes.setdefault(path_parts(path), new_node())
+      self.paths.add(path)
+      bucket = node['groups'] if acl['type'] == 'group' else node['users']
+      bucket.setdefault(acl['ugid'], {})[acl['roleid']] = 1 if acl.get('propagate') is None else to_bool_int(acl['propagate'])
+      if acl['type'] == 'group':
+        self.group_nodes.setdefault(acl['ugid'], set()).add(path_parts(path))
+      else:
+        self.direct.add(acl['ugid'])
+        self.ugid_nodes.setdefault(acl['ugid'], set()).add(path_parts(path))
+
+    self.users = {}
+    self.tokens = {}
+    self.groups = {}
+    for user in users:
+      userid = user['userid']
+      self.users[userid] = user
+      for group in split_list(user.get('groups')):
+        self.groups.setdefault(userid, set()).add(group)
+      for token in user.get('tokens') or []:
+        self.tokens['%s!%s' % (userid, token['tokenid'])] = dict(token, userid=userid)
+    for group in groups or []:
+      for userid in split_list(group.get('users')):
+        self.groups.setdefault(userid, set()).add(group['groupid'])
+
+  def identities(self):
+    return sorted(self.users) + sorted(self.tokens)
+
+  def subject(self, ugid):
+    # what the ACL walk depends on: the identity itself when it has entries
+    # of its own, and its groups.
+    subject = self.subjects.get(ugid)
+    if subject is None:
+      groups = frozenset(self.groups.get(ugid, ())) if ugid in self.users else frozenset()
+      subject = self.subjects[ugid] = (ugid if ugid in self.direct else None, groups)
+    return subject
+
+  def node_roles(self, node, subject, final):
+    # the roles a tree node assigns to subject, or None when it has no say.
+    ugid, groups = subject
+    own = node['users'].get(ugid) if ugid is not None else None
+    if own:
+      roles = dict((roleid, propagate) for roleid, propagate in own.items() if final or propagate)
+      if roles:
+        return roles
+    roles = {}
+    for group in groups.intersection(node['groups']):
+      roles.update((roleid, propagate) for roleid, propagate in node['groups'][group].items() if final or propagate)
+    return roles or None
+
+  def inherited(self, subject, parts):
+    # roles passed on to the children of the path made of parts.
+    key = (subject, parts)
+    if key in self.roles_cache:
+      return self.roles_cache[key]
+    roles = self.inherited(subject, parts[:-1]) if parts else {}
+    node = self.nodes.get(parts)
+    if node is not None:
+      roles = self.node_roles(node, subject, False) or roles
+    self.roles_cache[key] = roles
+    return roles
+
+  def roles(self, ugid, path):
+    parts = path_parts(path)
+    subject = self.subject(ugid)
+    node = self.nodes.get(parts)
+    inherited = self.inherited(subject, parts[:-1]) if parts else {}
+    roles = (node is not None and self.node_roles(node, subject, True)) or inherited
+    return frozenset(roles)
+
+  def role_set_privs(self, roles):
+    privs = self.privs_cache.get(roles)
+    if privs is None and NO_ACCESS in roles:
+      privs = self.privs_cache[roles] = frozenset()
+    elif privs is None:
+      privs = self.privs_cache[roles] = frozenset().union(*[self.role_privs.get(roleid, frozenset()) for roleid in roles])
+    return privs
+
+  def active(self, entry):
+    if entry is None or not to_bool_int(entry.get('enable', 1)):
+      return False
+    expire = int(entry.get('expire') or 0)
+    return not expire or expire > self.now
+
+  def privileges(self, ugid, path):
+    if '!' in ugid:
+      token = self.tokens.get(ugid)
+      if token is None or not self.active(token):
+        return frozenset()
+      user_privs = self.privileges(token['userid'], path)
+      if not to_bool_int(token.get('privsep', 1)):
+        return user_privs
+      return user_privs & self.role_set_privs(self.roles(ugid, path))
+    if ugid == ROOT_USER:
+      return self.role_privs.get('Administrator', self.all_privs)
+    if not self.active(self.users.get(ugid)):
+      return frozenset()
+    return self.role_set_privs(self.roles(ugid, path))
+
+  def layout(self, paths):
+    # paths in tree order, so that the paths below each one follow it as a
+    # contiguous range, with where that range ends.
+    order = sorted(paths, key=path_parts)
+    parts = [path_parts(path) for path in order]
+    ends = [len(order)] * len(order)
+    stack = []
+    for i, current in enumerate(parts):
+      while stack and current[:len(parts[stack[-1]])] != parts[stack[-1]]:
+        ends[stack.pop()] = i
+      stack.append(i)
+    return order, parts, ends
+
+  def positions(self, layout):
+    if self.layout_cache is None or self.layout_cache[0] is not layout:
+      self.layout_cache = (layout, dict((node_parts, i) for i, node_parts in enumerate(layout[1])), {})
+    return self.layout_cache[1]
+
+  def layout_entries(self, layout, kind, ugid):
+    # (position, roles on the path itself, roles passed below) of the laid
+    # out nodes with `kind` ('users' or 'groups') entries for ugid.
+    positions = self.positions(layout)
+    cache = self.layout_cache[2]
+    if (kind, ugid) not in cache:
+      entries = []
+      for node_parts in (self.group_nodes if kind == 'groups' else self.ugid_nodes).get(ugid, ()):
+        if node_parts in positions:
+          roles = self.nodes[node_parts][kind][ugid]
+          entries.append((positions[node_parts], frozenset(roles),
+                          frozenset(roleid for roleid, propagate in roles.items() if propagate)))
+      cache[(kind, ugid)] = entries
+    return cache[(kind, ugid)]
+
+  def subject_privs(self, subject, layout):
+    # the privileges of subject on every path of layout.  Only the nodes it
+    # has entries on are visited; each passes its privileges on to the
+    # range of paths below it, which deeper nodes then overwrite.
+    order, parts, ends = layout
+    ugid, groups = subject
+    at = {}
+    for group in groups:
+      for i, final, passed in self.layout_entries(layout, 'groups', group):
+        if i in at:
+          at[i] = (at[i][0] | final, at[i][1] | passed)
+        else:
+          at[i] = (final, passed)
+    if ugid is not None:
+      # the identity's own entries win over its groups' on the same path.
+      for i, final, passed in self.layout_entries(layout, 'users', ugid):
+        group_final, group_passed = at.get(i, (frozenset(), frozenset()))
+        at[i] = (final or group_final, passed or group_passed)
+
+    privs = [frozenset()] * len(order)
+    own = {}
+    for i in sorted(at):
+      final, passed = at[i]
+      own[i] = self.role_set_privs(final) if final else privs[i]
+      if passed and ends[i] > i + 1:
+        privs[i + 1:ends[i]] = [self.role_set_privs(passed)] * (ends[i] - i - 1)
+    for i, value in own.items():
+      privs[i] = value
+    return privs
+
+  def identity_privs(self, ugid, layout, cache):
+    # (key, privileges on every path of layout) of ugid, None when it has
+    # none at all.  Identities with the same key have the same privileges.
+    if '!' in ugid:
+      token = self.tokens.get(ugid)
+      if token is None or not self.active(token):
+        return None
+      user = self.identity_privs(token['userid'], layout, cache)
+      if user is None or not to_bool_int(token.get('privsep', 1)):
+        return user
+      key = ('token', ugid)
+      if key not in cache:
+        cache[key] = [privs & own for privs, own in zip(user[1], self.subject_privs(self.subject(ugid), layout))]
+      return key, cache[key]
+    if ugid == ROOT_USER:
+      key = ('root',)
+      if key not in cache:
+        cache[key] = [self.role_privs.get('Administrator', self.all_privs)] * len(layout[0])
+      return key, cache[key]
+    if not self.active(self.users.get(ugid)):
+      return None
+    subject = self.subject(ugid)
+    if subject not in cache:
+      cache[subject] = self.subject_privs(subject, layout)
+    return subject, cache[subject]
+
+  def report(self, identities=None, paths=None, required=None):
+    # {identity: {path: sorted privileges}} over the given identities and
+    # paths, every user and token on every ACL path by default, leaving out
+    # empty privilege sets and those missing any of `required`.  Only the
+    # ACL paths above the ones asked for are laid out.
+    required = frozenset(required or [])
+    wanted = set(normalize_path(path) for path in paths) if paths else self.paths | set(['/'])
+    laid_out = set(wanted)
+    for path in wanted:
+      parts = path_parts(path)
+      laid_out.update('/' + '/'.join(parts[:depth]) for depth in range(len(parts)) if parts[:depth] in self.nodes)
+    layout = self.layout(laid_out)
+    outputs = [(i, path) for i, path in enumerate(layout[0]) if path in wanted]
+    listed = {}
+    cache = {}
+    # users of the same groups without entries of their own share one list.
+    reports = {}
+    report = {}
+    for ugid in identities if identities is not None else self.identities():
+      found = self.identity_privs(ugid, layout, cache)
+      if found is None:
+        continue
+      key, privs = found
+      entries = reports.get(key)
+      if entries is None:
+        entries = {}
+        for i, path in outputs:
+          value = privs[i]
+          if value and required <= value:
+            if value not in listed:
+              listed[value] = sorted(value)
+            entries[path] = listed[value]
+        reports[key] = entries
+      if entries:
+        report[ugid] = entries
+    return report
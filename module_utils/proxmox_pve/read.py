@@ -0,0 +1,123 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible.module_utils.proxmox_pve.client import is_not_found, resource_path
+from ansible.module_utils.proxmox_pve.diff import split_list
+from ansible.module_utils.proxmox_pve.snapshot import COLLECTIONS
+
+# Up to this many entities are read one by one from /access/{users,roles}/{id};
+# past it a single full-list read with a dict index is cheaper.
+SINGLE_READ_THRESHOLD = 8
+
+def use_single_reads(ids):
+  return ids is not None and len(ids) <= SINGLE_READ_THRESHOLD
+
+def cached_collection(proxmox, collection):
+  if proxmox.snapshot is None or collection not in COLLECTIONS:
+    return None
+  return proxmox.snapshot.get(collection)
+
+def store_collection(proxmox, collection, data):
+  if proxmox.snapshot is not None and collection in COLLECTIONS:
+    proxmox.snapshot.put(collection, data)
+  return data
+
+def fetch_collection(proxmox, collection):
+  return store_collection(proxmox, collection, getattr(proxmox.access, collection).get())
+
+def read_collections(proxmox, collections, params=None):
+  # full listings of several /access collections, e.g. users, roles, acl,
+  # groups and domains; the asyncio backend fetches them concurrently.
+  # Collections given query parameters in `params`, such as
+  # {'users': {'full': 1}}, differ from the shared listings and are always
+  # fetched and never cached.
+  params = params or {}
+  data = dict((collection, None if collection in params else cached_collection(proxmox, collection))
+              for collection in collections)
+  missing = [collection for collection in collections if data[collection] is None]
+  if proxmox.aio is not None and len(missing) > 1:
+    fetched = proxmox.aio.get_many(
+      [resource_path('access', collection) for collection in missing],
+      [params.get(collection) for collection in missing]
+    )
+    for collection, listing in zip(missing, fetched):
+      data[collection] = listing if collection in params else store_collection(proxmox, collection, listing)
+  else:
+    for collection in missing:
+      if collection in params:
+        data[collection] = getattr(proxmox.access, collection).get(**params[collection])
+      else:
+        data[collection] = fetch_collection(proxmox, collection)
+  return data
+
+def read_entities(proxmox, collection, ids):
+  # GET /access/{collection}/{id} for every id, leaving out the ones that do
+  # not exist.
+  ids = sorted(set(ids))
+  if proxmox.aio is not None:
+    outcomes = proxmox.aio.request_many([('GET', resource_path('access', collection, entity_id), {}) for entity_id in ids])
+  else:
+    outcomes = []
+    for entity_id in ids:
+      try:
+        outcomes.append(proxmox.request('GET', resource_path('access', collection, entity_id)))
+      except Exception as e:
+        if not is_not_found(e):
+          raise
+        outcomes.append(e)
+  entities = {}
+  for entity_id, outcome in zip(ids, outcomes):
+    if isinstance(outcome, Exception):
+      if is_not_found(outcome):
+        continue
+      raise outcome
+    entities[entity_id] = outcome
+  return entities
+
+def read_users(proxmox, userids=None):
+  users = cached_collection(proxmox, 'users')
+  if users is None and not use_single_reads(userids):
+    users = fetch_collection(proxmox, 'users')
+  if users is not None:
+    return dict((user['userid'], user) for user in users)
+
+  users = {}
+  for userid, user in read_entities(proxmox, 'users', userids).items():
+    users[userid] = dict(user, userid=userid)
+  return users
+
+def read_roles(proxmox, roleids=None):
+  roles = cached_collection(proxmox, 'roles')
+  if roles is None and not use_single_reads(roleids):
+    roles = fetch_collection(proxmox, 'roles')
+  if roles is not None:
+    return dict((role['roleid'], role) for role in roles)
+
+  roles = {}
+  for roleid, privs in read_entities(proxmox, 'roles', roleids).items():
+    # the single role endpoint returns the privileges as keys.
+    roles[roleid] = {
+      'roleid': roleid,
+      'privs': ','.join(sorted(key for key, value in (privs or {}).items() if value)),
+    }
+  return roles
+
+def read_acls(proxmox):
+  acls = cached_collection(proxmox, 'acl')
+  if acls is None:
+    acls = fetch_collection(proxmox, 'acl')
+  return acls
+
+def read_groups(proxmox):
+  # {groupid: {'comment', 'users'}} with the members as a set; groups are
+  # not part of the snapshot and always read.
+  groups = {}
+  for group in fetch_collection(proxmox, 'groups'):
+    groups[group['groupid']] = {
+      'comment': group.get('comment') or '',
+      'users': set(split_list(group.get('users'))),
+    }
+  return groups
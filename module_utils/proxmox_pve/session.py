@@ -0,0 +1,72 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import ssl
+
+# Only imported once a ProxmoxClient is built, as requests is slow to import.
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from requests.utils import DEFAULT_CA_BUNDLE_PATH
+    from urllib3.exceptions import ConnectTimeoutError
+    CONNECTION_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+except ImportError:
+    HTTPAdapter = object
+    CONNECTION_ERRORS = ()
+
+class ResumingSSLContext(ssl.SSLContext):
+  # Offers the TLS session of the previous connection when opening the next
+  # one, so that further connections of the pool (and reconnects after
+  # pveproxy closed an idle one) skip the full handshake.
+  last_socket = None
+
+  def wrap_socket(self, sock, *args, **kwargs):
+    # the session is read lazily: with TLS 1.3 the ticket only arrives after
+    # the handshake has completed.
+    session = self.last_socket.session if self.last_socket is not None else None
+    if session is not None and kwargs.get('session') is None:
+      kwargs['session'] = session
+    tls_socket = super(ResumingSSLContext, self).wrap_socket(sock, *args, **kwargs)
+    self.last_socket = tls_socket
+    return tls_socket
+
+def ssl_context():
+  context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+  # urllib3 sets the verification mode from `verify` and matches the
+  # hostname itself.
+  context.check_hostname = False
+  context.load_verify_locations(DEFAULT_CA_BUNDLE_PATH)
+  return context
+
+class PoolAdapter(HTTPAdapter):
+  # Keeps up to pool_size connections to the one API host alive and blocks
+  # callers beyond that instead of opening (and handshaking) throwaway
+  # connections.
+  def __init__(self, pool_size):
+    self.ssl_context = ssl_context()
+    super(PoolAdapter, self).__init__(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+
+  def init_poolmanager(self, *args, **kwargs):
+    kwargs['ssl_context'] = self.ssl_context
+    super(PoolAdapter, self).init_poolmanager(*args, **kwargs)
+
+  def build_connection_pool_key_attributes(self, request, verify, cert=None):
+    host_params, pool_kwargs = super(PoolAdapter, self).build_connection_pool_key_attributes(request, verify, cert)
+    pool_kwargs['ssl_context'] = self.ssl_context
+    return host_params, pool_kwargs
+
+def unsent(error):
+  # whether a request failed before reaching the node, which could not be
+  # connected to.
+  reason = getattr(error.args[0], 'reason', None) if error.args else None
+  return isinstance(error, requests.exceptions.ConnectTimeout) or isinstance(reason, ConnectTimeoutError)
+
+def build_session(verify_ssl=True, pool_size=1):
+  session = requests.Session()
+  session.verify = verify_ssl
+  session.mount('https://', PoolAdapter(max(1, pool_size)))
+  return session
@@ -0,0 +1,211 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from contextlib import contextmanager
+from urllib.parse import unquote
+
+from ansible.module_utils.proxmox_pve.diff import IDENTITY_TYPES, split_list, to_bool_int
+
+COLLECTIONS = ['users', 'roles', 'acl']
+
+def snapshot_path(cache_dir, api_host, api_user):
+  # what /access returns depends on the permissions of the api_user, so the
+  # snapshot is keyed by both the cluster and the user reading it.
+  key = hashlib.sha256(('%s\0%s' % (api_host, api_user)).encode('utf-8')).hexdigest()
+  return os.path.join(os.path.expanduser(cache_dir), 'snapshot-%s.json' % key)
+
+class AccessSnapshot(object):
+  # Full /access/users, /access/roles and /access/acl listings shared on
+  # disk between module runs against the same cluster.  Entries expire after
+  # `ttl` seconds and writes made through the client are applied in place,
+  # batched in memory until flush() so bulk runs rewrite the file only once.
+  def __init__(self, path, ttl):
+    self.path = path
+    self.ttl = ttl
+    self.pending = []
+
+  @contextmanager
+  def locked(self):
+    directory = os.path.dirname(self.path)
+    if not os.path.isdir(directory):
+      os.makedirs(directory, 0o700)
+    fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+      fcntl.flock(fd, fcntl.LOCK_EX)
+      yield
+    finally:
+      fcntl.flock(fd, fcntl.LOCK_UN)
+      os.close(fd)
+
+  def load(self):
+    try:
+      with open(self.path) as f:
+        return json.load(f)
+    except (IOError, OSError, ValueError):
+      return {}
+
+  def save(self, snapshot):
+    directory = os.path.dirname(self.path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+      os.fchmod(fd, 0o600)
+      with os.fdopen(fd, 'w') as f:
+        json.dump(snapshot, f)
+      os.rename(tmp_path, self.path)
+    except Exception:
+      os.unlink(tmp_path)
+      raise
+
+  def get(self, collection):
+    self.flush()
+    entry = self.load().get(collection)
+    if not entry or time.time() - entry['fetched'] >= self.ttl:
+      return None
+    return entry['data']
+
+  def put(self, collection, data):
+    with self.locked():
+      snapshot = self.load()
+      snapshot[collection] = {'fetched': time.time(), 'data': data}
+      self.save(snapshot)
+
+  def invalidate(self, collection=None):
+    with self.locked():
+      snapshot = self.load()
+      for name in ([collection] if collection else COLLECTIONS):
+        snapshot.pop(name, None)
+      self.save(snapshot)
+
+  def record_write(self, method, path, data):
+    parts = [unquote(part) for part in path.strip('/').split('/')]
+    if parts[:1] != ['access'] or parts[1:2] == ['ticket'] or parts[1:2] == ['password']:
+      return
+    self.pending.append((method, parts[1:], data or {}))
+
+  def flush(self):
+    if not self.pending:
+      return
+    pending, self.pending = self.pending, []
+    with self.locked():
+      snapshot = self.load()
+      try:
+        for method, parts, data in pending:
+          apply_write(snapshot, method, parts, data)
+      except (KeyError, ValueError):
+        # a write we cannot mirror makes every cached listing suspect.
+        snapshot = {}
+      self.save(snapshot)
+
+class MemorySnapshot(AccessSnapshot):
+  # The same listings kept in memory for as long as one client lives, e.g.
+  # for all loop items of a task run by the action plugins.
+  def __init__(self):
+    super(MemorySnapshot, self).__init__(None, float('inf'))
+    self.data = {}
+
+  @contextmanager
+  def locked(self):
+    yield
+
+  def load(self):
+    return self.data
+
+  def save(self, snapshot):
+    self.data = snapshot
+
+def apply_write(snapshot, method, parts, data):
+  collection = parts[0]
+  if len(parts) > 2:
+    # e.g. /access/users/{userid}/token/{tokenid}
+    raise KeyError('/'.join(parts))
+  if collection == 'users':
+    userid = parts[1] if len(parts) > 1 else data['userid']
+    update_entry(snapshot, 'users', 'userid', userid, method, user_fields(data))
+    if method == 'DELETE':
+      remove_user(snapshot, userid)
+  elif collection == 'roles':
+    roleid = parts[1] if len(parts) > 1 else data['roleid']
+    fields = {}
+    if 'privs' in data:
+      fields['privs'] = set(split_list(data['privs']))
+      if to_bool_int(data.get('append')) and 'roles' in snapshot:
+        current = [role for role in snapshot['roles']['data'] if role['roleid'] == roleid]
+        if current:
+          fields['privs'] |= set(split_list(current[0].get('privs')))
+      fields['privs'] = ','.join(sorted(fields['privs']))
+    update_entry(snapshot, 'roles', 'roleid', roleid, method, fields)
+    if method == 'DELETE':
+      remove_acls(snapshot, lambda acl: acl['roleid'] == roleid)
+  elif collection == 'acl':
+    if 'acl' in snapshot:
+      apply_acl_write(snapshot['acl']['data'], data)
+  elif collection == 'groups':
+    # groups themselves are not kept, but deleting one also drops it from
+    # its members and its ACL entries.
+    if method == 'DELETE' and len(parts) > 1:
+      remove_group(snapshot, parts[1])
+  else:
+    raise KeyError(collection)
+
+def remove_group(snapshot, groupid):
+  if 'users' in snapshot:
+    for user in snapshot['users']['data']:
+      groups = split_list(user.get('groups'))
+      if groupid in groups:
+        user['groups'] = ','.join(group for group in groups if group != groupid)
+  remove_acls(snapshot, lambda acl: acl['type'] == 'group' and acl['ugid'] == groupid)
+
+def remove_user(snapshot, userid):
+  # PVE drops the ACL entries of a deleted user and of its tokens with it.
+  remove_acls(snapshot, lambda acl: (acl['type'] == 'user' and acl['ugid'] == userid) or
+              (acl['type'] == 'token' and acl['ugid'].split('!', 1)[0] == userid))
+
+def remove_acls(snapshot, match):
+  if 'acl' in snapshot:
+    snapshot['acl']['data'][:] = [acl for acl in snapshot['acl']['data'] if not match(acl)]
+
+def user_fields(data):
+  fields = dict((key, value) for key, value in data.items() if key not in ('userid', 'password', 'append'))
+  if 'groups' in fields:
+    fields['groups'] = ','.join(split_list(fields['groups']))
+  if 'enable' in fields:
+    fields['enable'] = to_bool_int(fields['enable'])
+  return fields
+
+def update_entry(snapshot, collection, id_key, entity_id, method, fields):
+  if collection not in snapshot:
+    return
+  entries = snapshot[collection]['data']
+  index = [i for i, entry in enumerate(entries) if entry[id_key] == entity_id]
+  if method == 'DELETE':
+    for i in reversed(index):
+      del entries[i]
+  elif index:
+    entries[index[0]].update(fields)
+  else:
+    fields[id_key] = entity_id
+    entries.append(fields)
+
+def apply_acl_write(acls, data):
+  path = data['path']
+  propagate = 1 if data.get('propagate') is None else to_bool_int(data['propagate'])
+  delete = to_bool_int(data.get('delete'))
+  entries = set()
+  for roleid in split_list(data['roles']):
+    for identity_type, key in IDENTITY_TYPES:
+      for ugid in split_list(data.get(key)):
+        entries.add((path, roleid, identity_type, ugid))
+  acls[:] = [acl for acl in acls if (acl['path'], acl['roleid'], acl['type'], acl['ugid']) not in entries]
+  if not delete:
+    for path, roleid, identity_type, ugid in sorted(entries):
+      acls.append(dict(path=path, roleid=roleid, type=identity_type, ugid=ugid, propagate=propagate))
@@ -0,0 +1,122 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import threading
+
+from urllib.parse import unquote
+
+# upper bounds, in seconds, of the latency histogram buckets; slower calls
+# land in '+Inf'.
+LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+def endpoint_pattern(path):
+  # /access/users/alice@pve -> /access/users/{id}, so that calls are counted
+  # per endpoint rather than per entity.
+  parts = [unquote(part) for part in path.strip('/').split('/')]
+  return '/' + '/'.join('{id}' if i > 1 and i % 2 == 0 else part for i, part in enumerate(parts))
+
+def bucket_label(bound):
+  return '%g' % bound
+
+def empty_histogram():
+  histogram = dict((bucket_label(bound), 0) for bound in LATENCY_BUCKETS)
+  histogram['+Inf'] = 0
+  return histogram
+
+class APIStats(object):
+  # Counters and latency histograms per method and endpoint of the API calls
+  # a module made, returned as `api_stats` in its result.
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.endpoints = {}
+
+  def record(self, method, path, status, seconds, bytes_sent, bytes_received):
+    key = '%s %s' % (method, endpoint_pattern(path))
+    label = '+Inf'
+    for bound in LATENCY_BUCKETS:
+      if seconds <= bound:
+        label = bucket_label(bound)
+        break
+    with self.lock:
+      entry = self.endpoints.get(key)
+      if entry is None:
+        entry = self.endpoints[key] = {
+          'count': 0,
+          'errors': 0,
+          'seconds': 0.0,
+          'max_seconds': 0.0,
+          'bytes_sent': 0,
+          'bytes_received': 0,
+          'histogram': empty_histogram(),
+          'retries': 0,
+          'retry_reasons': {},
+        }
+      entry['count'] += 1
+      entry['errors'] += 1 if status is None or status >= 400 else 0
+      entry['seconds'] += seconds
+      entry['max_seconds'] = max(entry['max_seconds'], seconds)
+      entry['bytes_sent'] += bytes_sent
+      entry['bytes_received'] += bytes_received
+      entry['histogram'][label] += 1
+
+  def record_retry(self, method, path, reason):
+    # the failed attempt itself was recorded with its status.
+    key = '%s %s' % (method, endpoint_pattern(path))
+    with self.lock:
+      entry = self.endpoints.get(key)
+      if entry is not None:
+        entry['retries'] += 1
+        entry['retry_reasons'][reason] = entry['retry_reasons'].get(reason, 0) + 1
+
+  def as_dict(self):
+    with self.lock:
+      endpoints = dict((key, dict(entry, histogram=dict(entry['histogram']), retry_reasons=dict(entry['retry_reasons'])))
+                       for key, entry in self.endpoints.items())
+    totals = dict(
+      (field, sum(entry[field] for entry in endpoints.values()))
+      for field in ['count', 'errors', 'retries', 'seconds', 'bytes_sent', 'bytes_received']
+    )
+    for entry in endpoints.values():
+      entry['seconds'] = round(entry['seconds'], 6)
+      entry['max_seconds'] = round(entry['max_seconds'], 6)
+    return {
+      'requests': totals['count'],
+      'errors': totals['errors'],
+      'retries': totals['retries'],
+      'seconds': round(totals['seconds'], 6),
+      'bytes_sent': totals['bytes_sent'],
+      'bytes_received': totals['bytes_received'],
+      'buckets': [bucket_label(bound) for bound in LATENCY_BUCKETS] + ['+Inf'],
+      'endpoints': endpoints,
+    }
+
+def merge_api_stats(stats):
+  # the sum of several as_dict() results, e.g. those of several clusters.
+  endpoints = {}
+  for entry_stats in stats:
+    for key, entry in entry_stats['endpoints'].items():
+      total = endpoints.get(key)
+      if total is None:
+        endpoints[key] = dict(entry, histogram=dict(entry['histogram']), retry_reasons=dict(entry['retry_reasons']))
+        continue
+      for field in ['count', 'errors', 'retries', 'seconds', 'bytes_sent', 'bytes_received']:
+        total[field] += entry[field]
+      total['seconds'] = round(total['seconds'], 6)
+      total['max_seconds'] = max(total['max_seconds'], entry['max_seconds'])
+      for label, count in entry['histogram'].items():
+        total['histogram'][label] += count
+      for reason, count in entry['retry_reasons'].items():
+        total['retry_reasons'][reason] = total['retry_reasons'].get(reason, 0) + count
+  return {
+    'requests': sum(entry_stats['requests'] for entry_stats in stats),
+    'errors': sum(entry_stats['errors'] for entry_stats in stats),
+    'retries': sum(entry_stats['retries'] for entry_stats in stats),
+    'seconds': round(sum(entry_stats['seconds'] for entry_stats in stats), 6),
+    'bytes_sent': sum(entry_stats['bytes_sent'] for entry_stats in stats),
+    'bytes_received': sum(entry_stats['bytes_received'] for entry_stats in stats),
+    'buckets': [bucket_label(bound) for bound in LATENCY_BUCKETS] + ['+Inf'],
+    'endpoints': endpoints,
+  }
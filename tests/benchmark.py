@@ -0,0 +1,233 @@
+'''End-to-end benchmark of the modules against the fake PVE API.
+
+Starts tests/fake_pve.py seeded with 10, 1000 and 10000 users, roles and ACL
+entries and, for each size, runs proxmox_pve_user, proxmox_pve_role,
+proxmox_pve_acl and proxmox_pve_user_password through ansible-playbook.
+For every module run it records the wall time, the number of API requests
+and the bytes sent and received, so that performance regressions show up
+without a real cluster.  The modules run through the role's action plugins
+unless --modules-only is given::
+
+  python tests/benchmark.py --sizes 10,1000 --tasks 10 --latency 0.02
+
+ansible-playbook must be on the PATH (or given with --ansible-playbook) and
+the python running this script needs requests, as it also runs the modules.
+
+With --startup RUNS it instead imports every module of library/ in RUNS
+fresh interpreters, the part of every module run spent before the first API
+request, and reports the median time and the HTTP libraries it loaded::
+
+  python tests/benchmark.py --startup 20
+'''
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_pve import FakePVEServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# libraries a module only needs once it sends its first request.
+HEAVY_IMPORTS = ['requests', 'urllib3', 'aiohttp', 'asyncio', 'multiprocessing.pool']
+
+STARTUP_SCRIPT = '''
+import importlib.util, json, sys, time
+start = time.time()
+import ansible.module_utils
+ansible.module_utils.__path__.append(sys.argv[2])
+spec = importlib.util.spec_from_file_location("module", sys.argv[1])
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+print(json.dumps([time.time() - start, [name for name in json.loads(sys.argv[3]) if name in sys.modules]]))
+'''
+
+MODULE_TASKS = [
+  ('proxmox_pve_user', {
+    'userid': 'bench{{ item }}@pve',
+    'comment': 'benchmark user {{ item }}',
+    'email': 'bench{{ item }}@example.com',
+  }),
+  ('proxmox_pve_role', {
+    'roleid': 'Bench{{ item }}',
+    'privs': ['VM.Audit', 'VM.Console'],
+  }),
+  ('proxmox_pve_acl', {
+    'path': '/bench/{{ item }}',
+    'roleid': 'PVEVMUser',
+    'users': ['bench{{ item }}@pve'],
+  }),
+  ('proxmox_pve_user_password', {
+    'userid': 'bench{{ item }}@pve',
+    'password': 'benchmark{{ item }}',
+  }),
+]
+
+def make_certificate(directory):
+  # Create a self-signed certificate for 127.0.0.1 with openssl.
+  certfile = os.path.join(directory, 'cert.pem')
+  keyfile = os.path.join(directory, 'key.pem')
+  subprocess.check_call(
+    [
+      'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+      '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+      '-keyout', keyfile, '-out', certfile,
+    ],
+    stdout=subprocess.DEVNULL,
+    stderr=subprocess.DEVNULL,
+  )
+  return certfile, keyfile
+
+def write_playbook(directory, module, arguments, api_host, tasks):
+  # Write a playbook running `module` once per task item; return its path.
+  task_args = dict(
+    api_host=api_host,
+    api_user='root@pam',
+    api_password='root',
+    api_ticket_cache_dir=os.path.join(directory, 'cache'),
+  )
+  task_args.update(arguments)
+  playbook = [{
+    'hosts': 'localhost',
+    'connection': 'local',
+    'gather_facts': False,
+    'tasks': [{'name': module, module: task_args, 'loop': list(range(tasks))}],
+  }]
+  path = os.path.join(directory, '%s.yml' % module)
+  with open(path, 'w') as f:
+    json.dump(playbook, f, indent=2)
+  return path
+
+def run_module(server, directory, ansible_playbook, certfile, module, arguments, tasks, action_plugins=True):
+  # Run one module over `tasks` items and measure it.
+  playbook = write_playbook(directory, module, arguments, server.api_host, tasks)
+  env = dict(
+    os.environ,
+    ANSIBLE_LIBRARY=os.path.join(ROOT, 'library'),
+    ANSIBLE_MODULE_UTILS=os.path.join(ROOT, 'module_utils'),
+    ANSIBLE_LOCALHOST_WARNING='False',
+    ANSIBLE_INVENTORY_UNPARSED_WARNING='False',
+    REQUESTS_CA_BUNDLE=certfile,
+  )
+  if action_plugins:
+    env['ANSIBLE_ACTION_PLUGINS'] = os.path.join(ROOT, 'action_plugins')
+  server.api.reset_stats()
+  # the modules' shebang asks for python3, which ansible resolves through
+  # ansible_python3_interpreter.
+  interpreter = json.dumps(dict(ansible_python_interpreter=sys.executable, ansible_python3_interpreter=sys.executable))
+  start = time.time()
+  process = subprocess.Popen(
+    [ansible_playbook, '-i', 'localhost,', '-e', interpreter, playbook],
+    stdout=subprocess.PIPE,
+    stderr=subprocess.STDOUT,
+    env=env,
+  )
+  output = process.communicate()[0].decode('utf-8', 'replace')
+  wall_time = time.time() - start
+  stats = server.api.snapshot_stats()
+  return {
+    'module': module,
+    'tasks': tasks,
+    'ok': process.returncode == 0,
+    'wall_time': round(wall_time, 3),
+    'requests': stats['requests'],
+    'bytes_in': stats['bytes_in'],
+    'bytes_out': stats['bytes_out'],
+    'endpoints': stats['endpoints'],
+    'output': None if process.returncode == 0 else output[-2000:],
+  }
+
+def measure_startup(path, runs):
+  # Import the module at `path` in `runs` fresh interpreters and measure it.
+  times = []
+  loaded = []
+  for _ in range(runs):
+    output = subprocess.check_output([
+      sys.executable, '-c', STARTUP_SCRIPT, path, os.path.join(ROOT, 'module_utils'), json.dumps(HEAVY_IMPORTS)])
+    seconds, loaded = json.loads(output.decode('utf-8'))
+    times.append(seconds)
+  times.sort()
+  return {
+    'module': os.path.splitext(os.path.basename(path))[0],
+    'runs': runs,
+    'import_ms': round(times[len(times) // 2] * 1000, 1),
+    'loaded': loaded,
+  }
+
+def run_startup(runs):
+  # Print the import time of every module; return the results.
+  library = os.path.join(ROOT, 'library')
+  results = []
+  print('%-30s %10s  %s' % ('module', 'import ms', 'loaded'))
+  for name in sorted(os.listdir(library)):
+    if not name.endswith('.py'):
+      continue
+    result = measure_startup(os.path.join(library, name), runs)
+    results.append(result)
+    print('%-30s %10.1f  %s' % (result['module'], result['import_ms'], ', '.join(result['loaded']) or '-'))
+  return results
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+  parser.add_argument('--sizes', default='10,1000,10000', help='comma separated dataset sizes')
+  parser.add_argument('--tasks', type=int, default=10, help='items each module is run for')
+  parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+  parser.add_argument('--write-time', type=float, default=0.0,
+                      help='seconds every write holds the fake cluster filesystem lock')
+  parser.add_argument('--lock-timeout', type=float, default=10.0,
+                      help='seconds a write waits for that lock before failing')
+  parser.add_argument('--modules', default=','.join(module for module, arguments in MODULE_TASKS))
+  parser.add_argument('--ansible-playbook', default=shutil.which('ansible-playbook') or 'ansible-playbook')
+  parser.add_argument('--modules-only', action='store_true', help='run the modules without their action plugins')
+  parser.add_argument('--startup', type=int, metavar='RUNS',
+                      help='only measure how long importing every module takes, over RUNS imports')
+  parser.add_argument('--output', help='also write the results as JSON to this file')
+  args = parser.parse_args()
+
+  if args.startup:
+    results = run_startup(args.startup)
+    if args.output:
+      with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    return 0
+
+  modules = args.modules.split(',')
+  results = []
+  directory = tempfile.mkdtemp(prefix='proxmox-pve-bench-')
+  try:
+    certfile, keyfile = make_certificate(directory)
+    print('%8s  %-26s %6s %9s %9s %11s %11s' % (
+      'entities', 'module', 'tasks', 'wall s', 'requests', 'bytes in', 'bytes out'))
+    for size in [int(size) for size in args.sizes.split(',')]:
+      server = FakePVEServer(certfile, keyfile, entities=size, latency=args.latency,
+                             write_time=args.write_time, lock_timeout=args.lock_timeout).start()
+      try:
+        for module, arguments in MODULE_TASKS:
+          if module not in modules:
+            continue
+          result = run_module(server, directory, args.ansible_playbook, certfile, module, arguments, args.tasks,
+                              action_plugins=not args.modules_only)
+          result['entities'] = size
+          results.append(result)
+          print('%8d  %-26s %6d %9.2f %9d %11d %11d%s' % (
+            size, module, result['tasks'], result['wall_time'], result['requests'],
+            result['bytes_in'], result['bytes_out'], '' if result['ok'] else '  FAILED'))
+          if not result['ok']:
+            print(result['output'], file=sys.stderr)
+      finally:
+        server.stop()
+  finally:
+    shutil.rmtree(directory)
+
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(results, f, indent=2)
+  return 0 if all(result['ok'] for result in results) else 1
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,128 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# Makes module_utils/ importable as ansible.module_utils, the way ansible
+# ships it with the modules, and serves the fake PVE API to the tests that
+# need a cluster.  The tests skip themselves without ansible.
+
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+  import ansible.module_utils
+except ImportError:
+  pass
+else:
+  ansible.module_utils.__path__.append(os.path.join(ROOT, 'module_utils'))
+
+LIBRARY = {}
+
+@pytest.fixture(scope='session')
+def library():
+  # library(name) loads library/name.py, once per session.
+  def load(name):
+    if name not in LIBRARY:
+      spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, 'library', name + '.py'))
+      LIBRARY[name] = importlib.util.module_from_spec(spec)
+      spec.loader.exec_module(LIBRARY[name])
+    return LIBRARY[name]
+  return load
+
+@pytest.fixture
+def run_module(library, capsys, monkeypatch):
+  # run_module(name, args) runs library/name.py's main() with args and
+  # returns the result it exits with.
+  from ansible.module_utils import basic
+  from ansible.module_utils.common.text.converters import to_bytes
+
+  def run(name, args):
+    monkeypatch.setattr(basic, '_ANSIBLE_ARGS', to_bytes(json.dumps({'ANSIBLE_MODULE_ARGS': args})))
+    monkeypatch.setattr(basic, '_ANSIBLE_PROFILE', 'legacy', raising=False)
+    with pytest.raises(SystemExit):
+      library(name).main()
+    return json.loads(capsys.readouterr().out)
+  return run
+
+@pytest.fixture(scope='session')
+def certificate(tmp_path_factory):
+  # (certfile, keyfile) of a self-signed certificate for 127.0.0.1.
+  if shutil.which('openssl') is None:
+    pytest.skip('openssl is needed for the fake PVE API')
+  from benchmark import make_certificate
+  return make_certificate(str(tmp_path_factory.mktemp('cert')))
+
+@pytest.fixture
+def fake_pve(certificate):
+  # a fresh fake PVE API, with only root@pam, on a free port.
+  from fake_pve import FakePVEServer
+  server = FakePVEServer(*certificate).start()
+  yield server
+  server.stop()
+
+@pytest.fixture
+def proxmox(fake_pve, tmp_path):
+  # a client of fake_pve logged in as root@pam.
+  pytest.importorskip('requests')
+  from ansible.module_utils.proxmox_pve.auth import connect
+  return connect(fake_pve.api_host, 'root@pam', verify_ssl=False, password='root', ticket_cache_dir=str(tmp_path))
+
+@pytest.fixture
+def playbook(fake_pve, certificate, tmp_path):
+  # playbook(tasks, action_plugins=True, check=False, diff=False) runs the
+  # tasks against fake_pve with ansible-playbook, each with the api_* options
+  # of root@pam, and returns their registered results.
+  ansible_playbook = os.path.join(os.path.dirname(sys.executable), 'ansible-playbook')
+  if not os.path.exists(ansible_playbook):
+    pytest.skip('ansible-playbook is needed next to the python running the tests')
+  api = dict(api_host=fake_pve.api_host, api_user='root@pam', api_password='root',
+             api_ticket_cache_dir=str(tmp_path / 'cache'))
+
+  def run(tasks, action_plugins=True, check=False, diff=False):
+    results = str(tmp_path / 'results.json')
+    plays = [{'hosts': 'localhost', 'connection': 'local', 'gather_facts': False, 'tasks': []}]
+    for i, task in enumerate(tasks):
+      task = dict(task)
+      module = [key for key in task if key.startswith('proxmox_pve_')][0]
+      task[module] = dict(api, **task[module])
+      task['register'] = 'result%d' % i
+      task['ignore_errors'] = True
+      plays[0]['tasks'].append(task)
+    plays[0]['tasks'].append({
+      'copy': {'dest': results, 'content': '{{ [%s] | to_json }}' % ', '.join('result%d' % i for i in range(len(tasks)))},
+      'check_mode': False,
+      'diff': False,
+    })
+    path = str(tmp_path / 'playbook.yml')
+    with open(path, 'w') as f:
+      json.dump(plays, f)
+    env = dict(
+      os.environ,
+      ANSIBLE_LIBRARY=os.path.join(ROOT, 'library'),
+      ANSIBLE_MODULE_UTILS=os.path.join(ROOT, 'module_utils'),
+      ANSIBLE_LOCALHOST_WARNING='False',
+      ANSIBLE_INVENTORY_UNPARSED_WARNING='False',
+      REQUESTS_CA_BUNDLE=certificate[0],
+    )
+    if action_plugins:
+      env['ANSIBLE_ACTION_PLUGINS'] = os.path.join(ROOT, 'action_plugins')
+    interpreter = json.dumps(dict(ansible_python_interpreter=sys.executable, ansible_python3_interpreter=sys.executable))
+    command = [ansible_playbook, '-i', 'localhost,', '-e', interpreter, path]
+    if check:
+      command.append('--check')
+    if diff:
+      command.append('--diff')
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env)
+    assert process.returncode == 0, process.stdout.decode('utf-8', 'replace')
+    with open(results) as f:
+      return json.load(f)
+  return run
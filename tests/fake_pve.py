@@ -0,0 +1,611 @@
+'''Local stand-in for the Proxmox VE ``/access`` API.
+
+Implements the endpoints the modules use -- ``/access/ticket``,
+``/access/users``, ``/access/roles``, ``/access/acl``, ``/access/password``,
+plus the ``/access/groups`` and ``/access/domains`` listings -- with the
+answers and error messages of pveproxy, so that the modules can be run and
+measured without a cluster.  Every request can be delayed by a fixed latency
+and the server can be seeded with any number of users, roles and ACL
+entries.  With a write time, writes take turns on a stand-in for the cluster
+filesystem lock and are turned away with pveproxy's cfs-lock error when they
+wait for it longer than the lock timeout, as concurrent writers are on a
+busy cluster.
+
+Several nodes of one cluster can be served on consecutive loopback
+addresses, sharing their state and tickets and listed by
+``/cluster/status``, each with a latency of its own.  ``POST /__stop`` on a
+node makes it stop answering, as a node that goes down in the middle of a
+run.
+
+``GET /__stats`` returns the number of requests (overall and per endpoint)
+and the bytes received and sent since start or the last ``POST /__reset``.
+
+Run it on its own with::
+
+  python tests/fake_pve.py --port 8006 --certfile cert.pem --keyfile key.pem \\
+    --entities 1000 --latency 0.02 --write-time 0.01 --lock-timeout 0.05
+
+or as a three node cluster on 127.0.0.1 to 127.0.0.3 with::
+
+  python tests/fake_pve.py --port 8006 --certfile cert.pem --keyfile key.pem \\
+    --nodes 3 --node-latency 0.2,0.01,0.05
+'''
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import itertools
+import json
+import re
+import socket
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, unquote, urlparse
+
+API_PREFIX = '/api2/json'
+TICKET_LIFETIME = 7200
+CSRF_TOKEN = 'fake-csrf-token'
+
+PRIVILEGES = [
+  'Datastore.Allocate', 'Datastore.AllocateSpace', 'Datastore.AllocateTemplate',
+  'Datastore.Audit', 'Group.Allocate', 'Permissions.Modify', 'Pool.Allocate',
+  'Pool.Audit', 'Realm.Allocate', 'Realm.AllocateUser', 'SDN.Allocate',
+  'SDN.Audit', 'SDN.Use', 'Sys.Audit', 'Sys.Console', 'Sys.Incoming',
+  'Sys.Modify', 'Sys.PowerMgmt', 'Sys.Syslog', 'User.Modify', 'VM.Allocate',
+  'VM.Audit', 'VM.Backup', 'VM.Clone', 'VM.Config.CDROM', 'VM.Config.CPU',
+  'VM.Config.Cloudinit', 'VM.Config.Disk', 'VM.Config.HWType',
+  'VM.Config.Memory', 'VM.Config.Network', 'VM.Config.Options', 'VM.Console',
+  'VM.Migrate', 'VM.Monitor', 'VM.PowerMgmt', 'VM.Snapshot',
+  'VM.Snapshot.Rollback',
+]
+
+BUILTIN_ROLES = {
+  'Administrator': set(PRIVILEGES),
+  'NoAccess': set(),
+  'PVEAuditor': set(p for p in PRIVILEGES if p.endswith('.Audit')),
+  'PVEVMUser': {'VM.Audit', 'VM.Console', 'VM.Backup', 'VM.Config.CDROM',
+                'VM.Config.Cloudinit', 'VM.PowerMgmt', 'Datastore.AllocateSpace',
+                'Datastore.Audit'},
+}
+
+USER_FIELDS = ['comment', 'email', 'firstname', 'lastname', 'keys']
+IDENTITY_TYPES = [('user', 'users'), ('group', 'groups'), ('token', 'tokens')]
+
+class APIError(Exception):
+  # An error answer of the API: HTTP status and reason phrase.
+  def __init__(self, status, reason):
+    super(APIError, self).__init__(reason)
+    self.status = status
+    self.reason = reason
+
+def split_list(values):
+  # Split repeated and comma, semicolon or space separated parameters.
+  result = []
+  for value in values or []:
+    result.extend(item for item in re.split(r'[,;\s]+', value) if item)
+  return result
+
+def to_bool(value):
+  # Parse a PVE boolean parameter.
+  return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+class AccessState(object):
+  # Users, roles, groups, ACLs and credentials of the fake cluster.
+  def __init__(self, root_password='root'):
+    self.lock = threading.RLock()
+    self.domains = {'pam': 'pam', 'pve': 'pve'}
+    self.users = {}
+    self.roles = dict((roleid, set(privs)) for roleid, privs in BUILTIN_ROLES.items())
+    self.groups = {}
+    self.acl = {}
+    self.tokens = {}
+    self.passwords = {}
+    self.add_user('root@pam', comment='superuser')
+    self.passwords['root@pam'] = root_password
+
+  def seed(self, entities):
+    # Add `entities` users, roles and ACL entries, and a few groups.
+    for i in range(max(1, entities // 100)):
+      self.groups['group%d' % i] = {'comment': 'seeded group %d' % i}
+    for i in range(entities):
+      userid = 'user%d@pve' % i
+      self.add_user(
+        userid,
+        comment='seeded user %d' % i,
+        email='user%d@example.com' % i,
+        groups=['group%d' % (i % len(self.groups))],
+      )
+      self.passwords[userid] = 'password%d' % i
+      roleid = 'Role%d' % i
+      self.roles[roleid] = {PRIVILEGES[i % len(PRIVILEGES)], 'VM.Audit'}
+      self.acl[('/vms/%d' % i, roleid, 'user', userid)] = 1
+
+  def add_user(self, userid, **fields):
+    user = {'userid': userid, 'enable': 1, 'expire': 0, 'groups': []}
+    user.update(fields)
+    self.users[userid] = user
+    return user
+
+class FakePVE(object):
+  # Dispatches API requests against an AccessState and counts them.
+  def __init__(self, state=None, latency=0.0, write_time=0.0, lock_timeout=10.0):
+    self.state = state or AccessState()
+    self.latency = latency
+    self.write_time = write_time
+    self.lock_timeout = lock_timeout
+    self.cfs_lock = threading.Lock()
+    self.tickets = {}
+    self.issued = itertools.count()
+    self.nodes = []
+    self.stats_lock = threading.Lock()
+    self.reset_stats()
+
+  def reset_stats(self):
+    with self.stats_lock:
+      self.stats = {'requests': 0, 'bytes_in': 0, 'bytes_out': 0, 'endpoints': {}}
+
+  def count(self, method, endpoint, bytes_in, bytes_out):
+    with self.stats_lock:
+      self.stats['requests'] += 1
+      self.stats['bytes_in'] += bytes_in
+      self.stats['bytes_out'] += bytes_out
+      key = '%s %s' % (method, endpoint)
+      self.stats['endpoints'][key] = self.stats['endpoints'].get(key, 0) + 1
+
+  def snapshot_stats(self):
+    with self.stats_lock:
+      return json.loads(json.dumps(self.stats))
+
+  # authentication
+
+  def issue_ticket(self, username):
+    ticket = 'PVE:%s:%08X::%d' % (username, int(time.time()), next(self.issued))
+    self.tickets[ticket] = (username, time.time())
+    return ticket
+
+  def valid_ticket(self, ticket, username=None):
+    entry = self.tickets.get(ticket)
+    if entry is None or time.time() - entry[1] >= TICKET_LIFETIME:
+      return False
+    return username is None or entry[0] == username
+
+  def authenticate(self, method, headers, cookies):
+    authorization = headers.get('Authorization') or ''
+    if authorization.startswith('PVEAPIToken='):
+      match = re.match(r'^PVEAPIToken=([^!]+)!([^=]+)=(.+)$', authorization)
+      if match and self.state.tokens.get((match.group(1), match.group(2))) == match.group(3):
+        return
+      raise APIError(401, 'invalid token value')
+    if not self.valid_ticket(cookies.get('PVEAuthCookie')):
+      raise APIError(401, 'No ticket')
+    if method != 'GET' and headers.get('CSRFPreventionToken') != CSRF_TOKEN:
+      raise APIError(401, 'Permission check failed (invalid csrf token)')
+
+  def ticket(self, params):
+    username, password = params.get('username'), params.get('password')
+    with self.state.lock:
+      known = self.state.passwords.get(username)
+    if not username or (password != known and not self.valid_ticket(password, username)):
+      raise APIError(401, 'authentication failure')
+    return {'username': username, 'ticket': self.issue_ticket(username), 'CSRFPreventionToken': CSRF_TOKEN}
+
+  # dispatch
+
+  def handle(self, method, path, params, headers, cookies):
+    # Return (endpoint, data) for a request or raise APIError.
+    if self.latency:
+      time.sleep(self.latency)
+    if not path.startswith(API_PREFIX + '/'):
+      raise APIError(404, 'Not Found')
+    parts = [unquote(part) for part in path[len(API_PREFIX) + 1:].split('/')]
+    if method == 'GET' and parts in (['version'], ['cluster', 'status']):
+      self.authenticate(method, headers, cookies)
+      if parts == ['version']:
+        return '/version', {'version': '8.2.2', 'release': '8.2', 'repoid': 'fake'}
+      return '/cluster/status', self.cluster_status()
+    if parts[0] != 'access' or len(parts) > 3:
+      raise APIError(501, "Method '%s %s' not implemented" % (method, path[len(API_PREFIX):]))
+    collection = parts[1] if len(parts) > 1 else ''
+    entity_id = parts[2] if len(parts) > 2 else None
+    endpoint = '/access/%s' % collection + ('/{id}' if entity_id is not None else '')
+
+    if collection == 'ticket' and method == 'POST':
+      return endpoint, self.ticket(params)
+    self.authenticate(method, headers, cookies)
+
+    handler = getattr(self, '%s_%s%s' % (method.lower(), collection, '_id' if entity_id is not None else ''), None)
+    if handler is None:
+      raise APIError(501, "Method '%s %s' not implemented" % (method, endpoint))
+    if method == 'GET' or not self.write_time:
+      return endpoint, self.apply(handler, entity_id, params)
+    if not self.cfs_lock.acquire(True, self.lock_timeout):
+      raise APIError(500, "cfs-lock 'file-user_cfg' error: got lock request timeout")
+    try:
+      time.sleep(self.write_time)
+      return endpoint, self.apply(handler, entity_id, params)
+    finally:
+      self.cfs_lock.release()
+
+  def apply(self, handler, entity_id, params):
+    with self.state.lock:
+      if entity_id is not None:
+        return handler(entity_id, params)
+      return handler(params)
+
+  def cluster_status(self):
+    status = [{'type': 'cluster', 'id': 'cluster', 'name': 'fake', 'nodes': len(self.nodes), 'quorate': 1}]
+    for index, node in enumerate(self.nodes):
+      ip = node.server_address[0]
+      status.append({'type': 'node', 'id': 'node/pve%d' % (index + 1), 'name': 'pve%d' % (index + 1),
+                     'ip': ip, 'online': 0 if node.stopped else 1, 'local': 1 if index == 0 else 0})
+    return status
+
+  # /access/domains and /access/groups
+
+  def get_domains(self, params):
+    return [{'realm': realm, 'type': realm_type} for realm, realm_type in sorted(self.state.domains.items())]
+
+  def get_groups(self, params):
+    return [
+      {'groupid': groupid, 'comment': group.get('comment', ''), 'users': ','.join(self.group_members(groupid))}
+      for groupid, group in sorted(self.state.groups.items())
+    ]
+
+  def get_groups_id(self, groupid, params):
+    if groupid not in self.state.groups:
+      raise APIError(500, "group '%s' does not exist" % groupid)
+    return {'comment': self.state.groups[groupid].get('comment', ''), 'members': self.group_members(groupid)}
+
+  def post_groups(self, params):
+    groupid = params.get('groupid')
+    if groupid in self.state.groups:
+      raise APIError(500, "create group failed: group '%s' already exists" % groupid)
+    self.state.groups[groupid] = {'comment': params.get('comment', '')}
+
+  def put_groups_id(self, groupid, params):
+    self.get_groups_id(groupid, params)
+    if 'comment' in params:
+      self.state.groups[groupid]['comment'] = params['comment']
+
+  def delete_groups_id(self, groupid, params):
+    self.get_groups_id(groupid, params)
+    del self.state.groups[groupid]
+    for user in self.state.users.values():
+      if groupid in user['groups']:
+        user['groups'].remove(groupid)
+    self.drop_acl('group', groupid)
+
+  def group_members(self, groupid):
+    return sorted(userid for userid, user in self.state.users.items() if groupid in user['groups'])
+
+  # /access/users
+
+  def get_users(self, params):
+    users = []
+    for userid in sorted(self.state.users):
+      user = dict(self.state.users[userid])
+      user['groups'] = ','.join(user['groups'])
+      if to_bool(params.get('full', 0)):
+        user['tokens'] = [{'tokenid': tokenid} for uid, tokenid in sorted(self.state.tokens) if uid == userid]
+      users.append(user)
+    return users
+
+  def get_users_id(self, userid, params):
+    if userid not in self.state.users:
+      raise APIError(500, "no such user ('%s')" % userid)
+    user = dict(self.state.users[userid])
+    del user['userid']
+    return user
+
+  def post_users(self, params):
+    userid = params.get('userid') or ''
+    if '@' not in userid or userid.split('@', 1)[1] not in self.state.domains:
+      raise APIError(400, 'Parameter verification failed.')
+    if userid in self.state.users:
+      raise APIError(500, "create user failed: user '%s' already exists" % userid)
+    user = self.state.add_user(userid)
+    self.update_user(user, params)
+    if params.get('password'):
+      self.state.passwords[userid] = params['password']
+
+  def put_users_id(self, userid, params):
+    self.get_users_id(userid, params)
+    self.update_user(self.state.users[userid], params)
+
+  def delete_users_id(self, userid, params):
+    self.get_users_id(userid, params)
+    del self.state.users[userid]
+    self.state.passwords.pop(userid, None)
+    self.drop_acl('user', userid)
+    for uid, tokenid in list(self.state.tokens):
+      if uid == userid:
+        del self.state.tokens[(uid, tokenid)]
+        self.drop_acl('token', '%s!%s' % (uid, tokenid))
+
+  def update_user(self, user, params):
+    for key in USER_FIELDS:
+      if key in params:
+        user[key] = params[key]
+    if 'enable' in params:
+      user['enable'] = 1 if to_bool(params['enable']) else 0
+    if 'expire' in params:
+      user['expire'] = int(params['expire'] or 0)
+    if 'groups' in params:
+      groups = split_list([params['groups']])
+      for groupid in groups:
+        if groupid not in self.state.groups:
+          raise APIError(500, "group '%s' does not exist" % groupid)
+      if to_bool(params.get('append', 0)):
+        groups = user['groups'] + [g for g in groups if g not in user['groups']]
+      user['groups'] = groups
+
+  # /access/roles
+
+  def get_roles(self, params):
+    return [
+      {'roleid': roleid, 'privs': ','.join(sorted(privs)), 'special': 1 if roleid in BUILTIN_ROLES else 0}
+      for roleid, privs in sorted(self.state.roles.items())
+    ]
+
+  def get_roles_id(self, roleid, params):
+    if roleid not in self.state.roles:
+      raise APIError(500, "role '%s' does not exist" % roleid)
+    return dict((priv, 1) for priv in self.state.roles[roleid])
+
+  def post_roles(self, params):
+    roleid = params.get('roleid') or ''
+    if not re.match(r'^[A-Za-z0-9.\-_]+$', roleid):
+      raise APIError(400, 'Parameter verification failed.')
+    if roleid in self.state.roles:
+      raise APIError(500, "role '%s' already exists" % roleid)
+    self.state.roles[roleid] = self.parse_privs(params)
+
+  def put_roles_id(self, roleid, params):
+    self.get_roles_id(roleid, params)
+    if roleid in BUILTIN_ROLES:
+      raise APIError(500, "cannot modify built-in role '%s'" % roleid)
+    privs = self.parse_privs(params)
+    if to_bool(params.get('append', 0)):
+      privs |= self.state.roles[roleid]
+    self.state.roles[roleid] = privs
+
+  def delete_roles_id(self, roleid, params):
+    self.get_roles_id(roleid, params)
+    if roleid in BUILTIN_ROLES:
+      raise APIError(500, "cannot delete built-in role '%s'" % roleid)
+    del self.state.roles[roleid]
+    self.state.acl = dict((key, value) for key, value in self.state.acl.items() if key[1] != roleid)
+
+  def parse_privs(self, params):
+    privs = set(split_list([params.get('privs', '')]))
+    for priv in privs:
+      if priv not in PRIVILEGES:
+        raise APIError(400, "invalid privilege '%s'" % priv)
+    return privs
+
+  # /access/acl
+
+  def get_acl(self, params):
+    return [
+      {'path': path, 'roleid': roleid, 'type': identity_type, 'ugid': ugid, 'propagate': propagate}
+      for (path, roleid, identity_type, ugid), propagate in sorted(self.state.acl.items())
+    ]
+
+  def put_acl(self, params):
+    path = params.get('path') or ''
+    if not path.startswith('/'):
+      raise APIError(400, 'Parameter verification failed.')
+    delete = to_bool(params.get('delete', 0))
+    propagate = 1 if to_bool(params.get('propagate', 1)) else 0
+    roles = split_list([params.get('roles', '')])
+    entries = []
+    for roleid in roles:
+      if roleid not in self.state.roles:
+        raise APIError(500, "role '%s' does not exist" % roleid)
+      for identity_type, key in IDENTITY_TYPES:
+        for ugid in split_list([params.get(key, '')]):
+          if not delete:
+            self.check_identity(identity_type, ugid)
+          entries.append((path, roleid, identity_type, ugid))
+    for entry in entries:
+      if delete:
+        self.state.acl.pop(entry, None)
+      else:
+        self.state.acl[entry] = propagate
+
+  def check_identity(self, identity_type, ugid):
+    if identity_type == 'user' and ugid not in self.state.users:
+      raise APIError(500, "user '%s' does not exist" % ugid)
+    if identity_type == 'group' and ugid not in self.state.groups:
+      raise APIError(500, "group '%s' does not exist" % ugid)
+    if identity_type == 'token' and tuple(ugid.split('!', 1)) not in self.state.tokens:
+      raise APIError(500, "no such token '%s'" % ugid)
+
+  def drop_acl(self, identity_type, ugid):
+    self.state.acl = dict((key, value) for key, value in self.state.acl.items() if key[2:] != (identity_type, ugid))
+
+  # /access/password
+
+  def put_password(self, params):
+    userid = params.get('userid')
+    if userid not in self.state.users:
+      raise APIError(500, "no such user ('%s')" % userid)
+    if not params.get('password') or len(params['password']) < 5:
+      raise APIError(400, 'Parameter verification failed.')
+    self.state.passwords[userid] = params['password']
+
+class RequestHandler(BaseHTTPRequestHandler):
+  # Translates HTTP requests into FakePVE.handle calls.
+  protocol_version = 'HTTP/1.1'
+  disable_nagle_algorithm = True
+
+  def log_message(self, format, *args):
+    pass
+
+  def send_json(self, status, reason, data):
+    self.send_body(status, reason, json.dumps({'data': data}).encode('utf-8'))
+
+  def send_body(self, status, reason, body):
+    self.send_response(status, reason)
+    self.send_header('Content-Type', 'application/json;charset=UTF-8')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def dispatch(self, method):
+    api = self.server.api
+    url = urlparse(self.path)
+    length = int(self.headers.get('Content-Length') or 0)
+    raw = self.rfile.read(length).decode('utf-8') if length else ''
+    if self.server.stopped:
+      # a node that went down: connections are dropped unanswered.
+      self.close_connection = True
+      return
+    if self.server.latency:
+      time.sleep(self.server.latency)
+
+    if url.path == '/__stats':
+      self.send_json(200, None, api.snapshot_stats())
+      return
+    if url.path == '/__reset':
+      api.reset_stats()
+      self.send_json(200, None, None)
+      return
+    if url.path == '/__stop':
+      self.send_json(200, None, None)
+      self.server.stopped = True
+      threading.Thread(target=self.server.stop).start()
+      return
+
+    params = dict((key, values[-1]) for key, values in parse_qs(url.query, keep_blank_values=True).items())
+    if raw.startswith('{'):
+      params.update((key, str(value)) for key, value in json.loads(raw).items())
+    elif raw:
+      params.update((key, values[-1]) for key, values in parse_qs(raw, keep_blank_values=True).items())
+    cookies = dict(
+      cookie.strip().split('=', 1) for cookie in (self.headers.get('Cookie') or '').split(';') if '=' in cookie
+    )
+    cookies = dict((key, unquote(value)) for key, value in cookies.items())
+
+    endpoint = url.path[len(API_PREFIX):]
+    status, reason = 200, None
+    try:
+      endpoint, data = api.handle(method, url.path, params, self.headers, cookies)
+    except APIError as e:
+      status, reason, data = e.status, e.reason, None
+    # counted before answering, so that a client never sees a response its
+    # request is not counted for yet.
+    body = json.dumps({'data': data}).encode('utf-8')
+    api.count(method, endpoint, length, len(body))
+    self.send_body(status, reason, body)
+
+  def do_GET(self):
+    self.dispatch('GET')
+
+  def do_POST(self):
+    self.dispatch('POST')
+
+  def do_PUT(self):
+    self.dispatch('PUT')
+
+  def do_DELETE(self):
+    self.dispatch('DELETE')
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+  daemon_threads = True
+  allow_reuse_address = True
+  stopped = False
+  latency = 0.0
+
+  def process_request(self, request, client_address):
+    self.connections.add(request)
+    ThreadingMixIn.process_request(self, request, client_address)
+
+  def shutdown_request(self, request):
+    self.connections.discard(request)
+    HTTPServer.shutdown_request(self, request)
+
+  def stop(self):
+    # as a node going down: the listener and every open connection are
+    # closed.
+    self.shutdown()
+    self.server_close()
+    for connection in list(self.connections):
+      try:
+        connection.shutdown(socket.SHUT_RDWR)
+      except (OSError, socket.error):
+        pass
+
+class FakePVEServer(object):
+  # A FakePVE served over TLS from a background thread.
+  def __init__(self, certfile, keyfile, host='127.0.0.1', port=0, entities=0, latency=0.0,
+               write_time=0.0, lock_timeout=10.0, api=None, node_latency=0.0):
+    if api is None:
+      state = AccessState()
+      state.seed(entities)
+      api = FakePVE(state, latency, write_time, lock_timeout)
+    self.api = api
+    self.httpd = ThreadingServer((host, port), RequestHandler)
+    self.httpd.connections = set()
+    self.httpd.api = self.api
+    self.httpd.latency = node_latency
+    self.api.nodes.append(self.httpd)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile, keyfile)
+    self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+    self.thread = None
+
+  @property
+  def api_host(self):
+    host, port = self.httpd.server_address[:2]
+    return '%s:%d' % (host, port)
+
+  def start(self):
+    self.thread = threading.Thread(target=self.httpd.serve_forever)
+    self.thread.daemon = True
+    self.thread.start()
+    return self
+
+  def stop(self):
+    self.httpd.shutdown()
+    self.httpd.server_close()
+
+  def add_node(self, certfile, keyfile, host, node_latency=0.0):
+    # Serve the same cluster on the same port of another address, as a further node.
+    port = self.httpd.server_address[1]
+    return FakePVEServer(certfile, keyfile, host, port, api=self.api, node_latency=node_latency).start()
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8006)
+  parser.add_argument('--certfile', required=True)
+  parser.add_argument('--keyfile', required=True)
+  parser.add_argument('--entities', type=int, default=0, help='users, roles and ACL entries to seed')
+  parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+  parser.add_argument('--write-time', type=float, default=0.0,
+                      help='seconds every write holds the cluster filesystem lock')
+  parser.add_argument('--lock-timeout', type=float, default=10.0,
+                      help='seconds a write waits for the lock before failing')
+  parser.add_argument('--nodes', type=int, default=1, help='nodes to serve, on consecutive addresses')
+  parser.add_argument('--node-latency', default='',
+                      help='comma separated seconds added to the requests of each node')
+  args = parser.parse_args()
+
+  latencies = [float(value) for value in args.node_latency.split(',') if value]
+  latencies += [0.0] * (args.nodes - len(latencies))
+  server = FakePVEServer(args.certfile, args.keyfile, args.host, args.port, args.entities, args.latency,
+                         args.write_time, args.lock_timeout, node_latency=latencies[0])
+  prefix, last = args.host.rsplit('.', 1)
+  for index in range(1, args.nodes):
+    server.add_node(args.certfile, args.keyfile, '%s.%d' % (prefix, int(last) + index), latencies[index])
+  print('serving the fake PVE API on https://%s (login root@pam / root)' % server.api_host)
+  try:
+    server.httpd.serve_forever()
+  except KeyboardInterrupt:
+    server.stop()
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,56 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# The action plugins run the single-item modules in the controller process:
+# one login and one client serve every loop item of a task, past
+# SINGLE_READ_THRESHOLD items the listing is read once, and the results are
+# the module's own.
+
+import pytest
+
+pytest.importorskip('ansible')
+
+from ansible.module_utils.proxmox_pve.read import SINGLE_READ_THRESHOLD
+
+ITEMS = SINGLE_READ_THRESHOLD + 4
+
+def user_loop(**options):
+  return {
+    'proxmox_pve_user': dict(userid='user{{ item }}@pve', comment='user {{ item }}', api_ticket_cache=False, **options),
+    'loop': list(range(ITEMS)),
+  }
+
+def test_loop_runs_in_process(fake_pve, playbook):
+  fake_pve.api.reset_stats()
+  result = playbook([user_loop()])[0]
+  assert result['changed']
+  assert [item['msg'] for item in result['results']] == ['created Proxmox PVE User user%d@pve' % i for i in range(ITEMS)]
+  assert all('api_stats' in item for item in result['results'])
+
+  endpoints = fake_pve.api.snapshot_stats()['endpoints']
+  assert endpoints['POST /access/ticket'] == 1
+  # reads of users that do not exist yet are counted by their path.
+  assert sum(count for endpoint, count in endpoints.items()
+             if endpoint.startswith('GET /access/users/')) == SINGLE_READ_THRESHOLD
+  assert endpoints['GET /access/users'] == 1
+  assert endpoints['POST /access/users'] == ITEMS
+
+  fake_pve.api.reset_stats()
+  again = playbook([user_loop()])[0]
+  assert not again['changed']
+  assert 'POST /access/users' not in fake_pve.api.snapshot_stats()['endpoints']
+
+def test_modules_without_action_plugins_log_in_per_item(fake_pve, playbook):
+  fake_pve.api.reset_stats()
+  result = playbook([user_loop()], action_plugins=False)[0]
+  assert result['changed']
+  endpoints = fake_pve.api.snapshot_stats()['endpoints']
+  assert endpoints['POST /access/ticket'] == ITEMS
+  assert endpoints['POST /access/users'] == ITEMS
+
+def test_failures_are_reported_per_item(fake_pve, playbook):
+  result = playbook([{'proxmox_pve_user_password': {'userid': 'nobody@pve', 'password': 'secret123'}}])[0]
+  assert result['failed']
+  assert result['msg'] == 'user does not exist.  nobody@pve'
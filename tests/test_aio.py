@@ -0,0 +1,72 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# The asyncio backend against the fake PVE API: it keeps max_workers calls
+# in flight, reports failures per call like the requests backend, and logs
+# in again through the synchronous client when a ticket is rejected.
+
+import time
+
+import pytest
+
+pytest.importorskip('ansible')
+pytest.importorskip('requests')
+pytest.importorskip('aiohttp')
+
+from ansible.module_utils.proxmox_pve.auth import connect
+from ansible.module_utils.proxmox_pve.read import read_collections
+
+LATENCY = 0.2
+
+@pytest.fixture
+def slow_pve(certificate):
+  from fake_pve import FakePVEServer
+  server = FakePVEServer(*certificate, latency=LATENCY).start()
+  yield server
+  server.stop()
+
+def aio_client(server, tmp_path, concurrency=8):
+  proxmox = connect(server.api_host, 'root@pam', verify_ssl=False, password='root', ticket_cache_dir=str(tmp_path),
+                    backend='asyncio', concurrency=concurrency)
+  assert proxmox.aio is not None
+  return proxmox
+
+def test_writes_are_sent_concurrently(slow_pve, library, tmp_path):
+  proxmox = aio_client(slow_pve, tmp_path)
+  users = [{'userid': 'user%d@pve' % i} for i in range(16)]
+  start = time.time()
+  result = library('proxmox_pve_users').reconcile(proxmox, users, [], max_workers=8)
+  elapsed = time.time() - start
+  assert result['msg'] == 'Proxmox PVE Users: 16 created, 0 updated, 0 deleted, 0 unchanged.'
+  assert set(user['userid'] for user in users) <= set(slow_pve.api.state.users)
+  # one listing and 16 writes, 8 at a time; one by one they take 17 * LATENCY.
+  assert elapsed < 8 * LATENCY, elapsed
+  assert proxmox.stats.as_dict()['endpoints']['POST /access/users']['count'] == 16
+
+def test_failures_are_reported_per_call(fake_pve, library, tmp_path):
+  proxmox = aio_client(fake_pve, tmp_path)
+  result = library('proxmox_pve_roles').reconcile(proxmox, [
+    {'roleid': 'Broken', 'privs': ['No.Such.Priv']}, {'roleid': 'Good', 'privs': ['VM.Audit']}], [], max_workers=4)
+  assert result['failed']
+  outcomes = dict((entry['roleid'], entry.get('failed', False)) for entry in result['results'])
+  assert outcomes == {'Broken': True, 'Good': False}
+  assert 'Good' in fake_pve.api.state.roles
+
+def test_listings_are_fetched_at_once(slow_pve, tmp_path):
+  proxmox = aio_client(slow_pve, tmp_path)
+  slow_pve.api.reset_stats()
+  start = time.time()
+  data = read_collections(proxmox, ['users', 'roles', 'acl', 'groups'])
+  assert time.time() - start < 3 * LATENCY
+  assert [user['userid'] for user in data['users']] == ['root@pam']
+  endpoints = slow_pve.api.snapshot_stats()['endpoints']
+  assert [endpoints['GET /access/%s' % collection] for collection in ['users', 'roles', 'acl', 'groups']] == [1] * 4
+
+def test_rejected_ticket_logs_in_again(fake_pve, tmp_path):
+  proxmox = aio_client(fake_pve, tmp_path)
+  fake_pve.api.tickets.clear()
+  fake_pve.api.reset_stats()
+  assert proxmox.aio.get_many(['/access/users', '/access/roles'])[0]
+  assert fake_pve.api.snapshot_stats()['endpoints']['POST /access/ticket'] == 1
@@ -0,0 +1,54 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# apply_operations() against the fake PVE API: phases run in dependency
+# order whatever order the operations come in, and a failure only takes the
+# operations depending on it down with it.
+
+import pytest
+
+pytest.importorskip('ansible')
+
+from ansible.module_utils.proxmox_pve.access import acl_operations, apply_operations, role_operations, user_operations
+
+def operations(roles, users, acls):
+  return (
+    acl_operations({}, acls, []) +
+    user_operations({}, users, [])[0] +
+    role_operations({}, roles, [])[0]
+  )
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+def test_phases_run_in_dependency_order(fake_pve, proxmox, max_workers):
+  ops = operations(
+    [{'roleid': 'Role%d' % i, 'privs': ['VM.Audit']} for i in range(5)],
+    [{'userid': 'user%d@pve' % i} for i in range(5)],
+    [{'path': '/vms/%d' % i, 'roleid': 'Role%d' % i, 'users': ['user%d@pve' % i]} for i in range(5)],
+  )
+  # the ACL grants come first and would fail if sent before their role and user.
+  applied = apply_operations(proxmox, ops, max_workers)
+  assert not applied['failed'], applied
+  assert [result['action'] for result in applied['results']] == ['created'] * 10 + ['granted'] * 5
+  assert len(fake_pve.api.state.acl) == 5
+
+def test_failure_only_skips_what_depends_on_it(fake_pve, proxmox):
+  ops = operations(
+    [{'roleid': 'Broken', 'privs': ['No.Such.Priv']}, {'roleid': 'Good', 'privs': ['VM.Audit']}],
+    [{'userid': 'alice@pve'}],
+    [
+      {'path': '/vms', 'roleid': 'Broken', 'users': ['alice@pve']},
+      {'path': '/vms', 'roleid': 'Good', 'users': ['alice@pve']},
+    ],
+  )
+  applied = apply_operations(proxmox, ops, 4)
+  assert applied['failed']
+  assert applied['msg'].startswith('2 of 5 operations failed.')
+  results = dict(((result.get('roleid'), result.get('path'), result['action']), result) for result in applied['results'])
+  assert results[('Broken', None, 'created')]['failed']
+  assert 'invalid privilege' in results[('Broken', None, 'created')]['msg']
+  assert results[('Broken', '/vms', 'granted')]['msg'] == 'skipped, role Broken could not be created.'
+  assert not results[('Good', '/vms', 'granted')].get('failed')
+  assert list(fake_pve.api.state.acl) == [('/vms', 'Good', 'user', 'alice@pve')]
+  assert 'alice@pve' in fake_pve.api.state.users
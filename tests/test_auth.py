@@ -0,0 +1,81 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# The ticket cache against the fake PVE API: a cached ticket spares the
+# login of later runs until it gets close to expiry, renews itself then,
+# and is only reused with the password that produced it.
+
+import json
+import os
+import stat
+import time
+
+import pytest
+
+pytest.importorskip('ansible')
+pytest.importorskip('requests')
+
+from ansible.module_utils.proxmox_pve.auth import TICKET_LIFETIME, TICKET_RENEW_MARGIN, connect, ticket_cache_path
+from ansible.module_utils.proxmox_pve.client import ProxmoxAPIError
+
+def client(fake_pve, cache_dir, password='root'):
+  return connect(fake_pve.api_host, 'root@pam', verify_ssl=False, password=password, ticket_cache_dir=cache_dir)
+
+def logins(fake_pve):
+  return fake_pve.api.snapshot_stats()['endpoints'].get('POST /access/ticket', 0)
+
+def age_ticket(fake_pve, cache_dir, seconds):
+  path = ticket_cache_path(cache_dir, fake_pve.api_host, 'root@pam')
+  with open(path) as f:
+    entry = json.load(f)
+  entry['issued'] = time.time() - seconds
+  with open(path, 'w') as f:
+    json.dump(entry, f)
+  return entry['ticket']
+
+def test_cached_ticket_is_reused(fake_pve, tmp_path):
+  cache_dir = str(tmp_path)
+  fake_pve.api.reset_stats()
+  client(fake_pve, cache_dir).access.users.get()
+  client(fake_pve, cache_dir).access.users.get()
+  assert logins(fake_pve) == 1
+  path = ticket_cache_path(cache_dir, fake_pve.api_host, 'root@pam')
+  assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+def test_ticket_needs_its_password(fake_pve, tmp_path):
+  cache_dir = str(tmp_path)
+  client(fake_pve, cache_dir)
+  with pytest.raises(ProxmoxAPIError):
+    client(fake_pve, cache_dir, password='wrong')
+
+def test_ticket_close_to_expiry_is_renewed(fake_pve, tmp_path):
+  cache_dir = str(tmp_path)
+  client(fake_pve, cache_dir)
+  old_ticket = age_ticket(fake_pve, cache_dir, TICKET_LIFETIME - TICKET_RENEW_MARGIN + 10)
+  # the realm password is not needed to renew a valid ticket.
+  fake_pve.api.state.passwords['root@pam'] = 'changed'
+  fake_pve.api.reset_stats()
+  client(fake_pve, cache_dir).access.users.get()
+  assert logins(fake_pve) == 1
+  new_ticket = age_ticket(fake_pve, cache_dir, 0)
+  assert new_ticket != old_ticket
+
+def test_expired_ticket_logs_in_again(fake_pve, tmp_path):
+  cache_dir = str(tmp_path)
+  client(fake_pve, cache_dir)
+  age_ticket(fake_pve, cache_dir, TICKET_LIFETIME + 10)
+  fake_pve.api.reset_stats()
+  client(fake_pve, cache_dir).access.users.get()
+  assert logins(fake_pve) == 1
+
+def test_rejected_ticket_logs_in_again(fake_pve, tmp_path):
+  cache_dir = str(tmp_path)
+  proxmox = client(fake_pve, cache_dir)
+  fake_pve.api.tickets.clear()
+  fake_pve.api.reset_stats()
+  assert proxmox.access.users.get()
+  assert logins(fake_pve) == 1
+  client(fake_pve, cache_dir).access.users.get()
+  assert logins(fake_pve) == 1
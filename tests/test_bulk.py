@@ -0,0 +1,104 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# The bulk modules' reconcile() against the fake PVE API: a second run with
+# the same input changes nothing, and a purge only removes what is in scope.
+
+import pytest
+
+pytest.importorskip('ansible')
+
+USERS = [
+  {'userid': 'alice@pve', 'comment': 'Alice', 'email': 'alice@example.com', 'groups': ['ops']},
+  {'userid': 'bob@pve', 'enable': False},
+  {'userid': 'carol@pam', 'groups': ['ops', 'dev']},
+]
+ROLES = [
+  {'roleid': 'Auditor', 'privs': ['Sys.Audit', 'VM.Audit']},
+  {'roleid': 'Operator', 'privs': ['VM.Audit', 'VM.Console', 'VM.PowerMgmt']},
+]
+ACLS = [
+  {'path': '/vms', 'roleid': 'Operator', 'users': ['alice@pve'], 'groups': ['dev']},
+  {'path': '/', 'roleid': 'Auditor', 'users': ['bob@pve', 'carol@pam'], 'propagate': False},
+  {'path': '/storage', 'roleid': 'PVEAuditor', 'groups': ['ops']},
+]
+
+@pytest.fixture
+def modules(library):
+  return dict((name, library('proxmox_pve_%s' % name)) for name in ['users', 'roles', 'acls'])
+
+def add_groups(fake_pve, *groupids):
+  for groupid in groupids:
+    fake_pve.api.state.groups[groupid] = {'comment': ''}
+
+def acl_entries(fake_pve):
+  return sorted(fake_pve.api.state.acl)
+
+def test_users_rerun_changes_nothing(fake_pve, proxmox, modules):
+  add_groups(fake_pve, 'ops', 'dev')
+  first = modules['users'].reconcile(proxmox, USERS, ['nobody@pve'])
+  assert first['changed'] and not first.get('failed'), first
+  state = dict((userid, dict(user)) for userid, user in fake_pve.api.state.users.items())
+
+  second = modules['users'].reconcile(proxmox, USERS, ['nobody@pve'])
+  assert not second['changed'], second
+  assert [result['action'] for result in second['results']] == ['none'] * 4
+  assert fake_pve.api.state.users == state
+
+def test_roles_rerun_changes_nothing(proxmox, modules):
+  assert modules['roles'].reconcile(proxmox, ROLES, [])['changed']
+  second = modules['roles'].reconcile(proxmox, ROLES, [])
+  assert not second['changed'], second
+
+def test_acls_rerun_changes_nothing(fake_pve, proxmox, modules):
+  add_groups(fake_pve, 'ops', 'dev')
+  modules['users'].reconcile(proxmox, USERS, [])
+  modules['roles'].reconcile(proxmox, ROLES, [])
+  assert modules['acls'].reconcile(proxmox, ACLS, [])['changed']
+  entries = acl_entries(fake_pve)
+  assert len(entries) == 5
+
+  second = modules['acls'].reconcile(proxmox, ACLS, [])
+  assert not second['changed'], second
+  assert second['results'] == []
+  assert acl_entries(fake_pve) == entries
+
+def test_user_purge_stays_in_scope(fake_pve, proxmox, modules):
+  add_groups(fake_pve, 'ops', 'dev')
+  for userid in ['stale1@pve', 'stale2@pve', 'keep-stale@pve', 'stale@pam']:
+    fake_pve.api.state.add_user(userid)
+
+  result = modules['users'].reconcile(proxmox, USERS, [], purge_scope={'realms': ['pve'], 'pattern': 'stale*'})
+  assert not result.get('failed'), result
+  deleted = sorted(item['userid'] for item in result['results'] if item['action'] == 'deleted')
+  assert deleted == ['stale1@pve', 'stale2@pve']
+  assert sorted(fake_pve.api.state.users) == sorted(
+    ['root@pam', 'alice@pve', 'bob@pve', 'carol@pam', 'keep-stale@pve', 'stale@pam'])
+
+  # an empty scope covers every user but root@pam and the API user.
+  modules['users'].reconcile(proxmox, USERS, [], purge_scope={})
+  assert sorted(fake_pve.api.state.users) == sorted(['root@pam', 'alice@pve', 'bob@pve', 'carol@pam'])
+
+def test_acl_purge_stays_in_scope(fake_pve, proxmox, modules):
+  add_groups(fake_pve, 'ops', 'dev')
+  modules['users'].reconcile(proxmox, USERS, [])
+  modules['roles'].reconcile(proxmox, ROLES, [])
+  acl = fake_pve.api.state.acl
+  acl[('/vms/100', 'PVEVMUser', 'user', 'bob@pve')] = 1
+  acl[('/vms', 'PVEAuditor', 'group', 'ops')] = 1
+  acl[('/storage/local', 'PVEVMUser', 'user', 'carol@pam')] = 1
+  acl[('/vms', 'Administrator', 'user', 'root@pam')] = 1
+
+  result = modules['acls'].reconcile(proxmox, ACLS, [], purge_scope={'paths': ['/vms'], 'realms': ['pve']})
+  assert not result.get('failed'), result
+  # bob's entry below /vms goes; the group entry has no realm, carol's is
+  # outside /vms and root@pam's entries always stay.
+  assert ('/vms/100', 'PVEVMUser', 'user', 'bob@pve') not in acl
+  assert ('/vms', 'PVEAuditor', 'group', 'ops') in acl
+  assert ('/storage/local', 'PVEVMUser', 'user', 'carol@pam') in acl
+  assert ('/vms', 'Administrator', 'user', 'root@pam') in acl
+  assert ('/vms', 'Operator', 'user', 'alice@pve') in acl
+
+  assert not modules['acls'].reconcile(proxmox, ACLS, [], purge_scope={'paths': ['/vms'], 'realms': ['pve']})['changed']
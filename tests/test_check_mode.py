@@ -0,0 +1,79 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# Check mode: the modules plan their changes without writing, single-item
+# modules on the host and through the action plugins alike, and the bulk
+# modules can stream their plans to a plan_file as JSON lines.
+
+import json
+
+import pytest
+
+pytest.importorskip('ansible')
+
+TASKS = [
+  {'proxmox_pve_user': {'userid': 'bob@pve', 'comment': 'Bob'}},
+  {'proxmox_pve_user': {'userid': 'alice@pve', 'comment': 'Alice Smith'}},
+  {'proxmox_pve_user': {'userid': 'alice@pve', 'state': 'absent'}},
+  {'proxmox_pve_role': {'roleid': 'Auditor', 'privs': ['VM.Audit', 'Sys.Audit']}},
+  {'proxmox_pve_acl': {'path': '/vms', 'roleid': 'Auditor', 'users': ['alice@pve']}},
+  {'proxmox_pve_user_password': {'userid': 'alice@pve', 'password': 'secret123'}},
+  {'proxmox_pve_user': {'userid': 'alice@pve', 'comment': 'Alice'}},
+]
+
+def writes(fake_pve):
+  return dict((endpoint, count) for endpoint, count in fake_pve.api.snapshot_stats()['endpoints'].items()
+              if not endpoint.startswith('GET ') and endpoint != 'POST /access/ticket')
+
+@pytest.mark.parametrize('action_plugins', [True, False])
+def test_single_modules_plan_in_check_mode(fake_pve, playbook, action_plugins):
+  fake_pve.api.state.add_user('alice@pve', comment='Alice')
+  fake_pve.api.state.roles['Auditor'] = {'VM.Audit'}
+  fake_pve.api.reset_stats()
+  results = playbook(TASKS, action_plugins=action_plugins, check=True, diff=True)
+  assert writes(fake_pve) == {}
+  assert fake_pve.api.state.users['alice@pve']['comment'] == 'Alice'
+  assert 'bob@pve' not in fake_pve.api.state.users
+
+  assert [result['changed'] for result in results] == [True] * 6 + [False]
+  assert not [result for result in results if result.get('failed')]
+  assert [[entry['action'] for entry in result['results']] for result in results] == [
+    ['created'], ['updated'], ['deleted'], ['updated'], ['granted'], ['set'], ['none']]
+  assert results[1]['results'][0]['before'] == {'comment': 'Alice'}
+  assert results[1]['results'][0]['after'] == {'comment': 'Alice Smith'}
+  assert results[3]['results'][0]['after'] == {'privs': ['Sys.Audit', 'VM.Audit']}
+  assert results[1]['diff'] == [{'before_header': 'user alice@pve', 'after_header': 'user alice@pve',
+                                 'before': {'comment': 'Alice'}, 'after': {'comment': 'Alice Smith'}}]
+  assert 'secret123' not in json.dumps(results)
+
+def test_missing_user_fails_in_check_mode(fake_pve, playbook):
+  result = playbook([TASKS[5]], check=True)[0]
+  assert result['failed']
+  assert result['msg'] == 'user does not exist.  alice@pve'
+
+def test_plan_file_holds_one_json_line_per_change(fake_pve, proxmox, library, tmp_path):
+  fake_pve.api.state.add_user('alice@pve', comment='Alice')
+  fake_pve.api.state.add_user('carol@pve')
+  plan_file = str(tmp_path / 'plan.jsonl')
+  users = [{'userid': 'bob@pve'}, {'userid': 'alice@pve', 'comment': 'Alice Smith'}]
+  result = library('proxmox_pve_users').reconcile(
+    proxmox, users, ['dave@pve', 'carol@pve'], plan=dict(plan_file=plan_file, diff=True))
+
+  assert result['changed']
+  assert result['plan_file'] == plan_file
+  assert result['msg'] == 'plan: 1 created, 1 deleted, 1 updated, 1 unchanged.'
+  # the plan is in the file only, leaving the results small.
+  assert result['results'] == []
+  assert 'diff' not in result
+  with open(plan_file) as f:
+    entries = [json.loads(line) for line in f]
+  assert [(entry['action'], entry['userid'], entry['request']) for entry in entries] == [
+    ('created', 'bob@pve', 'POST /access/users'),
+    ('updated', 'alice@pve', 'PUT /access/users/alice%40pve'),
+    ('deleted', 'carol@pve', 'DELETE /access/users/carol%40pve'),
+  ]
+  assert entries[1]['before'] == {'comment': 'Alice'}
+  assert entries[1]['after'] == {'comment': 'Alice Smith'}
+  assert sorted(fake_pve.api.state.users) == ['alice@pve', 'carol@pve', 'root@pam']
@@ -0,0 +1,86 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# `clusters` against two fake PVE APIs: the same desired state is
+# reconciled on each with its own login, one failing cluster does not stop
+# the others, and check mode writes a plan file per cluster.
+
+import json
+import os
+
+import pytest
+
+pytest.importorskip('ansible')
+pytest.importorskip('requests')
+
+@pytest.fixture
+def other_pve(certificate):
+  from fake_pve import FakePVEServer
+  server = FakePVEServer(*certificate).start()
+  yield server
+  server.stop()
+
+def cluster_args(tmp_path, clusters, **args):
+  return dict(
+    args,
+    clusters=clusters,
+    api_user='root@pam',
+    api_password='root',
+    api_validate_certs=False,
+    api_ticket_cache_dir=str(tmp_path),
+  )
+
+def test_every_cluster_is_reconciled(run_module, fake_pve, other_pve, tmp_path):
+  other_pve.api.state.add_user('alice@pve', comment='Alice')
+  clusters = [{'name': 'pve1', 'api_host': fake_pve.api_host}, {'name': 'pve2', 'api_host': other_pve.api_host}]
+  result = run_module('proxmox_pve_users', cluster_args(tmp_path, clusters, users=[
+    {'userid': 'alice@pve', 'comment': 'Alice'}, {'userid': 'bob@pve'}]))
+
+  assert result['changed']
+  assert result['msg'] == 'Proxmox PVE clusters: 2 reconciled, 2 changed, 0 failed.'
+  assert result['clusters']['pve1']['msg'] == 'Proxmox PVE Users: 2 created, 0 updated, 0 deleted, 0 unchanged.'
+  assert result['clusters']['pve2']['msg'] == 'Proxmox PVE Users: 1 created, 0 updated, 0 deleted, 1 unchanged.'
+  for server in [fake_pve, other_pve]:
+    assert {'alice@pve', 'bob@pve'} <= set(server.api.state.users)
+    assert server.api.snapshot_stats()['endpoints']['POST /access/ticket'] == 1
+  # the task's api_stats sum those of the clusters.
+  assert result['api_stats']['endpoints']['POST /access/users']['count'] == 3
+
+def test_a_failing_cluster_leaves_the_others(run_module, fake_pve, other_pve, tmp_path):
+  clusters = [
+    {'name': 'pve1', 'api_host': fake_pve.api_host},
+    {'name': 'pve2', 'api_host': other_pve.api_host, 'api_password': 'wrong'},
+  ]
+  result = run_module('proxmox_pve_roles', cluster_args(tmp_path, clusters, roles=[
+    {'roleid': 'Auditor', 'privs': ['VM.Audit']}]))
+
+  assert result['failed']
+  assert result['msg'].startswith('Proxmox PVE clusters: 2 reconciled, 1 changed, 1 failed.  pve2: authorization')
+  assert not result['clusters']['pve1'].get('failed')
+  assert 'Auditor' in fake_pve.api.state.roles
+  assert 'Auditor' not in other_pve.api.state.roles
+
+def test_duplicate_names_are_rejected(run_module, fake_pve, tmp_path):
+  clusters = [{'api_host': fake_pve.api_host}, {'api_host': fake_pve.api_host}]
+  result = run_module('proxmox_pve_acls', cluster_args(tmp_path, clusters))
+  assert result['failed']
+  assert result['msg'] == 'every entry in clusters needs a distinct name or api_host.'
+
+def test_check_mode_writes_a_plan_file_per_cluster(run_module, fake_pve, other_pve, tmp_path):
+  other_pve.api.state.add_user('alice@pve')
+  plan_file = str(tmp_path / 'plan.jsonl')
+  clusters = [{'name': 'pve1', 'api_host': fake_pve.api_host}, {'name': 'pve2', 'api_host': other_pve.api_host}]
+  result = run_module('proxmox_pve_access', cluster_args(
+    tmp_path, clusters, users=[{'userid': 'alice@pve'}], plan_file=plan_file, _ansible_check_mode=True))
+
+  assert result['changed']
+  assert 'alice@pve' not in fake_pve.api.state.users
+  plans = {}
+  for name in ['pve1', 'pve2']:
+    # the path itself may show up masked in the result, as it holds the password `root`.
+    assert result['clusters'][name]['plan_file'].endswith('plan-%s.jsonl' % name)
+    with open(os.path.join(str(tmp_path), 'plan-%s.jsonl' % name)) as f:
+      plans[name] = [json.loads(line)['action'] for line in f]
+  assert plans == {'pve1': ['created'], 'pve2': []}
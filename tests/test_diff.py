@@ -0,0 +1,71 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# Desired state is compared with the current one in a canonical form, and
+# the single-item and bulk user modules agree on what is a change.
+
+import pytest
+
+pytest.importorskip('ansible')
+
+from ansible.module_utils.proxmox_pve.diff import diff_user, expand_acl, missing_acl_entries
+
+CURRENT = {
+  'userid': 'alice@pve', 'comment': 'Alice', 'email': None, 'enable': 1, 'expire': 0,
+  'groups': 'ops,dev', 'keys': '',
+}
+
+@pytest.mark.parametrize('desired', [
+  {'comment': 'Alice'},
+  {'email': ''},
+  {'enable': True},
+  {'enable': 'yes'},
+  {'expire': None},
+  {'expire': '0'},
+  {'groups': ['dev', 'ops']},
+  {'groups': 'dev, ops,'},
+  {'keys': []},
+])
+def test_equivalent_values_are_no_change(desired):
+  assert diff_user(CURRENT, desired) == {}
+
+def test_changes_carry_normalized_values():
+  changes = diff_user(CURRENT, {'enable': False, 'expire': 1700000000, 'groups': ['ops'], 'email': 'a@example.com'})
+  assert changes == {
+    'enable': {'before': 1, 'after': 0},
+    'expire': {'before': 0, 'after': 1700000000},
+    'groups': {'before': ['dev', 'ops'], 'after': ['ops']},
+    'email': {'before': '', 'after': 'a@example.com'},
+  }
+
+def test_acl_entries_compare_propagate():
+  current = {('/vms', 'PVEVMUser', 'user', 'alice@pve'): 1}
+  assert missing_acl_entries(current, expand_acl('/vms', 'PVEVMUser', users=['alice@pve'])) == {}
+  assert missing_acl_entries(current, expand_acl('/vms', 'PVEVMUser', users='alice@pve', propagate=False)) == {
+    ('/vms', 'PVEVMUser', 'user', 'alice@pve'): 0}
+
+def user_params(**params):
+  defaults = dict(state='present', comment=None, email=None, enable=True, expire=None, firstname=None,
+                  groups=[], keys=None, lastname=None, api_ticket_cache_dir=None)
+  defaults.update(params)
+  return defaults
+
+@pytest.mark.parametrize('item, changed', [
+  ({}, False),
+  ({'expire': 1800000000}, False),
+  ({'expire': 0}, True),
+  ({'expire': 1900000000}, True),
+  ({'comment': 'Alice'}, False),
+  ({'comment': 'Alice Smith'}, True),
+])
+def test_user_and_users_agree(fake_pve, proxmox, library, tmp_path, item, changed):
+  fake_pve.api.state.add_user('alice@pve', comment='Alice', expire=1800000000)
+  params = user_params(userid='alice@pve', api_ticket_cache_dir=str(tmp_path), **item)
+  single = library('proxmox_pve_user').run(proxmox, params)
+  fake_pve.api.state.add_user('alice@pve', comment='Alice', expire=1800000000)
+  bulk = library('proxmox_pve_users').reconcile(proxmox, [dict(item, userid='alice@pve')], [])
+  assert single['changed'] == bulk['changed'] == changed, (single, bulk)
+  expected = item.get('expire', 1800000000)
+  assert fake_pve.api.state.users['alice@pve']['expire'] == expected
@@ -0,0 +1,104 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# EndpointPool and node selection against a fake two node cluster on
+# 127.0.0.1 and 127.0.0.2: the fastest node serves the requests, the
+# ranking is probed once per ttl, and a node going down hands over to the
+# other in the middle of a run.
+
+import socket
+import time
+
+import pytest
+
+pytest.importorskip('ansible')
+pytest.importorskip('requests')
+
+from ansible.module_utils.proxmox_pve.auth import connect
+from ansible.module_utils.proxmox_pve.endpoints import DOWN_SECONDS, EndpointPool
+
+def test_pool_sets_failed_nodes_aside():
+  pool = EndpointPool(['pve1:8006', 'pve2:8006', 'pve3:8006'])
+  pool.rank({'pve1:8006': 0.2, 'pve2:8006': 0.01, 'pve3:8006': None})
+  assert pool.hosts == ['pve2:8006', 'pve1:8006', 'pve3:8006']
+  assert pool.current() == 'pve2:8006'
+  assert pool.failed('pve2:8006')
+  assert pool.current() == 'pve1:8006'
+  assert not pool.failed('pve1:8006')
+  # with every node down, the one set aside the longest ago is tried.
+  assert pool.current() == 'pve3:8006'
+  assert pool.down['pve1:8006'] - time.time() <= DOWN_SECONDS
+
+def test_single_node_is_never_set_aside():
+  pool = EndpointPool(['pve1:8006'])
+  assert not pool.failed('pve1:8006')
+  assert pool.current() == 'pve1:8006'
+
+@pytest.fixture
+def cluster(certificate):
+  # a slow first node and a fast second one serving the same cluster.
+  from fake_pve import FakePVEServer
+  first = FakePVEServer(*certificate, node_latency=0.2).start()
+  try:
+    second = first.add_node(certificate[0], certificate[1], '127.0.0.2')
+  except (OSError, socket.error) as e:
+    first.stop()
+    pytest.skip('cannot serve on 127.0.0.2: %s' % e)
+  yield first, second
+  for server in [first, second]:
+    if not server.httpd.stopped:
+      server.stop()
+
+def cluster_client(first, second, tmp_path, **options):
+  options.setdefault('api_hosts', [second.api_host])
+  return connect(first.api_host, 'root@pam', verify_ssl=False, password='root', ticket_cache_dir=str(tmp_path),
+                 **options)
+
+def probes(server):
+  return server.api.snapshot_stats()['endpoints'].get('GET /version', 0)
+
+def stop_node(server):
+  # the node goes down the way POST /__stop takes it down, and refuses
+  # connections once it is gone.
+  import requests
+  requests.post('https://%s/__stop' % server.api_host, verify=False)
+  host, port = server.httpd.server_address[:2]
+  for i in range(100):
+    try:
+      socket.create_connection((host, port), 0.1).close()
+    except (OSError, socket.error):
+      return
+    time.sleep(0.02)
+  raise AssertionError('%s still accepts connections' % server.api_host)
+
+def test_fastest_node_serves_and_ranking_is_kept(cluster, tmp_path):
+  first, second = cluster
+  proxmox = cluster_client(first, second, tmp_path)
+  assert proxmox.endpoints.current() == second.api_host
+  assert probes(first) == 2
+
+  first.api.reset_stats()
+  again = cluster_client(first, second, tmp_path)
+  assert again.endpoints.current() == second.api_host
+  assert probes(first) == 0
+
+def test_nodes_are_discovered(cluster, tmp_path):
+  first, second = cluster
+  proxmox = cluster_client(first, second, tmp_path, api_hosts=[], discover_nodes=True)
+  assert proxmox.endpoints.current() == second.api_host
+  assert sorted(proxmox.endpoints.hosts) == sorted([first.api_host, second.api_host])
+
+def test_next_node_takes_over(cluster, tmp_path):
+  first, second = cluster
+  proxmox = cluster_client(first, second, tmp_path)
+  proxmox.access.users.get()
+  stop_node(second)
+
+  proxmox.access.users.post(userid='alice@pve')
+  assert proxmox.access.users('alice@pve').get()
+  assert proxmox.endpoints.current() == first.api_host
+  assert 'alice@pve' in first.api.state.users
+  stats = proxmox.stats.as_dict()
+  assert stats['endpoints']['POST /access/users']['retry_reasons'] == {'failover': 1}
@@ -0,0 +1,108 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# RequestExecutor: which failures are retried, the AIMD limit on calls in
+# flight, and writes contending for the cluster filesystem lock of the fake
+# PVE API all going through in the end.
+
+import time
+
+import pytest
+
+pytest.importorskip('ansible')
+
+from ansible.module_utils.proxmox_pve import executor
+from ansible.module_utils.proxmox_pve.client import ProxmoxAPIError
+from ansible.module_utils.proxmox_pve.endpoints import NodeUnreachable
+from ansible.module_utils.proxmox_pve.executor import (
+  CONNECTION,
+  FAILOVER,
+  LOCK,
+  UNAVAILABLE,
+  RequestExecutor,
+  classify,
+)
+
+LOCK_ERROR = ProxmoxAPIError(500, "cfs-lock 'file-user_cfg' error: got lock request timeout")
+
+@pytest.mark.parametrize('method, error, path, reason', [
+  ('POST', LOCK_ERROR, '/access/users', LOCK),
+  ('PUT', ProxmoxAPIError(503, 'Service Unavailable'), '/access/acl', UNAVAILABLE),
+  ('POST', ProxmoxAPIError(503, 'Service Unavailable'), '/access/users', None),
+  ('POST', ProxmoxAPIError(503, 'Service Unavailable'), '/access/ticket', UNAVAILABLE),
+  ('POST', ProxmoxAPIError(500, 'create user failed: user alice@pve already exists'), '/access/users', None),
+  ('GET', ProxmoxAPIError(401, 'No ticket'), '/access/users', None),
+  ('GET', ConnectionError('reset'), '/access/users', CONNECTION),
+  ('POST', ConnectionError('reset'), '/access/users', None),
+  ('POST', NodeUnreachable('pve1:8006', ConnectionError('refused')), '/access/users', FAILOVER),
+])
+def test_classify(method, error, path, reason):
+  assert classify(method, error, (ConnectionError,), path) == reason
+
+def complete(requests, reason=None):
+  # one request of a steady 10ms, so that none looks markedly slow.
+  requests.acquire()
+  requests.release('PUT /access/acl', time.time() - 0.01, reason)
+
+def test_limit_halves_on_contention_and_grows_back():
+  requests = RequestExecutor(ceiling=8)
+  start = requests.acquire()
+  requests.release('PUT /access/acl', start, LOCK)
+  assert requests.allowed() == 4
+  # a request sent before the decrease does not halve the limit again.
+  requests.in_flight += 1
+  requests.release('PUT /access/acl', start, LOCK)
+  assert requests.allowed() == 4
+
+  # a round of successes adds one.
+  for i in range(5):
+    complete(requests)
+  assert requests.allowed() == 5
+  for i in range(100):
+    complete(requests)
+  assert requests.allowed() == 8
+
+  # each sent after the previous decrease.
+  for i in range(10):
+    requests.release('PUT /access/acl', requests.acquire(), UNAVAILABLE)
+  assert requests.allowed() == 1
+
+def test_retries_give_up_after_their_number(monkeypatch):
+  monkeypatch.setattr(executor, 'BACKOFF_BASE', 0.001)
+  attempts = []
+  def send():
+    attempts.append(time.time())
+    raise LOCK_ERROR
+  reasons = []
+  with pytest.raises(ProxmoxAPIError):
+    RequestExecutor(retries=3).run('POST', '/access/users', send, on_retry=reasons.append)
+  assert len(attempts) == 4
+  assert reasons == [LOCK] * 3
+
+@pytest.fixture
+def locked_pve(certificate):
+  # every write holds the cluster filesystem lock for 50ms, and a writer
+  # waiting for it longer than 60ms is turned away.
+  from fake_pve import FakePVEServer
+  server = FakePVEServer(*certificate, write_time=0.05, lock_timeout=0.06).start()
+  yield server
+  server.stop()
+
+def test_contended_writes_are_retried(locked_pve, library, tmp_path, monkeypatch):
+  pytest.importorskip('requests')
+  from ansible.module_utils.proxmox_pve.auth import connect
+  monkeypatch.setattr(executor, 'BACKOFF_BASE', 0.01)
+  proxmox = connect(locked_pve.api_host, 'root@pam', verify_ssl=False, password='root',
+                    ticket_cache_dir=str(tmp_path), concurrency=8)
+  users = [{'userid': 'user%d@pve' % i} for i in range(16)]
+  result = library('proxmox_pve_users').reconcile(proxmox, users, [], max_workers=8)
+
+  assert not result.get('failed'), result
+  assert set(item['userid'] for item in users) <= set(locked_pve.api.state.users)
+  entry = proxmox.stats.as_dict()['endpoints']['POST /access/users']
+  assert entry['retries'] > 0
+  assert list(entry['retry_reasons']) == [LOCK]
+  assert entry['count'] == 16 + entry['retries']
+  assert proxmox.executor.allowed() < 8
@@ -0,0 +1,59 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# proxmox_pve_access_facts against the fake PVE API: every listing of the
+# gather_subset is read once and indexed by its id.
+
+import pytest
+
+pytest.importorskip('ansible')
+
+def module_args(fake_pve, tmp_path, **args):
+  return dict(args, api_host=fake_pve.api_host, api_user='root@pam', api_password='root',
+              api_validate_certs=False, api_ticket_cache_dir=str(tmp_path))
+
+def seed(state):
+  state.groups['ops'] = {'comment': 'Operations'}
+  state.add_user('alice@pve', comment='Alice', groups=['ops'])
+  state.tokens[('alice@pve', 'ci')] = 'secret'
+  state.roles['Auditor'] = {'VM.Audit', 'Sys.Audit'}
+  state.acl[('/vms', 'Auditor', 'user', 'alice@pve')] = 1
+  state.acl[('/vms', 'Auditor', 'group', 'ops')] = 0
+
+def test_facts_are_indexed(fake_pve, run_module, tmp_path):
+  seed(fake_pve.api.state)
+  fake_pve.api.reset_stats()
+  result = run_module('proxmox_pve_access_facts', module_args(fake_pve, tmp_path))
+  assert not result['changed']
+  facts = result['ansible_facts']['pve_access']
+  assert sorted(facts) == ['acl', 'api_host', 'gathered_at', 'groups', 'roles', 'users']
+
+  alice = facts['users']['alice@pve']
+  assert alice['comment'] == 'Alice'
+  assert alice['groups'] == ['ops']
+  assert alice['tokens'] == [{'tokenid': 'ci'}]
+  assert facts['groups']['ops'] == {'comment': 'Operations', 'users': ['alice@pve']}
+  assert facts['roles']['Auditor'] == {'privs': ['Sys.Audit', 'VM.Audit'], 'special': 0}
+  assert facts['acl']['/vms'] == [
+    {'roleid': 'Auditor', 'type': 'group', 'ugid': 'ops', 'propagate': 0},
+    {'roleid': 'Auditor', 'type': 'user', 'ugid': 'alice@pve', 'propagate': 1},
+  ]
+
+  endpoints = fake_pve.api.snapshot_stats()['endpoints']
+  assert [endpoints['GET /access/%s' % name] for name in ['users', 'groups', 'roles', 'acl']] == [1] * 4
+
+def test_subset_reads_only_its_listings(fake_pve, run_module, tmp_path):
+  seed(fake_pve.api.state)
+  fake_pve.api.reset_stats()
+  result = run_module('proxmox_pve_access_facts', module_args(fake_pve, tmp_path, gather_subset=['roles']))
+  assert result['msg'] == 'gathered Proxmox PVE roles.'
+  assert sorted(result['ansible_facts']['pve_access']) == ['api_host', 'gathered_at', 'roles']
+  assert [endpoint for endpoint in fake_pve.api.snapshot_stats()['endpoints'] if endpoint.startswith('GET ')] == [
+    'GET /access/roles']
+
+def test_unknown_subset_fails(fake_pve, run_module, tmp_path):
+  result = run_module('proxmox_pve_access_facts', module_args(fake_pve, tmp_path, gather_subset=['roles', 'vms']))
+  assert result['failed']
+  assert result['msg'].startswith('unknown gather_subset vms.')
@@ -0,0 +1,63 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# proxmox_pve_groups against the fake PVE API: groups are created, updated
+# and deleted, and every user whose memberships change is written once,
+# whatever the number of groups it joins or leaves.
+
+import pytest
+
+pytest.importorskip('ansible')
+
+def reconcile(library, proxmox, groups, removed_groups=()):
+  return library('proxmox_pve_groups').reconcile(proxmox, groups, list(removed_groups))
+
+def memberships(fake_pve):
+  return dict((userid, sorted(user['groups'])) for userid, user in fake_pve.api.state.users.items() if user['groups'])
+
+def test_members_are_written_once_per_user(fake_pve, proxmox, library):
+  for userid in ['alice@pve', 'bob@pve', 'carol@pve']:
+    fake_pve.api.state.add_user(userid)
+  fake_pve.api.reset_stats()
+  groups = [
+    {'groupid': 'ops', 'comment': 'Operations', 'members': ['alice@pve', 'bob@pve']},
+    {'groupid': 'dev', 'members': ['alice@pve', 'carol@pve']},
+    {'groupid': 'audit', 'members': ['alice@pve']},
+  ]
+  result = reconcile(library, proxmox, groups)
+  assert result['changed']
+  assert result['msg'] == 'Proxmox PVE Groups: 3 created, 0 updated, 0 deleted, 3 members updated, 0 unchanged.'
+  assert memberships(fake_pve) == {
+    'alice@pve': ['audit', 'dev', 'ops'], 'bob@pve': ['ops'], 'carol@pve': ['dev']}
+  assert fake_pve.api.state.groups['ops']['comment'] == 'Operations'
+  endpoints = fake_pve.api.snapshot_stats()['endpoints']
+  assert endpoints['POST /access/groups'] == 3
+  assert endpoints['PUT /access/users/{id}'] == 3
+
+  fake_pve.api.reset_stats()
+  again = reconcile(library, proxmox, groups)
+  assert not again['changed']
+  assert [entry['action'] for entry in again['results']] == ['none'] * 3
+  assert [endpoint for endpoint in fake_pve.api.snapshot_stats()['endpoints'] if not endpoint.startswith('GET ')] == []
+
+def test_append_update_and_delete(fake_pve, proxmox, library):
+  fake_pve.api.state.groups.update(ops={'comment': ''}, dev={'comment': ''})
+  fake_pve.api.state.add_user('alice@pve', groups=['ops', 'dev'])
+  fake_pve.api.state.add_user('bob@pve', groups=['ops'])
+  fake_pve.api.state.add_user('carol@pve')
+
+  result = reconcile(library, proxmox, [
+    {'groupid': 'ops', 'comment': 'Operations', 'members': ['carol@pve'], 'append': True},
+    {'groupid': 'qa', 'members': ['bob@pve']},
+  ], ['dev', 'old'])
+  assert result['changed'], result
+  actions = sorted((entry.get('groupid') or entry['userid'], entry['action']) for entry in result['results'])
+  # alice only leaves dev, which its deletion takes care of.
+  assert actions == [
+    ('bob@pve', 'members'), ('carol@pve', 'members'),
+    ('dev', 'deleted'), ('old', 'none'), ('ops', 'updated'), ('qa', 'created')]
+  assert 'dev' not in fake_pve.api.state.groups
+  assert fake_pve.api.state.groups['ops']['comment'] == 'Operations'
+  assert memberships(fake_pve) == {'alice@pve': ['ops'], 'bob@pve': ['ops', 'qa'], 'carol@pve': ['ops']}
@@ -0,0 +1,35 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# The api_* options the modules share: api_host and api_user are required
+# unless the module takes clusters, each of which brings its own.
+
+import pytest
+
+pytest.importorskip('ansible')
+
+SINGLE_CLUSTER = {
+  'proxmox_pve_user': {'userid': 'alice@pve'},
+  'proxmox_pve_role': {'roleid': 'Auditor'},
+  'proxmox_pve_acl': {'path': '/', 'roleid': 'Auditor'},
+  'proxmox_pve_user_password': {'userid': 'alice@pve', 'password': 'secret123'},
+  'proxmox_pve_user_passwords': {},
+  'proxmox_pve_groups': {},
+  'proxmox_pve_access_facts': {},
+  'proxmox_pve_permissions': {},
+}
+CLUSTERS = ['proxmox_pve_users', 'proxmox_pve_roles', 'proxmox_pve_acls', 'proxmox_pve_access']
+
+@pytest.mark.parametrize('name', sorted(SINGLE_CLUSTER))
+def test_api_host_and_user_are_required(run_module, name):
+  result = run_module(name, dict(SINGLE_CLUSTER[name], api_password='secret'))
+  assert result['failed']
+  assert result['msg'] == 'missing required arguments: api_host, api_user'
+
+@pytest.mark.parametrize('name', CLUSTERS)
+def test_api_host_and_user_are_required_without_clusters(run_module, name):
+  result = run_module(name, {'api_password': 'secret'})
+  assert result['failed']
+  assert result['msg'] == 'api_host and api_user are required unless clusters is given'
@@ -0,0 +1,78 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# Password checks against the fake PVE API: fingerprints skip passwords set
+# before from this controller, are forgotten with the users the modules
+# create or delete, and every password is set by default.
+
+import os
+import stat
+
+import pytest
+
+pytest.importorskip('ansible')
+
+from ansible.module_utils.proxmox_pve.password import fingerprint_path
+
+def set_passwords(library, proxmox, cache_dir, password='secret123', **options):
+  return library('proxmox_pve_user_passwords').reconcile(
+    proxmox, [{'userid': 'alice@pve', 'password': password}], cache_dir=cache_dir, **options)
+
+def access_config(**config):
+  empty = dict((key, []) for key in ['roles', 'removed_roles', 'users', 'removed_users', 'acls', 'removed_acls', 'passwords'])
+  empty.update(config)
+  return empty
+
+def test_every_password_is_set_by_default(fake_pve, proxmox, library, tmp_path):
+  fake_pve.api.state.add_user('alice@pve')
+  fake_pve.api.reset_stats()
+  assert set_passwords(library, proxmox, str(tmp_path))['changed']
+  assert set_passwords(library, proxmox, str(tmp_path))['changed']
+  assert fake_pve.api.snapshot_stats()['endpoints']['PUT /access/password'] == 2
+
+def test_forgetting_creates_no_file(fake_pve, proxmox, library, tmp_path):
+  fake_pve.api.state.add_user('alice@pve')
+  library('proxmox_pve_users').reconcile(proxmox, [], ['alice@pve'], cache_dir=str(tmp_path))
+  assert not os.path.exists(fingerprint_path(str(tmp_path), proxmox.api_host))
+
+def test_fingerprint_skips_the_same_password(fake_pve, proxmox, library, tmp_path):
+  fake_pve.api.state.add_user('alice@pve')
+  assert set_passwords(library, proxmox, str(tmp_path), password_check='fingerprint')['changed']
+  path = fingerprint_path(str(tmp_path), proxmox.api_host)
+  assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+  assert 'secret123' not in open(path).read()
+
+  fake_pve.api.reset_stats()
+  assert not set_passwords(library, proxmox, str(tmp_path), password_check='fingerprint')['changed']
+  assert 'PUT /access/password' not in fake_pve.api.snapshot_stats()['endpoints']
+  assert set_passwords(library, proxmox, str(tmp_path), 'other123', password_check='fingerprint')['changed']
+  assert fake_pve.api.state.passwords['alice@pve'] == 'other123'
+
+@pytest.mark.parametrize('recreate', ['proxmox_pve_users', 'proxmox_pve_user', 'proxmox_pve_access'])
+def test_recreated_user_gets_its_password(fake_pve, proxmox, library, tmp_path, recreate):
+  cache_dir = str(tmp_path)
+  config = access_config(users=[{'userid': 'alice@pve'}], passwords=[{'userid': 'alice@pve', 'password': 'secret123'}])
+  access = library('proxmox_pve_access')
+  assert access.reconcile(proxmox, config, password_check='fingerprint', cache_dir=cache_dir)['changed']
+  assert fake_pve.api.state.passwords['alice@pve'] == 'secret123'
+
+  if recreate == 'proxmox_pve_users':
+    users = library('proxmox_pve_users')
+    users.reconcile(proxmox, [], ['alice@pve'], cache_dir=cache_dir)
+    users.reconcile(proxmox, [{'userid': 'alice@pve'}], [], cache_dir=cache_dir)
+  elif recreate == 'proxmox_pve_user':
+    user = library('proxmox_pve_user')
+    params = dict(userid='alice@pve', comment=None, email=None, enable=True, expire=None, firstname=None,
+                  groups=[], keys=None, lastname=None, api_ticket_cache_dir=cache_dir)
+    user.run(proxmox, dict(params, state='absent'))
+    user.run(proxmox, dict(params, state='present'))
+  else:
+    access.reconcile(proxmox, access_config(removed_users=['alice@pve']), cache_dir=cache_dir)
+    access.reconcile(proxmox, access_config(users=[{'userid': 'alice@pve'}]), cache_dir=cache_dir)
+  assert 'alice@pve' not in fake_pve.api.state.passwords
+
+  result = set_passwords(library, proxmox, cache_dir, password_check='fingerprint')
+  assert result['changed'], result
+  assert fake_pve.api.state.passwords['alice@pve'] == 'secret123'
@@ -0,0 +1,108 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+import random
+
+import pytest
+
+pytest.importorskip('ansible')
+
+from ansible.module_utils.proxmox_pve.permissions import PermissionIndex
+
+PRIVS = ['Sys.Audit', 'Sys.Modify', 'VM.Audit', 'VM.Console', 'VM.PowerMgmt', 'Datastore.Audit', 'Pool.Audit']
+PATHS = ['/', '/vms', '/vms/100', '/vms/101', '/storage', '/storage/local', '/pool/a']
+GROUPS = ['ops', 'dev', 'audit']
+
+def random_cluster(seed):
+  # (acls, roles, users) of a small cluster with users, tokens with and
+  # without privilege separation, disabled users, groups and NoAccess.
+  rng = random.Random(seed)
+  roles = [{'roleid': 'Role%d' % i, 'privs': ','.join(rng.sample(PRIVS, rng.randint(1, 4)))} for i in range(4)]
+  roles.append({'roleid': 'NoAccess', 'privs': ''})
+  roles.append({'roleid': 'Administrator', 'privs': ','.join(PRIVS)})
+  users = []
+  for i in range(8):
+    users.append({
+      'userid': 'user%d@pve' % i,
+      'groups': ','.join(rng.sample(GROUPS, rng.randint(0, 2))),
+      'enable': rng.choice([1, 1, 1, 0]),
+      'tokens': [{'tokenid': 'tok%d' % j, 'privsep': rng.choice([0, 1])} for j in range(rng.randint(0, 2))],
+    })
+  users.append({'userid': 'root@pam', 'tokens': [{'tokenid': 'automation', 'privsep': 1}]})
+  tokens = ['%s!%s' % (user['userid'], token['tokenid']) for user in users for token in user['tokens']]
+  acls = []
+  for _ in range(30):
+    identity_type = rng.choice(['user', 'group', 'token'])
+    if identity_type == 'user':
+      ugid = rng.choice(users)['userid']
+    elif identity_type == 'group':
+      ugid = rng.choice(GROUPS)
+    elif tokens:
+      ugid = rng.choice(tokens)
+    else:
+      continue
+    acls.append({
+      'path': rng.choice(PATHS),
+      'roleid': rng.choice([role['roleid'] for role in roles]),
+      'type': identity_type,
+      'ugid': ugid,
+      'propagate': rng.choice([0, 1]),
+    })
+  return acls, roles, users
+
+@pytest.mark.parametrize('seed', range(100))
+def test_report_matches_privileges(seed):
+  index = PermissionIndex(*random_cluster(seed))
+  paths = PATHS + ['/vms/100/disk', '/storage/local/iso', '/nowhere']
+  report = index.report(paths=paths)
+  for ugid in index.identities():
+    for path in paths:
+      assert report.get(ugid, {}).get(path, []) == sorted(index.privileges(ugid, path)), (ugid, path)
+
+def naive_privileges(acls, roles, users, ugid, path):
+  # An independent, slow reading of how Proxmox VE evaluates a request:
+  # walk every prefix of path from /, where the identity's own applicable
+  # entries replace what was inherited, else its groups' do.
+  role_privs = dict((role['roleid'], set(role['privs'].split(',')) - set([''])) for role in roles)
+  config = {}
+  for acl in acls:
+    # like user.cfg, the last of duplicate entries wins.
+    config[(acl['path'], acl['roleid'], acl['type'], acl['ugid'])] = acl['propagate']
+  by_id = dict((user['userid'], user) for user in users)
+
+  def walk(identity, groups):
+    parts = [part for part in path.split('/') if part]
+    current = set()
+    for depth in range(len(parts) + 1):
+      prefix = '/' + '/'.join(parts[:depth])
+      final = depth == len(parts)
+      applicable = [(key, propagate) for key, propagate in config.items()
+                    if key[0] == prefix and (final or propagate)]
+      own = set(key[1] for key, propagate in applicable if key[2] != 'group' and key[3] == identity)
+      mine = set(key[1] for key, propagate in applicable if key[2] == 'group' and key[3] in groups)
+      current = own or mine or current
+    if 'NoAccess' in current:
+      return set()
+    return set().union(*[role_privs[roleid] for roleid in current])
+
+  if '!' in ugid:
+    userid, tokenid = ugid.split('!')
+    token = [token for token in by_id[userid]['tokens'] if token['tokenid'] == tokenid][0]
+    user_privs = naive_privileges(acls, roles, users, userid, path)
+    return user_privs & walk(ugid, ()) if token['privsep'] else user_privs
+  if ugid == 'root@pam':
+    return role_privs['Administrator']
+  user = by_id[ugid]
+  if not user.get('enable', 1):
+    return set()
+  return walk(ugid, set(user['groups'].split(',')) - set(['']))
+
+@pytest.mark.parametrize('seed', range(100))
+def test_privileges_match_naive_evaluation(seed):
+  acls, roles, users = random_cluster(seed)
+  index = PermissionIndex(acls, roles, users)
+  for ugid in index.identities():
+    for path in PATHS + ['/vms/100/disk', '/storage/local/iso', '/nowhere']:
+      assert set(index.privileges(ugid, path)) == naive_privileges(acls, roles, users, ugid, path), (ugid, path)
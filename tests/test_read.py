@@ -0,0 +1,61 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# Reads against the fake PVE API: up to SINGLE_READ_THRESHOLD users or roles
+# are read one by one, more with a single listing, and both give the same
+# result.
+
+import pytest
+
+pytest.importorskip('ansible')
+
+from ansible.module_utils.proxmox_pve.read import SINGLE_READ_THRESHOLD, read_roles, read_users
+from ansible.module_utils.proxmox_pve.snapshot import MemorySnapshot
+
+def reads(fake_pve, collection):
+  endpoints = fake_pve.api.snapshot_stats()['endpoints']
+  # reads of entities that do not exist are counted by their path.
+  single = sum(count for endpoint, count in endpoints.items() if endpoint.startswith('GET /access/%s/' % collection))
+  return single, endpoints.get('GET /access/%s' % collection, 0)
+
+def seed_users(fake_pve, count):
+  for i in range(count):
+    fake_pve.api.state.add_user('user%d@pve' % i, comment='user %d' % i)
+  return ['user%d@pve' % i for i in range(count)]
+
+def test_few_users_are_read_one_by_one(fake_pve, proxmox):
+  userids = seed_users(fake_pve, SINGLE_READ_THRESHOLD - 1) + ['nobody@pve']
+  fake_pve.api.reset_stats()
+  users = read_users(proxmox, userids)
+  assert reads(fake_pve, 'users') == (SINGLE_READ_THRESHOLD, 0)
+  assert sorted(users) == sorted(userids[:-1])
+  assert users['user0@pve']['userid'] == 'user0@pve'
+  assert users['user0@pve']['comment'] == 'user 0'
+
+def test_many_users_are_read_with_one_listing(fake_pve, proxmox):
+  userids = seed_users(fake_pve, SINGLE_READ_THRESHOLD + 1)
+  fake_pve.api.reset_stats()
+  users = read_users(proxmox, userids)
+  assert reads(fake_pve, 'users') == (0, 1)
+  assert set(userids) <= set(users)
+
+  fake_pve.api.reset_stats()
+  read_users(proxmox)
+  assert reads(fake_pve, 'users') == (0, 1)
+
+def test_single_and_listed_roles_agree(fake_pve, proxmox):
+  fake_pve.api.state.roles['Auditor'] = {'VM.Audit', 'Sys.Audit'}
+  single = read_roles(proxmox, ['Auditor', 'Missing'])
+  listed = read_roles(proxmox)
+  assert single == {'Auditor': {'roleid': 'Auditor', 'privs': 'Sys.Audit,VM.Audit'}}
+  assert sorted(listed['Auditor']['privs'].split(',')) == ['Sys.Audit', 'VM.Audit']
+
+def test_cached_listing_serves_single_reads(fake_pve, proxmox):
+  seed_users(fake_pve, 2)
+  proxmox.snapshot = MemorySnapshot()
+  read_users(proxmox)
+  fake_pve.api.reset_stats()
+  assert read_users(proxmox, ['user0@pve'])['user0@pve']['comment'] == 'user 0'
+  assert reads(fake_pve, 'users') == (0, 0)
@@ -0,0 +1,58 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# The shared /access snapshot mirrors writes the way the cluster applies
+# them: after a delete it lists what a fresh read of the fake PVE API does.
+
+import pytest
+
+pytest.importorskip('ansible')
+
+from ansible.module_utils.proxmox_pve.read import read_collections
+from ansible.module_utils.proxmox_pve.snapshot import MemorySnapshot
+
+def seed(state):
+  state.groups['ops'] = {'comment': ''}
+  state.groups['dev'] = {'comment': ''}
+  state.add_user('alice@pve', groups=['ops'])
+  state.add_user('bob@pve', groups=['ops', 'dev'])
+  state.tokens[('alice@pve', 'ci')] = 'secret'
+  state.tokens[('bob@pve', 'ci')] = 'secret'
+  state.roles['Auditor'] = {'Sys.Audit', 'VM.Audit'}
+  state.roles['Operator'] = {'VM.Audit', 'VM.Console'}
+  for path in ['/', '/vms', '/vms/100']:
+    state.acl[(path, 'Auditor', 'user', 'alice@pve')] = 1
+    state.acl[(path, 'Operator', 'user', 'bob@pve')] = 0
+    state.acl[(path, 'Auditor', 'token', 'alice@pve!ci')] = 1
+    state.acl[(path, 'Operator', 'token', 'bob@pve!ci')] = 1
+    state.acl[(path, 'Operator', 'group', 'ops')] = 1
+    state.acl[(path, 'Auditor', 'group', 'dev')] = 0
+
+def listing(entries, fields):
+  return sorted(tuple(entry.get(field) for field in fields) for entry in entries)
+
+def assert_consistent(fake_pve, snapshot):
+  acl_fields = ['path', 'roleid', 'type', 'ugid', 'propagate']
+  assert listing(snapshot.get('acl'), acl_fields) == listing(fake_pve.api.get_acl({}), acl_fields)
+  user_fields = ['userid', 'groups']
+  assert listing(snapshot.get('users'), user_fields) == listing(fake_pve.api.get_users({}), user_fields)
+  role_fields = ['roleid', 'privs']
+  assert listing(snapshot.get('roles'), role_fields) == listing(fake_pve.api.get_roles({}), role_fields)
+
+@pytest.mark.parametrize('deletes', [
+  [('users', 'alice@pve')],
+  [('roles', 'Auditor')],
+  [('groups', 'ops')],
+  [('users', 'bob@pve'), ('groups', 'dev'), ('roles', 'Operator')],
+])
+def test_snapshot_matches_cluster_after_delete(fake_pve, proxmox, deletes):
+  seed(fake_pve.api.state)
+  proxmox.snapshot = MemorySnapshot()
+  read_collections(proxmox, ['users', 'roles', 'acl'])
+  assert_consistent(fake_pve, proxmox.snapshot)
+
+  for collection, entity_id in deletes:
+    getattr(proxmox.access, collection)(entity_id).delete()
+  assert_consistent(fake_pve, proxmox.snapshot)
@@ -0,0 +1,72 @@
+# Copyright: Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+# api_stats against the fake PVE API: the calls a client counts per
+# endpoint are those the server saw, failures count as errors, and the
+# stats of several clusters add up.
+
+import pytest
+
+pytest.importorskip('ansible')
+
+from ansible.module_utils.proxmox_pve.client import ProxmoxAPIError, resource_path
+from ansible.module_utils.proxmox_pve.stats import LATENCY_BUCKETS, APIStats, endpoint_pattern, merge_api_stats
+
+@pytest.mark.parametrize('path, pattern', [
+  ('/access/users', '/access/users'),
+  ('/access/users/alice%40pve', '/access/users/{id}'),
+  ('/access/users/alice@pve/token/ci', '/access/users/{id}/token/{id}'),
+  ('/access/acl', '/access/acl'),
+])
+def test_endpoint_pattern(path, pattern):
+  assert endpoint_pattern(path) == pattern
+
+def test_client_counts_what_the_server_sees(fake_pve, proxmox):
+  fake_pve.api.state.add_user('alice@pve')
+  proxmox.stats = APIStats()
+  fake_pve.api.reset_stats()
+  proxmox.access.users.get()
+  proxmox.access.users('alice@pve').get()
+  proxmox.access.users('alice@pve').put(comment='Alice')
+  with pytest.raises(ProxmoxAPIError):
+    proxmox.request('GET', resource_path('access', 'users', 'nobody@pve'))
+
+  stats = proxmox.stats.as_dict()
+  server = fake_pve.api.snapshot_stats()
+  assert stats['requests'] == server['requests'] == 4
+  assert stats['bytes_received'] == server['bytes_out']
+  assert dict((key, entry['count']) for key, entry in stats['endpoints'].items()) == {
+    'GET /access/users': 1, 'GET /access/users/{id}': 2, 'PUT /access/users/{id}': 1}
+  assert stats['errors'] == stats['endpoints']['GET /access/users/{id}']['errors'] == 1
+  assert stats['buckets'] == ['%g' % bound for bound in LATENCY_BUCKETS] + ['+Inf']
+  for entry in stats['endpoints'].values():
+    assert sum(entry['histogram'].values()) == entry['count']
+    assert entry['max_seconds'] <= entry['seconds']
+
+def test_stats_of_clusters_add_up(fake_pve, proxmox):
+  proxmox.stats = APIStats()
+  proxmox.access.users.get()
+  first = proxmox.stats.as_dict()
+  proxmox.stats = APIStats()
+  proxmox.access.users.get()
+  proxmox.access.roles.get()
+  second = proxmox.stats.as_dict()
+
+  merged = merge_api_stats([first, second])
+  assert merged['requests'] == 3
+  assert merged['endpoints']['GET /access/users']['count'] == 2
+  assert sum(merged['endpoints']['GET /access/users']['histogram'].values()) == 2
+  assert merged['bytes_received'] == first['bytes_received'] + second['bytes_received']
+  # the inputs are left as they were.
+  assert first['endpoints']['GET /access/users']['count'] == 1
+
+def test_modules_return_their_stats(fake_pve, run_module, tmp_path):
+  result = run_module('proxmox_pve_user', dict(
+    userid='alice@pve', api_host=fake_pve.api_host, api_user='root@pam', api_password='root',
+    api_validate_certs=False, api_ticket_cache_dir=str(tmp_path)))
+  assert result['changed']
+  endpoints = result['api_stats']['endpoints']
+  assert endpoints['POST /access/ticket']['count'] == 1
+  assert endpoints['POST /access/users']['count'] == 1